@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cold-start import benchmark for the Cloud Functions
+Imports each function's main.py in a fresh interpreter with -X importtime,
+reports per-module import cost and fails if the budget is exceeded or a
+heavy SDK is imported eagerly.
+
+Usage:
+    python benchmarks/cold_start.py                     # default budget
+    python benchmarks/cold_start.py --budget-ms 800     # or COLD_START_BUDGET_MS=800
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+FUNCTIONS_DIR = Path(__file__).parent.parent / 'cloud-functions'
+FUNCTIONS = ['debate', 'search']
+DEFAULT_BUDGET_MS = float(os.getenv('COLD_START_BUDGET_MS', '1500'))
+
+# SDKs that must stay deferred until a request actually needs them
+HEAVY_MODULES = [
+    'anthropic',
+    'vertexai',
+    'vertexai.generative_models',
+    'vertexai.language_models',
+    'google.cloud.bigquery',
+]
+
+_PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "print((time.perf_counter() - started) * 1000)\n"
+    "print(','.join(m for m in {heavy!r} if m in sys.modules))\n"
+)
+
+
+def _parse_importtime(stderr: str, max_depth: int = 0) -> Dict[str, float]:
+    """Cumulative import times (ms) from -X importtime output, up to max_depth nesting"""
+    times: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two extra spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= max_depth:
+            times[name.strip()] = int(cumulative_us) / 1000
+    return times
+
+
+def measure(function: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """Import main.py in a clean interpreter; return (import_ms, ranked modules, eager SDKs)"""
+    baseline = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'pass'],
+        capture_output=True, text=True,
+    )
+    startup_modules = set(_parse_importtime(baseline.stderr))
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=FUNCTIONS_DIR / function,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{function}: import failed\n{proc.stderr[-2000:]}")
+
+    import_ms_line, eager_line = (proc.stdout.strip().splitlines() + [''])[:2]
+    modules = {
+        # main itself plus everything it imports directly
+        name: ms for name, ms in _parse_importtime(proc.stderr, max_depth=1).items()
+        if name not in startup_modules
+    }
+    ranked = sorted(modules.items(), key=lambda item: item[1], reverse=True)
+    eager = [m for m in eager_line.split(',') if m]
+    return float(import_ms_line), ranked, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cloud Function cold-start import benchmark')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Max import time of main.py per function (ms)')
+    parser.add_argument('--top', type=int, default=10, help='Modules to list per function')
+    parser.add_argument('--functions', nargs='+', default=FUNCTIONS, choices=FUNCTIONS)
+    args = parser.parse_args()
+
+    failures = []
+    for function in args.functions:
+        import_ms, ranked, eager = measure(function)
+
+        print(f"\n📦 {function}: import main = {import_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        for name, ms in ranked[:args.top]:
+            print(f"  {ms:8.1f} ms  {name}")
+
+        if import_ms > args.budget_ms:
+            failures.append(f"{function}: {import_ms:.1f} ms > {args.budget_ms:.0f} ms")
+        if eager:
+            failures.append(f"{function}: heavy SDKs imported eagerly: {', '.join(eager)}")
+
+    if failures:
+        print("\n❌ Cold-start budget exceeded:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("\n✅ Cold-start import within budget")
+
+
+if __name__ == "__main__":
+    main()
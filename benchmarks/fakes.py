@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Deterministic fake providers for offline benchmarks
+Stand-ins for the Anthropic client, Vertex Gemini / embedding models,
+Perplexity and BigQuery with configurable latency and error distributions.
+LLM fakes replay recorded debates from docs/brain (archive and loose JSON).
+"""
+import hashlib
+import math
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+BRAIN_DIR = Path(__file__).parent.parent / 'docs' / 'brain'
+SCRIPTS_DIR = Path(__file__).parent.parent / 'scripts'
+EMBEDDING_DIM = 768
+# Fraction of a streamed response's latency spent before the first token
+TTFT_SHARE = 0.3
+
+_WORD = re.compile(r'[가-힣]+|[A-Za-z][A-Za-z0-9+#.-]*|\d+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Same rough estimate the engine uses (Korean runs ~1 token per 1-2 chars)"""
+    return len(text) // 2 + 1
+
+
+class ReplayCorpus:
+    """Recorded debate turns grouped by speaker, error responses excluded"""
+
+    def __init__(self, directory: Path = BRAIN_DIR):
+        # Appended, not prepended: scripts/ has modules named like the cloud functions'
+        if str(SCRIPTS_DIR) not in sys.path:
+            sys.path.append(str(SCRIPTS_DIR))
+        from debate_archive import DebateArchive, iter_debates
+
+        self.topics: List[str] = []
+        self.turns: List[Dict[str, Any]] = []
+        self.responses: Dict[str, List[str]] = {}
+        # Archived debates plus loose JSON files (CI prunes sources once archived)
+        for doc_id, debate in iter_debates(directory, DebateArchive(directory / 'archive')):
+            self.topics.append(debate.get('topic', doc_id))
+            for i, turn in enumerate(debate.get('history', [])):
+                response = turn.get('response') or ''
+                if not response or response.startswith('Error getting'):
+                    continue
+                speaker = turn.get('ai', 'Unknown')
+                self.responses.setdefault(speaker, []).append(response)
+                self.turns.append({
+                    'key': f"{doc_id}#{i:03d}",
+                    'parent': doc_id,
+                    'speaker': speaker,
+                    'topic': debate.get('topic', ''),
+                    'content': response,
+                })
+        if not self.responses:
+            raise RuntimeError(f"No recorded debates found in {directory}")
+
+    def pick(self, speaker: str, rng: random.Random) -> str:
+        pool = self.responses.get(speaker) or [r for rs in self.responses.values() for r in rs]
+        return rng.choice(pool)
+
+
+class ProviderError(Exception):
+    """Fake SDK error; status_code and message mimic the real SDKs"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+
+
+class Behaviour:
+    """Latency (log-normal around p50 with a p95 tail) and error distribution
+
+    errors maps a kind ('rate_limited', 'overloaded', 'timeout') to its rate.
+    All randomness comes from one seeded generator, so runs are repeatable.
+    """
+
+    _ERRORS = {
+        'rate_limited': (429, "rate_limit_error: Please retry in {delay}s"),
+        'overloaded': (529, "overloaded_error: Overloaded"),
+        'timeout': (504, "Deadline exceeded"),
+    }
+
+    def __init__(self, p50_ms: float = 200, p95_ms: float = 600, errors: Optional[Dict[str, float]] = None,
+                 retry_delay_s: float = 0.05, seed: int = 0, time_scale: float = 1.0):
+        self.mu = math.log(max(p50_ms, 0.001))
+        # p95 = p50 * exp(1.645 sigma)
+        self.sigma = max(math.log(max(p95_ms, p50_ms) / max(p50_ms, 0.001)) / 1.645, 0.0)
+        self.errors = errors or {}
+        self.retry_delay_s = retry_delay_s
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def latency(self) -> float:
+        with self._lock:
+            return math.exp(self.rng.gauss(self.mu, self.sigma)) / 1000 * self.time_scale
+
+    def maybe_fail(self) -> None:
+        with self._lock:
+            roll = self.rng.random()
+        for kind, rate in self.errors.items():
+            if roll < rate:
+                status, message = self._ERRORS[kind]
+                raise ProviderError(status, message.format(delay=self.retry_delay_s))
+            roll -= rate
+
+    def choice(self, corpus: ReplayCorpus, speaker: str) -> str:
+        with self._lock:
+            return corpus.pick(speaker, self.rng)
+
+
+class Usage:
+    """Token counters shared by all fakes of one benchmark run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def record(self, prompt: str = '', output: str = '', error: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.input_tokens += estimate_tokens(prompt) if prompt else 0
+            self.output_tokens += estimate_tokens(output) if output else 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {'calls': self.calls, 'errors': self.errors,
+                    'input_tokens': self.input_tokens, 'output_tokens': self.output_tokens}
+
+
+def _chunks(text: str, size: int = 8) -> Iterator[str]:
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+class _Call:
+    """Shared call path: latency, error injection, usage accounting"""
+
+    def __init__(self, corpus: ReplayCorpus, speaker: str, behaviour: Behaviour, usage: Usage):
+        self.corpus = corpus
+        self.speaker = speaker
+        self.behaviour = behaviour
+        self.usage = usage
+
+    def _respond(self, prompt: str) -> str:
+        try:
+            self.behaviour.maybe_fail()
+        except ProviderError:
+            self.usage.record(prompt, error=True)
+            raise
+        return self.behaviour.choice(self.corpus, self.speaker)
+
+    def complete(self, prompt: str) -> str:
+        time.sleep(self.behaviour.latency())
+        text = self._respond(prompt)
+        self.usage.record(prompt, text)
+        return text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # One sampled latency covers the whole response, as in complete(): the first
+        # token arrives after TTFT_SHARE of it and the rest trickles in. Only the
+        # chunks actually sent are billed, so a stream closed early costs less.
+        latency = self.behaviour.latency()
+        time.sleep(latency * TTFT_SHARE)
+        text = self._respond(prompt)
+        pieces = list(_chunks(text))
+        per_chunk = latency * (1 - TTFT_SHARE) / max(len(pieces), 1)
+        sent = []
+        try:
+            for piece in pieces:
+                sent.append(piece)
+                yield piece
+                time.sleep(per_chunk)
+        finally:
+            self.usage.record(prompt, ''.join(sent))
+
+
+class FakeAnthropic:
+    """anthropic.Anthropic: messages.create / messages.stream"""
+
+    def __init__(self, corpus: ReplayCorpus, behaviour: Behaviour, usage: Usage):
+        call = _Call(corpus, 'Claude', behaviour, usage)
+
+        class _Stream:
+            def __init__(self, prompt: str):
+                self.text_stream = call.stream(prompt)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.text_stream.close()
+
+            def get_final_message(self):
+                # No usage block: the provider falls back to estimated token counts
+                return SimpleNamespace(usage=None)
+
+        class _Messages:
+            @staticmethod
+            def create(model: str, max_tokens: int, messages: List[Dict[str, str]], **kwargs):
+                text = call.complete(messages[-1]['content'])
+                return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+            @staticmethod
+            def stream(model: str, max_tokens: int, messages: List[Dict[str, str]], **kwargs):
+                return _Stream(messages[-1]['content'])
+
+        self.messages = _Messages()
+
+
+class FakeGemini:
+    """vertexai GenerativeModel.generate_content (optionally streamed)"""
+
+    def __init__(self, corpus: ReplayCorpus, behaviour: Behaviour, usage: Usage):
+        self._call = _Call(corpus, 'Gemini', behaviour, usage)
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                         stream: bool = False):
+        if stream:
+            return (SimpleNamespace(text=piece) for piece in self._call.stream(prompt))
+        return SimpleNamespace(text=self._call.complete(prompt))
+
+
+class FakePerplexity:
+    """httpx client posting to /chat/completions"""
+
+    def __init__(self, corpus: ReplayCorpus, behaviour: Behaviour, usage: Usage):
+        self._call = _Call(corpus, 'Perplexity', behaviour, usage)
+
+    def post(self, path: str, json: Dict[str, Any], **kwargs):
+        text = self._call.complete(json['messages'][-1]['content'])
+        if 'DECISION' not in text:
+            text = f"DECISION: APPROVE\nREASON: {text[:200]}"
+        body = {'choices': [{'message': {'content': text}}]}
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: body)
+
+
+class FakeEmbeddingModel:
+    """TextEmbeddingModel.get_embeddings with hashed bag-of-words vectors
+
+    Texts that share words get similar vectors, so similarity search and
+    consensus scores behave plausibly without a real model.
+    """
+
+    def __init__(self, behaviour: Behaviour, usage: Usage, dim: int = EMBEDDING_DIM):
+        self.behaviour = behaviour
+        self.usage = usage
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=4).digest()
+            bucket = int.from_bytes(digest, 'little')
+            vector[bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def get_embeddings(self, texts: List[str]):
+        time.sleep(self.behaviour.latency())
+        try:
+            self.behaviour.maybe_fail()
+        except ProviderError:
+            self.usage.record(' '.join(texts), error=True)
+            raise
+        self.usage.record(' '.join(texts))
+        return [SimpleNamespace(values=self._embed(text)) for text in texts]
+
+
+# Columns of the knowledge table as the uploader creates it
+KNOWLEDGE_COLUMNS = ('doc_id', 'doc_type', 'title', 'content', 'embedding', 'metadata',
+                     'created_at', 'synced_at', 'parent_doc_id', 'chunk_index')
+
+
+class FakeBigQuery:
+    """bigquery.Client.query over in-memory rows (vector index refresh path)"""
+
+    def __init__(self, rows: List[Dict[str, Any]], behaviour: Behaviour):
+        self.rows = rows
+        self.behaviour = behaviour
+        self.labels: Dict[str, str] = {}
+
+    def get_table(self, table: str):
+        # Metadata call: no job, a fraction of the query latency
+        time.sleep(self.behaviour.latency() / 10)
+        schema = [SimpleNamespace(name=name) for name in KNOWLEDGE_COLUMNS]
+        return SimpleNamespace(labels=dict(self.labels), schema=schema)
+
+    def query(self, sql: str, job_config: Any = None):
+        time.sleep(self.behaviour.latency())
+        return [SimpleNamespace(**row) for row in self.rows]
+
+
+def corpus_rows(corpus: ReplayCorpus, embedder: FakeEmbeddingModel) -> List[Dict[str, Any]]:
+    """Knowledge-table rows (one per recorded turn) as the index refresh query returns them"""
+    base = datetime(2026, 1, 1)
+    rows = []
+    for i, turn in enumerate(corpus.turns):
+        rows.append({
+            'doc_key': turn['key'],
+            'content': turn['content'],
+            'metadata': {'parent_doc_id': turn['parent'], 'speaker': turn['speaker'], 'topic': turn['topic']},
+            'embedding': embedder._embed(turn['content']),
+            'watermark': base + timedelta(seconds=i),
+        })
+    return rows
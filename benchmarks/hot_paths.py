@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Offline hot-path benchmarks with deterministic fake providers
+Runs QuickDebateEngine, VertexSearch and VertexAIUploader against the fakes in
+benchmarks/fakes.py (recorded docs/brain responses, configurable latency and
+error rates) and reports throughput, p50/p95/p99 latency, token throughput and
+peak memory. Each target runs in a fresh interpreter so module state, caches
+and memory numbers do not leak between targets.
+
+Usage:
+    python benchmarks/hot_paths.py                                  # all targets
+    python benchmarks/hot_paths.py --targets debate --modes sequential pipelined
+    python benchmarks/hot_paths.py --error-rate 0.05 --latency-ms 300 --p95-ms 900
+    python benchmarks/hot_paths.py --targets debate --hedge fallback  # hedged LLM calls
+    python benchmarks/hot_paths.py --json out.json                  # save results
+    python benchmarks/hot_paths.py --baseline out.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).parent.parent
+FUNCTIONS_DIR = ROOT / 'cloud-functions'
+SCRIPTS_DIR = ROOT / 'scripts'
+TARGETS = ['debate', 'search', 'upload']
+DEBATE_MODES = ['sequential', 'stream', 'independent', 'pipelined']
+
+# Metrics where a higher value is better (everything else: lower is better)
+THROUGHPUT_METRICS = ('ops_per_sec', 'tokens_per_sec')
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'ttft_p95_ms')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(name: str, unit: str, ops: int, elapsed: float, latencies: List[float],
+              usage: Dict[str, int], peak_bytes: int, **extra: Any) -> Dict[str, Any]:
+    tokens = usage['input_tokens'] + usage['output_tokens']
+    summary = {
+        'name': name,
+        'unit': unit,
+        'ops': ops,
+        'elapsed_s': round(elapsed, 3),
+        'ops_per_sec': round(ops / elapsed, 3) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'tokens_per_sec': round(tokens / elapsed, 1) if elapsed else 0.0,
+        'provider_calls': usage['calls'],
+        'provider_errors': usage['errors'],
+        'peak_mem_mb': round(peak_bytes / 2 ** 20, 2),
+    }
+    summary.update(extra)
+    return summary
+
+
+def measured(fn: Callable[[], Any]) -> tuple:
+    """Run fn under tracemalloc: (result, elapsed seconds, peak traced bytes)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+# ---- targets (run inside the child interpreter) ----
+
+def _behaviours(args, seed: int):
+    from fakes import Behaviour
+
+    errors = {'rate_limited': args.error_rate / 2, 'overloaded': args.error_rate / 2} if args.error_rate else {}
+    llm = Behaviour(args.latency_ms, args.p95_ms, errors, seed=seed, time_scale=args.time_scale)
+    embedding = Behaviour(args.embedding_latency_ms, args.embedding_latency_ms * 2, seed=seed + 1,
+                          time_scale=args.time_scale)
+    return llm, embedding
+
+
+def bench_debate(args, workdir: Path) -> List[Dict[str, Any]]:
+    sys.path.insert(0, str(FUNCTIONS_DIR / 'debate'))
+    os.environ['DEBATE_CACHE_DB'] = ''
+    os.environ['JOB_STORE_PATH'] = str(workdir / 'jobs.sqlite3')
+    import main as debate_main
+    import providers
+    import ratelimit
+    from clients import ClientPool, GEMINI_MODEL, GEMINI_FALLBACK_MODEL
+    from hedging import LatencyTracker
+    from result_cache import DebateResultCache
+    from fakes import (FakeAnthropic, FakeEmbeddingModel, FakeGemini, FakePerplexity,
+                       ReplayCorpus, Usage)
+
+    if not args.quotas:
+        # Measure the engine, not the production quotas (0 = unlimited)
+        for model in (providers.CLAUDE_MODEL, providers.CLAUDE_FALLBACK_MODEL, GEMINI_MODEL,
+                      GEMINI_FALLBACK_MODEL, providers.PERPLEXITY_MODEL):
+            ratelimit.RATE_LIMITS[model] = {'rpm': 0, 'tpm': 0}
+
+    corpus = ReplayCorpus()
+    topics = [corpus.topics[i % len(corpus.topics)] for i in range(args.debates)]
+    results = []
+    for mode in args.modes:
+        usage = Usage()
+        llm, embedding = _behaviours(args, args.seed)
+        pool = ClientPool()
+        pool.override('anthropic', FakeAnthropic(corpus, llm, usage))
+        pool.override('gemini', FakeGemini(corpus, llm, usage))
+        pool.override('gemini_fallback', FakeGemini(corpus, llm, usage))
+        pool.override('perplexity', FakePerplexity(corpus, llm, usage))
+        pool.override('embedding_model', FakeEmbeddingModel(embedding, usage))
+        pool.override('scheduler', ratelimit.ProviderScheduler(str(workdir / f'limits-{mode}.sqlite3')))
+        pool.override('result_cache', DebateResultCache(''))
+        # No delay floor: fake latencies are scaled by --time-scale
+        pool.override('latency_tracker', LatencyTracker(mode=args.hedge, min_delay=0))
+
+        latencies: List[float] = []
+        first_tokens: List[float] = []
+        outcome = {'rounds': 0, 'aborted': 0, 'escalated': 0, 'hedged': 0, 'hedges_won': 0}
+
+        def run_one(topic: str) -> Dict[str, Any]:
+            engine = debate_main.QuickDebateEngine(topic, pool=pool, use_cache=False)
+            if mode in ('independent', 'pipelined'):
+                import asyncio
+                return asyncio.run(engine.debate_async(mode))
+            started = time.perf_counter()
+            first = None
+            for event in engine.debate_events(stream=mode == 'stream'):
+                if first is None and event['event'] in ('token', 'opinion'):
+                    first = time.perf_counter() - started
+                if event['event'] == 'result':
+                    if first is not None:
+                        first_tokens.append(first)
+                    return event['result']
+
+        def run_all():
+            for topic in topics:
+                started = time.perf_counter()
+                result = run_one(topic)
+                latencies.append(time.perf_counter() - started)
+                outcome['rounds'] += result['rounds']
+                outcome['aborted'] += result['convergence']['action'] == 'aborted'
+                outcome['escalated'] += result['convergence']['action'] == 'escalate'
+                outcome['hedged'] += len(result['hedges'])
+                outcome['hedges_won'] += sum(hedge['winner'] != 'primary' for hedge in result['hedges'])
+
+        _, elapsed, peak = measured(run_all)
+        extra = {'debates': len(topics), 'aborted': outcome['aborted'], 'escalated': outcome['escalated']}
+        if args.hedge != 'off':
+            extra.update(hedge=args.hedge, hedged=outcome['hedged'], hedges_won=outcome['hedges_won'])
+        if first_tokens:
+            extra['ttft_p50_ms'] = round(percentile(first_tokens, 50) * 1000, 1)
+            extra['ttft_p95_ms'] = round(percentile(first_tokens, 95) * 1000, 1)
+        results.append(summarize(f'debate/{mode}', 'rounds', outcome['rounds'], elapsed,
+                                 latencies, usage.snapshot(), peak, **extra))
+    return results
+
+
+def bench_search(args, workdir: Path) -> List[Dict[str, Any]]:
+    sys.path.insert(0, str(FUNCTIONS_DIR / 'search'))
+    os.environ['VECTOR_INDEX_DIR'] = str(workdir / 'vector_index')
+    os.environ['LEXICAL_INDEX_DIR'] = str(workdir / 'lexical_index')
+    import main as search_main
+    from clients import ClientPool
+    from embedding_cache import EmbeddingCache
+    from lexical_index import LexicalIndex
+    from result_cache import GenerationWatcher, SearchResultCache
+    from vector_index import VectorIndex
+    from fakes import FakeBigQuery, FakeEmbeddingModel, ReplayCorpus, Usage, corpus_rows
+
+    corpus = ReplayCorpus()
+    usage = Usage()
+    _, embedding = _behaviours(args, args.seed)
+    embedder = FakeEmbeddingModel(embedding, usage)
+
+    # Replicate the recorded turns until the index has the requested size
+    base_rows = corpus_rows(corpus, embedder)
+    rows = []
+    for copy in range(max(args.index_rows // max(len(base_rows), 1), 1)):
+        for row in base_rows:
+            rows.append(dict(row, doc_key=f"{row['doc_key']}~{copy}",
+                             metadata=dict(row['metadata'], parent_doc_id=f"{row['metadata']['parent_doc_id']}~{copy}")))
+    bq = FakeBigQuery(rows, embedding)
+
+    pool = ClientPool()
+    pool.override('bigquery', bq)
+    pool.override('embedding_model', embedder)
+    pool.override('embedding_cache', EmbeddingCache())
+    pool.override('generation_watcher', GenerationWatcher())
+    pool.override('result_cache', SearchResultCache(disk_path=''))
+    index = VectorIndex(workdir / 'vector_index')
+    _, build_elapsed, build_peak = measured(lambda: index.refresh(bq, search_main.KNOWLEDGE_TABLE))
+    pool.override('vector_index', index)
+    lexical = LexicalIndex(workdir / 'lexical_index')
+    _, lexical_elapsed, lexical_peak = measured(lambda: lexical.refresh(bq, search_main.KNOWLEDGE_TABLE))
+    pool.override('lexical_index', lexical)
+    engine = search_main.VertexSearch(pool=pool)
+
+    # Queries: topics plus opening sentences of recorded turns
+    queries = corpus.topics + [turn['content'].split('\n')[0][:120] for turn in corpus.turns]
+    queries = [queries[i % len(queries)] for i in range(args.queries)]
+
+    results = [summarize('search/index_build', 'rows', index.count, build_elapsed, [build_elapsed],
+                         usage.snapshot(), build_peak),
+               summarize('search/lexical_build', 'rows', lexical.count, lexical_elapsed, [lexical_elapsed],
+                         Usage().snapshot(), lexical_peak)]
+    # cold: empty caches; warm: embeddings cached; cached: repeat with the result cache
+    runs = (('search/single_cold', 1), ('search/single_warm', 1), ('search/batch', args.batch_size),
+            ('search/cached', 1))
+    for name, batch in runs:
+        usage = Usage()
+        embedder.usage = usage
+        latencies: List[float] = []
+
+        def run_all():
+            for start in range(0, len(queries), batch):
+                chunk = queries[start:start + batch]
+                started = time.perf_counter()
+                engine.search_many(chunk) if batch > 1 else engine.search(chunk[0])
+                latencies.append(time.perf_counter() - started)
+
+        if name in ('search/single_cold', 'search/batch'):
+            pool.override('embedding_cache', EmbeddingCache())
+        if name != 'search/cached':
+            # Already at the table's generation, so no catch-up refresh runs inside the timing
+            result_cache = SearchResultCache(disk_path='')
+            result_cache.advance(0)
+            pool.override('result_cache', result_cache)
+        engine = search_main.VertexSearch(pool=pool)
+        _, elapsed, peak = measured(run_all)
+        results.append(summarize(name, 'queries', len(queries), elapsed, latencies, usage.snapshot(), peak,
+                                 index_rows=index.count, batch_size=batch))
+    return results
+
+
+def bench_upload(args, workdir: Path) -> List[Dict[str, Any]]:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    os.environ['VERTEX_MANIFEST_PATH'] = str(workdir / 'vertex_manifest.json')
+    import upload_to_vertex
+    from bq_writer import LocalSink
+    from fakes import FakeEmbeddingModel, Usage
+
+    results = []
+    for name, full in (('upload/full', True), ('upload/incremental', False)):
+        usage = Usage()
+        _, embedding = _behaviours(args, args.seed)
+        sink = LocalSink(workdir / 'sink')
+        uploader = upload_to_vertex.VertexAIUploader(sink=sink, embedding_model=FakeEmbeddingModel(embedding, usage))
+        # Batch latency per embedding request, end to end elapsed for the whole sync
+        _, elapsed, peak = measured(lambda: uploader.run(full=full))
+        snapshot = usage.snapshot()
+        chunks = len(json.loads(Path(upload_to_vertex.MANIFEST_PATH).read_text()).get('docs', {})) \
+            if Path(upload_to_vertex.MANIFEST_PATH).exists() else 0
+        results.append(summarize(name, 'chunks', chunks, elapsed, [elapsed], snapshot, peak,
+                                 embedding_requests=snapshot['calls'], sink_loads=sink.loads))
+    return results
+
+
+BENCHMARKS = {'debate': bench_debate, 'search': bench_search, 'upload': bench_upload}
+
+
+# ---- driver ----
+
+def run_target(target: str, args) -> List[Dict[str, Any]]:
+    """Run one target in a fresh interpreter and collect its JSON report"""
+    argv = [sys.executable, __file__, '--child', target,
+            '--debates', str(args.debates), '--modes', *args.modes,
+            '--queries', str(args.queries), '--batch-size', str(args.batch_size),
+            '--index-rows', str(args.index_rows),
+            '--latency-ms', str(args.latency_ms), '--p95-ms', str(args.p95_ms),
+            '--embedding-latency-ms', str(args.embedding_latency_ms),
+            '--error-rate', str(args.error_rate), '--time-scale', str(args.time_scale),
+            '--seed', str(args.seed), '--hedge', args.hedge]
+    if args.quotas:
+        argv.append('--quotas')
+    proc = subprocess.run(argv, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{target}: benchmark failed\n{proc.stderr[-2000:]}")
+    # The report is the last stdout line; everything before it is the target's own logging
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def child(target: str, args) -> None:
+    sys.path.insert(0, str(Path(__file__).parent))
+    with tempfile.TemporaryDirectory(prefix=f'bench-{target}-') as workdir:
+        results = BENCHMARKS[target](args, Path(workdir))
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for result in results:
+        result['max_rss_mb'] = round(rss_kb / 1024, 1)
+    print(json.dumps(results))
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], max_regression: float) -> List[str]:
+    """Metrics that regressed by more than max_regression (fraction) against the baseline"""
+    previous = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        for metric in THROUGHPUT_METRICS + LATENCY_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if metric in THROUGHPUT_METRICS else (new - old) / old
+            if change > max_regression:
+                regressions.append(f"{result['name']} {metric}: {old} → {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline hot-path benchmarks with fake providers')
+    parser.add_argument('--targets', nargs='+', default=TARGETS, choices=TARGETS)
+    parser.add_argument('--modes', nargs='+', default=DEBATE_MODES, choices=DEBATE_MODES,
+                        help='Debate execution modes to measure')
+    parser.add_argument('--debates', type=int, default=10, help='Debates per mode')
+    parser.add_argument('--queries', type=int, default=200, help='Search queries per scenario')
+    parser.add_argument('--batch-size', type=int, default=10, help='Queries per batched search')
+    parser.add_argument('--index-rows', type=int, default=5000, help='Approximate vector index size')
+    parser.add_argument('--latency-ms', type=float, default=200, help='Fake LLM median latency')
+    parser.add_argument('--p95-ms', type=float, default=600, help='Fake LLM p95 latency')
+    parser.add_argument('--embedding-latency-ms', type=float, default=30, help='Fake embedding median latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of LLM calls failing with 429 / 529')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='Multiply all fake latencies (0 measures pure CPU overhead)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hedge', default='off', choices=['off', 'duplicate', 'fallback'],
+                        help='Hedge slow LLM calls after their p95 latency (debate target)')
+    parser.add_argument('--quotas', action='store_true',
+                        help='Keep the production per-model rate limits instead of unlimited')
+    parser.add_argument('--json', type=Path, help='Write results to this file')
+    parser.add_argument('--baseline', type=Path, help='Compare against a previous --json run')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Allowed relative regression per metric before failing')
+    parser.add_argument('--child', choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    results: List[Dict[str, Any]] = []
+    for target in args.targets:
+        print(f"\n⏱  {target} ...", flush=True)
+        for result in run_target(target, args):
+            results.append(result)
+            line = (f"  {result['name']:<22} {result['ops_per_sec']:9.2f} {result['unit']}/s  "
+                    f"p50 {result['p50_ms']:8.1f}  p95 {result['p95_ms']:8.1f}  p99 {result['p99_ms']:8.1f} ms  "
+                    f"{result['tokens_per_sec']:9.1f} tok/s  peak {result['peak_mem_mb']:.1f} MB")
+            if 'ttft_p95_ms' in result:
+                line += f"  ttft p95 {result['ttft_p95_ms']:.1f} ms"
+            if 'hedged' in result:
+                line += f"  hedged {result['hedged']} (won {result['hedges_won']})"
+            if result['provider_errors']:
+                line += f"  errors {result['provider_errors']}/{result['provider_calls']}"
+            print(line)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"\n💾 Results written to {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.max_regression)
+        if regressions:
+            print(f"\n❌ Regressions beyond {args.max_regression:.0%}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Debate Function 클라이언트 풀
+인스턴스당 한 번 생성해 요청 간 재사용 (웜 요청은 초기화 비용 없음)
+"""
+import os
+import threading
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from lazy import LazyModule
+from result_cache import DebateResultCache
+from ratelimit import ProviderError, ProviderScheduler
+from hedging import LatencyTracker
+
+# SDK import는 첫 클라이언트 생성 시점까지 지연 (콜드 스타트 단축)
+anthropic = LazyModule('anthropic')
+httpx = LazyModule('httpx')
+vertexai = LazyModule('vertexai')
+generative_models = LazyModule('vertexai.generative_models')
+language_models = LazyModule('vertexai.language_models')
+
+ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'phsysics')
+GCP_LOCATION = os.getenv('GCP_LOCATION', 'us-central1')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')  # Production model for paid tier
+GEMINI_FALLBACK_MODEL = os.getenv('GEMINI_FALLBACK_MODEL', 'gemini-2.0-flash-lite')
+PERPLEXITY_API_KEY = os.getenv('PERPLEXITY_API_KEY')
+PERPLEXITY_BASE_URL = os.getenv('PERPLEXITY_BASE_URL', 'https://api.perplexity.ai')
+# 토론 응답이 한국어이므로 다국어 임베딩 모델 사용
+CONSENSUS_EMBEDDING_MODEL = os.getenv('CONSENSUS_EMBEDDING_MODEL', 'text-multilingual-embedding-002')
+
+
+class ClientPool:
+    """스레드 안전한 지연 생성 클라이언트 레지스트리
+
+    이름별 팩토리를 등록해 두고 최초 get() 시점에 한 번만 생성한다.
+    이름마다 락을 따로 두어 느린 클라이언트 생성이 다른 클라이언트를 막지 않는다.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """팩토리 등록 (이미 생성된 클라이언트는 버림)"""
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._clients.pop(name, None)
+            self._locks.setdefault(name, threading.Lock())
+
+    def override(self, name: str, client: Any) -> None:
+        """생성된 클라이언트를 직접 주입 (로컬 실행, 벤치마크용)"""
+        with self._registry_lock:
+            self._clients[name] = client
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """클라이언트 조회, 없으면 생성"""
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        with self._registry_lock:
+            if name not in self._locks:
+                raise KeyError(f"등록되지 않은 클라이언트: {name}")
+            lock = self._locks[name]
+
+        with lock:
+            # 다른 스레드가 먼저 생성했을 수 있음
+            client = self._clients.get(name)
+            if client is None:
+                client = self._factories[name]()
+                self._clients[name] = client
+            return client
+
+    def reset(self) -> None:
+        """생성된 클라이언트 모두 폐기"""
+        with self._registry_lock:
+            self._clients.clear()
+
+
+def _create_anthropic() -> Any:
+    # 같은 클라이언트를 재사용하면 내부 httpx 커넥션 풀이 TLS 세션을 keep-alive로 유지한다
+    # 재시도는 ProviderScheduler가 할당량을 보며 처리하므로 SDK 자체 재시도는 끈다
+    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
+
+
+def _create_perplexity() -> Any:
+    # Perplexity는 OpenAI 호환 REST API; anthropic SDK가 이미 의존하는 httpx로 호출한다
+    if not PERPLEXITY_API_KEY:
+        raise ProviderError('perplexity', "PERPLEXITY_API_KEY가 설정되지 않았습니다")
+    return httpx.Client(
+        base_url=PERPLEXITY_BASE_URL,
+        headers={'Authorization': f'Bearer {PERPLEXITY_API_KEY}'},
+        timeout=60.0,
+    )
+
+
+def _init_vertex() -> bool:
+    vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
+    return True
+
+
+def _create_gemini(pool: ClientPool) -> Any:
+    pool.get('vertexai')
+    return generative_models.GenerativeModel(GEMINI_MODEL)
+
+
+def _create_gemini_fallback(pool: ClientPool) -> Any:
+    pool.get('vertexai')
+    return generative_models.GenerativeModel(GEMINI_FALLBACK_MODEL)
+
+
+def _create_embedding_model(pool: ClientPool) -> Any:
+    pool.get('vertexai')
+    return language_models.TextEmbeddingModel.from_pretrained(CONSENSUS_EMBEDDING_MODEL)
+
+
+_pool = ClientPool()
+_pool.register('anthropic', _create_anthropic)
+_pool.register('vertexai', _init_vertex)
+_pool.register('gemini', partial(_create_gemini, _pool))
+_pool.register('gemini_fallback', partial(_create_gemini_fallback, _pool))
+_pool.register('perplexity', _create_perplexity)
+_pool.register('scheduler', ProviderScheduler)
+_pool.register('latency_tracker', LatencyTracker)
+_pool.register('embedding_model', partial(_create_embedding_model, _pool))
+_pool.register('result_cache', DebateResultCache)
+
+
+def get_pool(pool: Optional[ClientPool] = None) -> ClientPool:
+    """모듈 단위 공유 풀 반환"""
+    return pool if pool is not None else _pool
@@ -0,0 +1,143 @@
+"""
+합의도 계산기
+config/debate_config.yaml의 agreement_scoring 공식 구현:
+    score = embedding_weight * 코사인 유사도 + keyword_weight * 키워드 Jaccard
+한 라운드의 모든 입장을 한 번에 임베딩하고 N×N 행렬 연산으로 계산
+"""
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+from lazy import LazyModule
+
+np = LazyModule('numpy')
+
+# agreement_scoring (debate_config.yaml과 같은 기본값)
+EMBEDDING_WEIGHT = float(os.getenv('EMBEDDING_WEIGHT', '0.6'))
+KEYWORD_WEIGHT = float(os.getenv('KEYWORD_WEIGHT', '0.4'))
+MIN_KEYWORDS = int(os.getenv('MIN_KEYWORDS', '3'))
+
+_TOKEN = re.compile(r'[가-힣]+|[a-z][a-z0-9+#._-]*[a-z0-9+#]|[a-z]|\d+(?:\.\d+)?[a-z%]*')
+
+# 명사 뒤에 붙는 조사/어미 (긴 것부터 제거)
+_KOREAN_SUFFIXES = sorted([
+    '에서는', '으로는', '이라는', '이라고', '입니다', '합니다', '습니다', '됩니다', '에서', '에게', '으로',
+    '이며', '이고', '하고', '까지', '부터', '처럼', '보다', '라는', '라고', '이다', '하다', '하는', '해야',
+    '은', '는', '이', '가', '을', '를', '의', '에', '로', '와', '과', '도', '만', '며', '고',
+], key=len, reverse=True)
+
+_STOPWORDS = {
+    # English
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are',
+    'be', 'this', 'that', 'it', 'as', 'by', 'from', 'can', 'will', 'should', 'more', 'than', 'also',
+    'which', 'we', 'i', 'you', 'not', 'so', 'if', 'its', 'their', 'these', 'those', 'into', 'about',
+    # 한국어
+    '그리고', '하지만', '그러나', '또한', '따라서', '그래서', '이러한', '그런', '이런', '저', '그', '이',
+    '것', '수', '등', '및', '더', '매우', '가장', '있', '없', '있다', '없다', '위해', '대한', '통해', '같은',
+    '경우', '때문', '관점', '입장', '근거', '핵심', '생각', '의견', '제', '저는', '우리',
+}
+
+
+def _strip_suffix(token: str) -> str:
+    for suffix in _KOREAN_SUFFIXES:
+        # 어간이 최소 한 글자는 남도록
+        if token.endswith(suffix) and len(token) > len(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """한국어/영어 키워드 추출 (조사 제거, 불용어 제외, 중복 제거)"""
+    keywords = []
+    seen = set()
+    for token in _TOKEN.findall(text.lower()):
+        # '그리고', '하지만'처럼 조사로 끝나는 불용어는 조사를 떼기 전에 걸러낸다
+        if token in _STOPWORDS:
+            continue
+        if '가' <= token[0] <= '힣':
+            token = _strip_suffix(token)
+        if len(token) < 2 or token in _STOPWORDS or token in seen:
+            continue
+        seen.add(token)
+        keywords.append(token)
+    return keywords
+
+
+class ConsensusScorer:
+    """임베딩 + 키워드 가중 합의도 (N명 참가자 쌍별 행렬)
+
+    embed_fn은 텍스트 목록을 받아 벡터 목록을 돌려주는 함수로, 라운드당 한 번만 호출된다.
+    임베딩이 불가능하면 키워드 점수만 사용한다.
+    """
+
+    def __init__(self, embed_fn: Optional[Callable[[List[str]], List[Sequence[float]]]] = None,
+                 embedding_weight: float = EMBEDDING_WEIGHT, keyword_weight: float = KEYWORD_WEIGHT,
+                 min_keywords: int = MIN_KEYWORDS):
+        self.embed_fn = embed_fn
+        self.embedding_weight = embedding_weight
+        self.keyword_weight = keyword_weight
+        self.min_keywords = min_keywords
+        self._memo: Dict[tuple, object] = {}
+
+    def keyword_matrix(self, texts: List[str]):
+        """키워드 Jaccard 행렬과 참가자별 키워드 수"""
+        vocabulary: Dict[str, int] = {}
+        # 참가자별 희소 벡터 (키워드 id 목록)
+        term_ids = [[vocabulary.setdefault(t, len(vocabulary)) for t in tokenize(text)] for text in texts]
+
+        presence = np.zeros((len(texts), max(1, len(vocabulary))), dtype=np.float32)
+        for row, ids in enumerate(term_ids):
+            presence[row, ids] = 1.0
+
+        intersection = presence @ presence.T
+        sizes = np.diag(intersection)
+        union = sizes[:, None] + sizes[None, :] - intersection
+        jaccard = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        return jaccard, sizes
+
+    def embedding_matrix(self, texts: List[str]):
+        """코사인 유사도 행렬 (임베딩 실패 시 None)"""
+        if self.embed_fn is None:
+            return None
+        try:
+            vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+        except Exception as e:
+            print(f"합의도 임베딩 오류, 키워드 점수만 사용: {e}")
+            return None
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        return np.clip(vectors @ vectors.T, 0.0, 1.0)
+
+    def score_matrix(self, texts: List[str]):
+        """참가자 쌍별 합의도 행렬 (대각 성분 1)"""
+        key = tuple(texts)
+        if key in self._memo:
+            return self._memo[key]
+
+        jaccard, sizes = self.keyword_matrix(texts)
+        cosine = self.embedding_matrix(texts)
+
+        if cosine is None:
+            scores = jaccard
+        else:
+            # 키워드가 너무 적은 쌍은 키워드 점수를 신뢰하지 않고 임베딩만 사용
+            enough = (sizes[:, None] >= self.min_keywords) & (sizes[None, :] >= self.min_keywords)
+            keyword_weight = np.where(enough, self.keyword_weight, 0.0)
+            total = self.embedding_weight + keyword_weight
+            scores = (self.embedding_weight * cosine + keyword_weight * jaccard) / np.where(total == 0, 1.0, total)
+
+        np.fill_diagonal(scores, 1.0)
+        # 같은 라운드 안에서 반복 계산하지 않도록 최근 결과만 보관
+        self._memo = {key: scores}
+        return scores
+
+    def consensus(self, texts: List[str]) -> float:
+        """라운드 합의도: 서로 다른 참가자 쌍 점수의 평균"""
+        texts = [text or '' for text in texts]
+        if len(texts) < 2 or not all(text.strip() for text in texts):
+            return 0.0
+
+        scores = self.score_matrix(texts)
+        n = len(texts)
+        return float((scores.sum() - n) / (n * (n - 1)))
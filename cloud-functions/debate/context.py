@@ -0,0 +1,119 @@
+"""
+토론 컨텍스트 관리
+최근 발언은 원문 그대로(롤링 윈도우), 그 이전 라운드는 압축 요약으로 유지해
+라운드가 늘어도 프롬프트 길이가 토큰 예산 안에서 일정하게 유지되도록 한다.
+
+프롬프트 배치는 매 턴 같은 순서를 지킨다:
+    고정 지시문 + 주제 → 이전 라운드 요약 → 최근 발언
+"""
+import os
+import re
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+# 최근 몇 라운드의 발언을 원문으로 둘지 (윈도우 발언 수 = 라운드 수 × 참가자 수)
+CONTEXT_WINDOW_ROUNDS = int(os.getenv('CONTEXT_WINDOW_ROUNDS', '1'))
+# 컨텍스트(요약 + 최근 발언) 토큰 예산
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '2000'))
+# 요약에 남길 발언당 최대 글자 수
+SUMMARY_CHARS_PER_TURN = int(os.getenv('SUMMARY_CHARS_PER_TURN', '240'))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?。])\s+|\n+')
+_MARKDOWN = re.compile(r'^[#>*\-\s]+|\*\*')
+
+# 프롬프트 템플릿을 바꾸면 올린다 (토론 결과 캐시 키에 포함)
+PROMPT_VERSION = 2
+PROMPT_HEADER = """당신은 기술 토론 참가자입니다. 기술적 관점에서 간결하게 의견을 제시하세요 (3-4문장):
+- 당신의 입장
+- 핵심 근거
+
+주제: {topic}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """대략적인 토큰 수 (한국어는 1-2글자당 1토큰 수준)"""
+    return len(text) // 2 + 1
+
+
+def summarize_turn(text: str, max_chars: int = SUMMARY_CHARS_PER_TURN) -> str:
+    """발언의 앞 문장들로 만든 추출 요약 (추가 LLM 호출 없음)"""
+    sentences = []
+    length = 0
+    for sentence in _SENTENCE_END.split(text):
+        sentence = _MARKDOWN.sub('', sentence).strip()
+        if not sentence:
+            continue
+        if length and length + len(sentence) > max_chars:
+            break
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    summary = ' '.join(sentences)
+    return summary if len(summary) <= max_chars else summary[:max_chars - 3] + '...'
+
+
+class DebateContext:
+    """롤링 윈도우 + 누적 요약 컨텍스트
+
+    add()로 발언을 쌓고 render()로 프롬프트를 만든다. 윈도우를 벗어난 발언은
+    요약 한 줄로 바뀌어 요약 목록 끝에 붙는다. 예산을 넘으면 윈도우를 먼저 줄이고,
+    그래도 넘으면 가장 오래된 요약부터 버린다.
+    """
+
+    def __init__(self, topic: str, participants: int = 2, window_turns: Optional[int] = None,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.topic = topic
+        # 참가자가 늘어도 윈도우가 한 라운드 전체를 담도록 참가자 수에 비례
+        if window_turns is None:
+            window_turns = CONTEXT_WINDOW_ROUNDS * participants
+        self.window_turns = max(1, window_turns)
+        self.token_budget = token_budget
+        self.header = PROMPT_HEADER.format(topic=topic)
+        self.summary: List[str] = []
+        self.window: Deque[Tuple[str, int, str]] = deque()
+        self.dropped_summaries = 0
+
+    def _evict(self) -> None:
+        speaker, round_num, text = self.window.popleft()
+        self.summary.append(f"- {speaker} (Round {round_num}): {summarize_turn(text)}")
+
+    def _tokens(self) -> int:
+        return estimate_tokens('\n'.join(self.summary)) + sum(estimate_tokens(t) for _, _, t in self.window)
+
+    def add(self, speaker: str, round_num: int, text: str) -> None:
+        """발언 추가 후 윈도우/예산 정리"""
+        self.window.append((speaker, round_num, text))
+        while len(self.window) > self.window_turns:
+            self._evict()
+
+        # 최신 발언 하나는 항상 원문으로 유지
+        while self._tokens() > self.token_budget and len(self.window) > 1:
+            self._evict()
+        while self._tokens() > self.token_budget and self.summary:
+            self.summary.pop(0)
+            self.dropped_summaries += 1
+
+    def seed(self, note: str) -> None:
+        """이전 유사 토론의 결정을 요약 맨 앞에 둔다 (첫 발언 전에 호출)"""
+        self.summary.insert(0, f"- {note}")
+
+    def render(self) -> str:
+        """고정 순서 프롬프트"""
+        parts = [self.header]
+        if self.summary:
+            lines = self.summary
+            if self.dropped_summaries:
+                lines = [f"- (초기 발언 {self.dropped_summaries}개 생략)"] + lines
+            parts.append("이전 라운드 요약:\n" + '\n'.join(lines))
+        if self.window:
+            parts.append("최근 발언:\n" + '\n\n'.join(
+                f"{speaker} (Round {round_num}):\n{text}" for speaker, round_num, text in self.window
+            ))
+        return '\n\n'.join(parts)
+
+    def stats(self) -> dict:
+        return {
+            'summary_turns': len(self.summary),
+            'window_turns': len(self.window),
+            'dropped_turns': self.dropped_summaries,
+            'estimated_tokens': estimate_tokens(self.render()),
+        }
@@ -0,0 +1,103 @@
+"""
+수렴 판정기
+라운드별 합의도 궤적을 보고 토론을 계속할지, 조기 종료할지, 전문가(Perplexity)에게 넘길지 결정
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+EXPERT_THRESHOLD = float(os.getenv('EXPERT_THRESHOLD', '0.70'))
+# 연속 PLATEAU_ROUNDS 라운드 동안 변화가 PLATEAU_DELTA 미만이면 정체로 본다
+PLATEAU_DELTA = float(os.getenv('PLATEAU_DELTA', '0.02'))
+PLATEAU_ROUNDS = int(os.getenv('PLATEAU_ROUNDS', '2'))
+# 남은 라운드 동안 기대할 수 있는 라운드당 최대 상승폭 (관측된 상승폭이 더 크면 그 값을 사용)
+MAX_GAIN_PER_ROUND = float(os.getenv('MAX_GAIN_PER_ROUND', '0.10'))
+
+
+class ConvergenceController:
+    """합의도 궤적 기반 조기 종료 판정
+
+    observe()는 라운드마다 호출되며 토론을 멈춰야 하면 결정(dict)을, 계속하면 None을 돌려준다.
+    결정은 결과 JSON에 그대로 기록된다:
+        {"action": "adopt" | "escalate" | "review" | "aborted", "reason": ..., "round": n,
+         "max_rounds": m, "rounds_saved": k, "trajectory": [...]}
+    """
+
+    def __init__(self, threshold: float, max_rounds: int, expert_threshold: float = EXPERT_THRESHOLD,
+                 plateau_delta: float = PLATEAU_DELTA, plateau_rounds: int = PLATEAU_ROUNDS,
+                 max_gain_per_round: float = MAX_GAIN_PER_ROUND):
+        self.threshold = threshold
+        self.max_rounds = max_rounds
+        self.expert_threshold = expert_threshold
+        self.plateau_delta = plateau_delta
+        self.plateau_rounds = plateau_rounds
+        self.max_gain_per_round = max_gain_per_round
+        self.trajectory: List[float] = []
+        self.decision: Optional[Dict[str, Any]] = None
+
+    def _deltas(self) -> List[float]:
+        return [b - a for a, b in zip(self.trajectory, self.trajectory[1:])]
+
+    def _plateaued(self) -> bool:
+        recent = self._deltas()[-self.plateau_rounds:]
+        return len(recent) == self.plateau_rounds and all(abs(d) < self.plateau_delta for d in recent)
+
+    def _oscillating(self) -> bool:
+        """최근 세 번의 변화가 오르내림을 반복 (각 변화가 정체 기준보다 큼)"""
+        recent = self._deltas()[-3:]
+        if len(recent) < 3 or any(abs(d) < self.plateau_delta for d in recent):
+            return False
+        return all((a > 0) != (b > 0) for a, b in zip(recent, recent[1:]))
+
+    def _unreachable(self, round_num: int) -> bool:
+        """남은 라운드에서 가장 낙관적인 상승폭으로도 임계값에 못 미침"""
+        if len(self.trajectory) < 2:
+            return False
+        best_gain = max([self.max_gain_per_round] + self._deltas())
+        remaining = self.max_rounds - round_num
+        return self.trajectory[-1] + best_gain * remaining < self.threshold
+
+    def _decide(self, round_num: int, reason: str) -> Dict[str, Any]:
+        score = self.trajectory[-1] if self.trajectory else 0.0
+        if score >= self.threshold:
+            action = 'adopt'
+        elif score < self.expert_threshold:
+            # 합의 가능성이 낮음 → 남은 라운드 대신 전문가 판정
+            action = 'escalate'
+        else:
+            action = 'review'
+
+        self.decision = {
+            'action': action,
+            'reason': reason,
+            'round': round_num,
+            'max_rounds': self.max_rounds,
+            'rounds_saved': self.max_rounds - round_num,
+            'trajectory': [round(s, 3) for s in self.trajectory],
+        }
+        return self.decision
+
+    def observe(self, round_num: int, score: float) -> Optional[Dict[str, Any]]:
+        """라운드 합의도 기록 후 종료 여부 판정"""
+        self.trajectory.append(score)
+
+        if score >= self.threshold:
+            return self._decide(round_num, 'consensus')
+        if round_num >= self.max_rounds:
+            return self._decide(round_num, 'max_rounds')
+        if self._plateaued():
+            return self._decide(round_num, 'plateau')
+        if self._oscillating():
+            return self._decide(round_num, 'oscillation')
+        if self._unreachable(round_num):
+            return self._decide(round_num, 'unreachable')
+        return None
+
+    def abort(self, round_num: int, error: Exception) -> Dict[str, Any]:
+        """제공자 오류로 중단 (round_num은 마지막으로 완료된 라운드)"""
+        self._decide(round_num, 'provider_error')
+        self.decision.update({'action': 'aborted', 'error': str(error)[:300]})
+        return self.decision
+
+    def finish(self, round_num: int) -> Dict[str, Any]:
+        """루프가 결정 없이 끝난 경우의 최종 결정"""
+        return self.decision or self._decide(round_num, 'max_rounds')
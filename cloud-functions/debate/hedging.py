@@ -0,0 +1,92 @@
+"""
+꼬리 지연 헤징
+모델별 최근 응답 시간으로 p95를 추정해, 주 요청이 그 시간 안에 답하지 않으면
+같은 요청(duplicate)이나 더 싼 대체 모델 요청(fallback)을 하나 더 띄우고 먼저 온 응답을 쓴다
+헤지는 p95를 넘긴 느린 호출에만 걸리고 예산(최근 호출 중 헤지 비율)으로 상한을 두어 평균 비용은 거의 그대로다
+"""
+import math
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# off: 헤지 없음 (호출 제한 시간만 적용), duplicate: 같은 모델로 다시 요청, fallback: 대체 모델로 요청
+HEDGE_MODE = os.getenv('HEDGE_MODE', 'off')
+# 이 백분위 응답 시간이 지나도록 답이 없으면 헤지
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+# 모델별 표본이 이만큼 쌓이기 전에는 헤지하지 않음
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+# 헤지 대기 시간 하한 (초, 짧은 호출까지 이중으로 보내지 않도록)
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '1.0'))
+# 최근 호출 중 헤지를 띄울 수 있는 최대 비율 (제공자 전체가 느려졌을 때 요청이 두 배가 되지 않도록)
+HEDGE_MAX_RATE = float(os.getenv('HEDGE_MAX_RATE', '0.1'))
+# 모델별로 보관하는 최근 응답 시간 / 호출 수
+LATENCY_WINDOW = int(os.getenv('LATENCY_WINDOW', '200'))
+
+HEDGE_MODES = ('off', 'duplicate', 'fallback')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """최근접 순위 백분위 (빈 목록이면 0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct * len(ordered) / 100) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class LatencyTracker:
+    """모델별 최근 응답 시간과 제공자별 헤지 예산 (인스턴스 공유, 스레드 안전)"""
+
+    def __init__(self, mode: str = HEDGE_MODE, pct: float = HEDGE_PERCENTILE, min_samples: int = HEDGE_MIN_SAMPLES,
+                 min_delay: float = HEDGE_MIN_DELAY, max_rate: float = HEDGE_MAX_RATE, window: int = LATENCY_WINDOW):
+        if mode not in HEDGE_MODES:
+            raise ValueError(f"알 수 없는 HEDGE_MODE: {mode} (가능: {', '.join(HEDGE_MODES)})")
+        self.mode = mode
+        self.pct = pct
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._calls: Dict[str, Deque[bool]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float) -> None:
+        """완료된 호출의 응답 시간 (헤지에 져서 끊긴 호출은 끊긴 시점까지의 하한값)"""
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """헤지를 띄울 대기 시간 (헤지 꺼짐 또는 표본 부족이면 None)"""
+        if self.mode == 'off':
+            return None
+        with self._lock:
+            samples = list(self._latencies.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(percentile(samples, self.pct), self.min_delay)
+
+    def record_call(self, system: str, hedged: bool) -> None:
+        with self._lock:
+            self._calls.setdefault(system, deque(maxlen=self.window)).append(hedged)
+
+    def allow_hedge(self, system: str) -> bool:
+        """예산 안에서만 헤지 (표본이 적을 때는 min_samples 호출 기준으로 계산)"""
+        with self._lock:
+            calls = self._calls.get(system, ())
+            return sum(calls) < self.max_rate * max(len(calls), self.min_samples)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """모델별 p50/p95와 제공자별 헤지 비율"""
+        with self._lock:
+            latencies = {model: list(samples) for model, samples in self._latencies.items()}
+            calls = {system: list(history) for system, history in self._calls.items()}
+        stats: Dict[str, Dict[str, float]] = {
+            model: {'samples': len(samples), 'p50_s': round(percentile(samples, 50), 3),
+                    'p95_s': round(percentile(samples, 95), 3)}
+            for model, samples in latencies.items()
+        }
+        for system, history in calls.items():
+            stats[system] = {'calls': len(history), 'hedge_rate': round(sum(history) / len(history), 3)}
+        return stats
@@ -0,0 +1,274 @@
+"""
+비동기 토론 작업 큐
+POST는 작업을 저장소에 넣고 작업 ID만 즉시 반환하고, 백그라운드 워커가 토론을 실행한다.
+클라이언트는 상태/결과를 폴링하거나 이벤트를 구독한다.
+
+저장소는 JobStore 인터페이스로 교체 가능하며 기본 구현은 SQLite (/tmp, 인스턴스 로컬).
+인스턴스 로컬 저장소이므로 다른 인스턴스로 라우팅된 폴링은 작업을 찾지 못하고(404),
+응답 후에도 워커가 CPU를 받아야 한다. 따라서 기본 구현은 단일 인스턴스 +
+CPU 상시 할당(--max-instances=1, --no-cpu-throttling)으로 배포해야 한다 (deploy.sh).
+여러 인스턴스로 확장하려면 공유 저장소(Firestore, Cloud SQL 등) JobStore 구현이 필요하다.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', '/tmp/debate_jobs.sqlite3')
+JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', '2'))
+# 완료된 작업 보관 기간
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', '86400'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# 저장할 이벤트 (token 이벤트는 양이 많아 저장하지 않음)
+STORED_EVENTS = ('start', 'opinion', 'round', 'result')
+
+
+class JobCancelled(Exception):
+    """취소 요청된 작업"""
+
+
+class JobStore:
+    """작업 저장소 인터페이스"""
+
+    def create(self, topic: str, params: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def claim(self, job_id: str) -> bool:
+        """queued → running (다른 워커가 먼저 가져갔거나 취소됐으면 False)"""
+        raise NotImplementedError
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """취소 요청, 변경 후 상태 반환 (없는 작업이면 None)"""
+        raise NotImplementedError
+
+    def cancel_requested(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def append_event(self, job_id: str, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """after 이후 이벤트 (각 이벤트에 seq 포함)"""
+        raise NotImplementedError
+
+    def queued_ids(self) -> List[str]:
+        raise NotImplementedError
+
+    def requeue_running(self) -> int:
+        """이전 프로세스가 실행 중에 종료된 작업을 다시 대기열로"""
+        raise NotImplementedError
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite 작업 저장소 (WAL, 여러 프로세스가 같은 파일을 공유해도 안전)"""
+
+    def __init__(self, path: str = JOB_STORE_PATH, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, topic TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, '
+            'cancel_requested INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, '
+            'created_at REAL NOT NULL, started_at REAL, finished_at REAL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS job_events ('
+            'job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, PRIMARY KEY (job_id, seq))'
+        )
+        self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)', (cutoff,)
+            )
+            self._db.execute('DELETE FROM jobs WHERE finished_at < ?', (cutoff,))
+
+    def create(self, topic: str, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO jobs (id, topic, params, status, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, topic, json.dumps(params, ensure_ascii=False), QUEUED, time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, topic, params, status, cancel_requested, result, error, '
+                'created_at, started_at, finished_at FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'topic': row[1],
+            'params': json.loads(row[2]),
+            'status': row[3],
+            'cancel_requested': bool(row[4]),
+            'result': json.loads(row[5]) if row[5] else None,
+            'error': row[6],
+            'created_at': row[7],
+            'started_at': row[8],
+            'finished_at': row[9],
+        }
+
+    def claim(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?',
+                (RUNNING, time.time(), job_id, QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            # 아직 시작 전이면 바로 취소, 실행 중이면 워커가 다음 이벤트에서 중단
+            self._db.execute(
+                'UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ? AND status = ?',
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+            self._db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING))
+            row = self._db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def append_event(self, job_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO job_events (job_id, seq, event) '
+                'SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM job_events WHERE job_id = ?',
+                (job_id, json.dumps(event, ensure_ascii=False), job_id),
+            )
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq', (job_id, after)
+            ).fetchall()
+        return [{**json.loads(event), 'seq': seq} for seq, event in rows]
+
+    def queued_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute('SELECT id FROM jobs WHERE status = ? ORDER BY created_at', (QUEUED,)).fetchall()
+        return [row[0] for row in rows]
+
+    def requeue_running(self) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?', (QUEUED, RUNNING)
+            )
+        return cursor.rowcount
+
+
+class JobQueue:
+    """동시 실행 수가 제한된 백그라운드 워커
+
+    run_fn(topic, params)는 토론 이벤트 이터레이터를 돌려준다. 워커는 이벤트마다
+    취소 요청을 확인하고, 요청됐으면 이터레이터를 닫아 남은 모델 호출을 중단한다.
+    """
+
+    def __init__(self, store: JobStore, run_fn: Callable[[str, Dict[str, Any]], Iterator[Dict[str, Any]]],
+                 max_concurrency: int = JOB_CONCURRENCY):
+        self.store = store
+        self.run_fn = run_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='debate-job')
+
+        # 인스턴스가 재시작되면 실행 중이던 작업을 이어서 처리
+        recovered = store.requeue_running()
+        for job_id in store.queued_ids():
+            self._executor.submit(self._run, job_id)
+        if recovered:
+            print(f"중단된 토론 작업 {recovered}개 재시작")
+
+    def submit(self, topic: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """작업 등록 후 즉시 ID 반환 (워커가 모두 바쁘면 대기열에서 기다림)"""
+        job_id = self.store.create(topic, params or {})
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        return self.store.request_cancel(job_id)
+
+    def _run(self, job_id: str) -> None:
+        if not self.store.claim(job_id):
+            return
+
+        events = None
+        result = None
+        try:
+            # 참가자 구성 오류 등 실행 준비 단계의 예외도 FAILED로 기록
+            job = self.store.get(job_id)
+            events = self.run_fn(job['topic'], job['params'])
+            for event in events:
+                if event['event'] in STORED_EVENTS:
+                    self.store.append_event(job_id, event)
+                if event['event'] == 'result':
+                    result = event['result']
+                # 결과가 이미 나왔으면 늦게 도착한 취소 요청은 무시하고 완료로 기록
+                if result is None and self.store.cancel_requested(job_id):
+                    raise JobCancelled(job_id)
+        except JobCancelled:
+            self.store.finish(job_id, CANCELLED)
+            return
+        except Exception as e:
+            print(f"토론 작업 실패 {job_id}: {e}")
+            self.store.finish(job_id, FAILED, error=str(e))
+            return
+        finally:
+            close = getattr(events, 'close', None)
+            if close is not None:
+                close()
+
+        self.store.finish(job_id, SUCCEEDED, result=result)
+
+    def follow(self, job_id: str, after: int = 0, poll_seconds: float = 0.5,
+               timeout: float = 600) -> Iterator[Dict[str, Any]]:
+        """작업 이벤트 구독 (종료 상태가 될 때까지 저장소를 폴링)"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            for event in self.store.events(job_id, after):
+                after = event['seq']
+                yield event
+            job = self.store.get(job_id)
+            if job is None or job['status'] in TERMINAL_STATUSES:
+                # 종료 직전에 쌓인 이벤트까지 전달
+                yield from self.store.events(job_id, after)
+                yield {'event': 'status', 'job_id': job_id, 'status': job['status'] if job else None}
+                return
+            time.sleep(poll_seconds)
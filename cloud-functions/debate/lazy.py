@@ -0,0 +1,83 @@
+"""
+지연 import 및 콜드 스타트 프로파일러
+무거운 SDK import를 실제로 쓰는 코드 경로까지 미루고, 소요 시간을 기록
+"""
+import functools
+import importlib
+import json
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional
+
+# 이 모듈이 처음 로드된 시점을 인스턴스 시작 시점으로 본다
+_PROCESS_START = time.perf_counter()
+
+_lock = threading.Lock()
+_import_times: Dict[str, float] = {}
+_first_response_ms: Optional[float] = None
+
+
+def lazy_import(name: str) -> ModuleType:
+    """모듈 import (최초 import 소요 시간 기록)"""
+    # sys.modules에는 다른 스레드가 초기화 중인 모듈도 들어 있으므로 바로 반환하지 않는다.
+    # import_module은 모듈별 import 락을 잡고 초기화가 끝날 때까지 기다려 준다.
+    loaded = name in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if not loaded:
+        with _lock:
+            _import_times.setdefault(name, round(elapsed_ms, 1))
+    return module
+
+
+class LazyModule:
+    """속성에 처음 접근할 때 import되는 모듈 프록시"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = lazy_import(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'deferred'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def startup_report() -> Dict[str, Any]:
+    """모듈별 import 시간과 첫 응답까지 걸린 시간"""
+    with _lock:
+        imports = dict(_import_times)
+    return {
+        'import_ms': imports,
+        'import_total_ms': round(sum(imports.values()), 1),
+        'time_to_first_response_ms': _first_response_ms,
+    }
+
+
+def profile_first_response(handler: Callable) -> Callable:
+    """HTTP 핸들러 래퍼: 인스턴스의 첫 응답 시점에 시작 프로파일을 한 번 출력"""
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        global _first_response_ms
+        response = handler(*args, **kwargs)
+
+        if _first_response_ms is None:
+            with _lock:
+                first = _first_response_ms is None
+                if first:
+                    _first_response_ms = round((time.perf_counter() - _PROCESS_START) * 1000, 1)
+            if first:
+                print(json.dumps({'startup_profile': startup_report()}))
+
+        return response
+
+    return wrapper
@@ -4,152 +4,659 @@ Vertex AI Agent Builder에서 호출하는 토론 엔드포인트
 """
 import os
 import json
-from typing import Dict, Any
-import anthropic
-import vertexai
-from vertexai.generative_models import GenerativeModel
+import queue
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
 import functions_framework
-from flask import jsonify
-
-# API Keys and Config
-ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
-GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'phsysics')
-GCP_LOCATION = os.getenv('GCP_LOCATION', 'us-central1')
+from flask import Response, jsonify, stream_with_context
+
+import tracing
+from lazy import profile_first_response
+from clients import ClientPool, get_pool, GEMINI_MODEL, CONSENSUS_EMBEDDING_MODEL
+from consensus import ConsensusScorer
+from convergence import ConvergenceController
+from context import DebateContext, PROMPT_VERSION, estimate_tokens, summarize_turn
+from result_cache import config_fingerprint
+from ratelimit import ProviderError
+from providers import (Provider, PerplexityProvider, build_participants, CLAUDE_MODEL, PERPLEXITY_MODEL,
+                       DEBATE_PARTICIPANTS, TEMPERATURE, MAX_TOKENS)
+from jobs import JobQueue, SQLiteJobStore, TERMINAL_STATUSES, SUCCEEDED
+
+_tracer = tracing.get_tracer(__name__)
 
 # Config
 MAX_ROUNDS = int(os.getenv('MAX_ROUNDS', '3'))
+if MAX_ROUNDS < 1:
+    raise ValueError(f"MAX_ROUNDS는 1 이상이어야 합니다 (현재 {MAX_ROUNDS})")
 CONSENSUS_THRESHOLD = float(os.getenv('CONSENSUS_THRESHOLD', '0.85'))
+# 참가자별 라운드 제한 시간 (config/debate_config.yaml round_timeout, 초)
+ROUND_TIMEOUT = float(os.getenv('ROUND_TIMEOUT', '300'))
+# sequential: 참가자 순서대로 호출 (앞 참가자의 같은 라운드 의견을 보고 답함)
+# independent: 같은 컨텍스트로 모든 참가자 동시 호출
+# pipelined: 첫 참가자의 N+1 라운드를 나머지 참가자의 N 라운드와 겹쳐 실행
+DEBATE_MODE = os.getenv('DEBATE_MODE', 'sequential')
+EXPERT_ENABLED = os.getenv('EXPERT_ENABLED', 'true').lower() == 'true'
+# true면 모든 토론을 작업 큐로 실행 (Dialogflow webhook 시간 제한 회피)
+DEBATE_ASYNC = os.getenv('DEBATE_ASYNC', 'false').lower() == 'true'
+
+# 결과 캐시 키에 들어가는 설정 (하나라도 바뀌면 이전 결과를 재사용하지 않음)
+CACHE_FINGERPRINT = config_fingerprint({
+    'models': {'claude': CLAUDE_MODEL, 'gemini': GEMINI_MODEL, 'perplexity': PERPLEXITY_MODEL,
+               'embedding': CONSENSUS_EMBEDDING_MODEL},
+    'participants': DEBATE_PARTICIPANTS,
+    'params': {'temperature': TEMPERATURE, 'max_tokens': MAX_TOKENS, 'max_rounds': MAX_ROUNDS,
+               'consensus_threshold': CONSENSUS_THRESHOLD},
+    'prompt_version': PROMPT_VERSION,
+})
+
+
+def _positions(result: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """결과의 참가자별 최종 입장 ({참가자}_position 키, 참가자 순서, 최종 답변이 없으면 None)"""
+    return {key[:-len('_position')]: value for key, value in result.items() if key.endswith('_position')}
 
 
 class QuickDebateEngine:
     """간단한 토론 엔진 (Cloud Function 최적화)"""
 
-    def __init__(self, topic: str):
+    def __init__(self, topic: str, pool: Optional[ClientPool] = None, use_cache: bool = True,
+                 participants: Sequence[str] = DEBATE_PARTICIPANTS):
         self.topic = topic
-        self.claude = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
-        # Initialize Vertex AI
-        vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
-        self.gemini = GenerativeModel('gemini-2.0-flash')  # Production model for paid tier
 
-    def get_claude_opinion(self, context: str = "") -> str:
-        """Claude 의견"""
+        # 인스턴스 공유 클라이언트 재사용 (요청마다 생성하지 않음)
+        pool = get_pool(pool)
+        self.pool = pool
+        # 프로세스 간 공유 할당량 + 서킷 브레이커
+        self.scheduler = pool.get('scheduler')
+        # 라운드 참가자 (순서 = 발언/결과 순서), 전문가 판정은 참가자 여부와 상관없이 Perplexity
+        self.participants: List[Provider] = build_participants(pool, self.scheduler, participants)
+        self.expert = PerplexityProvider(pool, self.scheduler, temperature=0.5, max_tokens=500)
+        self.scorer = ConsensusScorer(lambda texts: self._embed_positions(pool, texts))
+
+        # 과거 토론 결과 캐시 (정확/유사 주제)
+        self.cache = pool.get('result_cache') if use_cache else None
+        self.seed: Optional[Dict[str, Any]] = None
+        self._topic_embedding: Optional[List[float]] = None
+
+    @staticmethod
+    def _embed_positions(pool: ClientPool, texts: List[str]) -> List[List[float]]:
+        """라운드의 모든 입장을 한 번의 호출로 임베딩"""
+        with _tracer.start_as_current_span('embedding', {
+            tracing.MODEL: CONSENSUS_EMBEDDING_MODEL,
+            tracing.INPUT_TOKENS: sum(estimate_tokens(text) for text in texts),
+            'texts': len(texts),
+        }):
+            embeddings = pool.get('embedding_model').get_embeddings(texts)
+        return [embedding.values for embedding in embeddings]
+
+    @property
+    def models_used(self) -> Dict[str, int]:
+        """참가자가 실제로 응답받은 모델별 호출 수 (대체 모델 포함)"""
+        used: Dict[str, int] = {}
+        for provider in self.participants:
+            for model, count in provider.models_used.items():
+                used[model] = used.get(model, 0) + count
+        return used
+
+    def get_expert_judgment(self, positions: Dict[str, str]) -> Dict[str, Any]:
+        """Perplexity 전문가 판정 (합의 가능성이 낮을 때)"""
+        stances = "\n\n".join(f"{name} 최종 입장:\n{text}" for name, text in positions.items())
         prompt = f"""주제: {self.topic}
 
-{context}
+{stances}
 
-기술적 관점에서 간결하게 의견을 제시하세요 (3-4문장):
-- 당신의 입장
-- 핵심 근거"""
+각 입장을 검토하고 채택 여부를 판정하세요. 다음 형식으로 답하세요:
+DECISION: APPROVE 또는 REJECT
+REASON: 판정 근거 (2-3문장)"""
 
         try:
-            msg = self.claude.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=500,
-                temperature=0.7,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return msg.content[0].text
-        except Exception as e:
-            return f"Claude 응답 오류: {e}"
+            text = self.expert.generate(prompt, time.monotonic() + ROUND_TIMEOUT)
+        except ProviderError as e:
+            return {'model': PERPLEXITY_MODEL, 'approved': None, 'full_response': f"Perplexity 응답 오류: {e}"}
 
-    def get_gemini_opinion(self, context: str = "") -> str:
-        """Gemini 의견"""
-        prompt = f"""주제: {self.topic}
+        decision_line = next((line for line in text.splitlines() if 'DECISION' in line.upper()), '')
+        return {
+            'model': PERPLEXITY_MODEL,
+            'approved': 'APPROVE' in decision_line.upper(),
+            'full_response': text,
+        }
 
-{context}
+    def calculate_consensus(self, *positions: str) -> float:
+        """합의도 계산 (임베딩 코사인 + 키워드 겹침, agreement_scoring 가중치)"""
+        with _tracer.start_as_current_span('consensus', {'positions': len(positions)}) as span:
+            score = self.scorer.consensus(list(positions))
+            span.set_attribute('consensus.score', round(score, 3))
+            return score
+
+    def lookup_cache(self) -> Optional[Dict[str, Any]]:
+        """캐시된 결과 반환 (정확히 같은 주제 → 유사 주제 순)
+
+        유사도가 반환 기준에는 못 미치지만 시드 기준 이상이면 self.seed에 보관해
+        새 토론의 컨텍스트에 이전 결정을 넣는다.
+        """
+        if self.cache is None or not self.cache.enabled:
+            return None
+
+        with _tracer.start_as_current_span('cache.lookup') as span:
+            cached = self.cache.get(self.topic, CACHE_FINGERPRINT)
+            if cached is None:
+                try:
+                    self._topic_embedding = self._embed_positions(self.pool, [self.topic])[0]
+                except Exception as e:
+                    print(f"주제 임베딩 오류, 유사 토론 검색 생략: {e}")
+                cached = self.cache.nearest(self._topic_embedding, CACHE_FINGERPRINT)
+            span.set_attribute('cache.hit', cached['hit'] if cached else 'miss')
+        if cached is None:
+            return None
+
+        info = {key: value for key, value in cached.items() if key != 'result'}
+        if cached['hit'] == 'seed':
+            self.seed = cached
+            return None
+
+        print(f"캐시된 토론 결과 사용 ({info['hit']}, 유사도 {info['similarity']})")
+        return {**cached['result'], "topic": self.topic, "cache": info, "timing": tracing.breakdown()}
+
+    def _new_context(self) -> DebateContext:
+        context = DebateContext(self.topic, participants=len(self.participants))
+        if self.seed is not None:
+            prior = self.seed['result']
+            # 최종 입장이 있는 첫 참가자의 입장을 이전 결론으로 사용
+            conclusion = next((text for text in _positions(prior).values() if text), '')
+            context.seed(f"이전 유사 토론 '{self.seed['source_topic']}' 결론 "
+                         f"(합의도 {prior['consensus_score']:.0%}): {summarize_turn(conclusion)}")
+        return context
 
-기술적 관점에서 간결하게 의견을 제시하세요 (3-4문장):
-- 당신의 입장
-- 핵심 근거"""
+    def debate(self) -> Dict[str, Any]:
+        """토론 실행 (이벤트를 끝까지 소비해 최종 결과만 반환하는 비스트리밍 어댑터)"""
+        if DEBATE_MODE in ('independent', 'pipelined'):
+            with _tracer.start_as_current_span('debate', {'debate.mode': DEBATE_MODE}):
+                cached = self.lookup_cache()
+                if cached is not None:
+                    return cached
+                return asyncio.run(self.debate_async(DEBATE_MODE))
+
+        for event in self.debate_events(stream=False):
+            if event['event'] == 'result':
+                return event['result']
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """토론 하나의 SDK 호출용 스레드 풀
+
+        제한 시간을 넘겨 버려진 블로킹 호출이 스레드를 잡고 있어도 다음 라운드가 기다리지 않도록
+        참가자 수의 두 배로 잡는다. 기본 executor를 쓰면 종료 시 버려진 호출까지 기다리게 된다.
+        """
+        return ThreadPoolExecutor(max_workers=2 * len(self.participants), thread_name_prefix='debate')
+
+    @staticmethod
+    def _timeout_error(provider: Provider) -> ProviderError:
+        return ProviderError(provider.system, f"라운드 제한 시간 {ROUND_TIMEOUT:g}초 안에 응답하지 않음")
+
+    def _failed(self, round_num: int, provider: Provider, error: ProviderError) -> Dict[str, Any]:
+        """참가자 하나의 실패 이벤트 (그 참가자만 이번 라운드에서 빠짐)"""
+        print(f"{provider.name} 발언 실패 (Round {round_num}): {error}")
+        return {"event": "error", "round": round_num, "speaker": provider.name,
+                "provider": error.provider, "message": str(error)}
+
+    def _check_quorum(self, errors: List[ProviderError]) -> None:
+        """남은 참가자가 둘 미만이면 라운드를 끝낼 수 없으므로 첫 오류를 전파"""
+        if len(self.participants) - len(errors) < 2:
+            raise errors[0]
+
+    @staticmethod
+    def _speak(provider: Provider, round_num: int, prompt: str, stream: bool, deadline: float,
+               emit, cancelled: threading.Event) -> str:
+        """한 참가자 발언 (작업 스레드): 스트리밍이면 token 이벤트를 emit으로 넘기고 전체 텍스트 반환"""
+        if not stream:
+            return provider.generate(prompt, deadline)
+
+        chunks = []
+        tokens = provider.stream(prompt, deadline)
+        try:
+            for chunk in tokens:
+                # 제한 시간이 지나 버려진 발언은 스트림을 닫아 생성을 멈춘다
+                if cancelled.is_set():
+                    break
+                chunks.append(chunk)
+                emit({"event": "token", "speaker": provider.name, "round": round_num, "text": chunk})
+        finally:
+            tokens.close()
+        return ''.join(chunks)
+
+    def _run_turns(self, executor: Executor, round_num: int, turns: List[Tuple[Provider, str]],
+                   stream: bool, deadline: float):
+        """참가자 발언을 동시에 실행: token/opinion/error 이벤트를 도착 순서대로 내고 ({이름: 의견}, 오류 목록) 반환
+
+        deadline(time.monotonic 기준)까지 답하지 않은 참가자는 error 이벤트를 내고 이번 라운드에서 빠진다.
+        블로킹 SDK 호출은 중간에 끊을 수 없으므로 결과만 버리고, 스트림은 다음 토큰에서 닫는다.
+        """
+        arrivals: queue.Queue = queue.Queue()
+        cancelled = threading.Event()
+
+        def run(provider: Provider, prompt: str) -> None:
+            try:
+                text = self._speak(provider, round_num, prompt, stream, deadline,
+                                   lambda event: arrivals.put(('token', provider, event)), cancelled)
+                arrivals.put(('opinion', provider, text))
+            except Exception as e:
+                arrivals.put(('error', provider, e))
+
+        for provider, prompt in turns:
+            executor.submit(tracing.bind(run), provider, prompt)
+
+        pending = [provider for provider, _ in turns]
+        opinions: Dict[str, str] = {}
+        errors: List[ProviderError] = []
+        try:
+            while pending:
+                try:
+                    kind, provider, payload = arrivals.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if kind == 'token':
+                    yield payload
+                    continue
+                pending.remove(provider)
+                if kind == 'opinion':
+                    opinions[provider.name] = payload
+                    yield {"event": "opinion", "speaker": provider.name, "round": round_num, "text": payload}
+                elif isinstance(payload, ProviderError):
+                    errors.append(payload)
+                    yield self._failed(round_num, provider, payload)
+                else:
+                    raise payload
+        finally:
+            cancelled.set()
+
+        for provider in pending:
+            errors.append(self._timeout_error(provider))
+            yield self._failed(round_num, provider, errors[-1])
+        # 도착 순서가 아니라 참가자 순서 (컨텍스트와 결과가 결정적)
+        return {provider.name: opinions[provider.name] for provider, _ in turns if provider.name in opinions}, errors
+
+    def debate_events(self, stream: bool = True) -> Iterator[Dict[str, Any]]:
+        """토론을 이벤트 스트림으로 실행
+
+        start → (token… → opinion | error) × 참가자 → round → … → result
+        stream=True면 모델 스트리밍 API로 토큰이 도착하는 즉시 token 이벤트를 낸다.
+        DEBATE_MODE가 sequential이 아니면 라운드 참가자를 동시에 호출해 이벤트가 섞여 도착한다
+        (pipelined는 이벤트 스트림에서는 independent와 같음).
+        """
+        yield {"event": "start", "topic": self.topic, "max_rounds": MAX_ROUNDS}
+
+        sequential = DEBATE_MODE == 'sequential'
+        with _tracer.start_as_current_span('debate.run', {
+            'debate.mode': DEBATE_MODE if not stream else f'stream/{DEBATE_MODE}',
+            'participants': len(self.participants),
+        }):
+            cached = self.lookup_cache()
+            if cached is not None:
+                yield {"event": "result", "result": cached}
+                return
+
+            # 최근 발언 원문 + 이전 라운드 요약 (라운드가 늘어도 프롬프트 길이 일정)
+            context = self._new_context()
+            finals: Dict[str, str] = {}
+            controller = ConvergenceController(CONSENSUS_THRESHOLD, MAX_ROUNDS)
+            groups = [[provider] for provider in self.participants] if sequential else [self.participants]
+            executor = self._executor()
+
+            try:
+                for round_num in range(1, MAX_ROUNDS + 1):
+                    with _tracer.start_as_current_span('debate.round', {'round': round_num}):
+                        deadline = time.monotonic() + ROUND_TIMEOUT
+                        opinions: Dict[str, str] = {}
+                        errors: List[ProviderError] = []
+                        try:
+                            for group in groups:
+                                # 같은 묶음의 참가자는 같은 컨텍스트를 본다
+                                turns = [(provider, context.render()) for provider in group]
+                                spoken, failed = yield from self._run_turns(executor, round_num, turns,
+                                                                            stream, deadline)
+                                for name, text in spoken.items():
+                                    context.add(name, round_num, text)
+                                opinions.update(spoken)
+                                errors.extend(failed)
+                                self._check_quorum(errors)
+                        except ProviderError as e:
+                            # 오류를 의견으로 기록하지 않고, 마지막으로 완료된 라운드 결과로 끝낸다
+                            round_num = self._abort(controller, round_num, e)
+                            break
+                        finals = opinions
+
+                        # 합의도 궤적으로 종료 판정 (합의, 정체, 진동, 도달 불가)
+                        consensus = self.calculate_consensus(*finals.values())
+                        decision = controller.observe(round_num, consensus)
+                        yield {"event": "round", "round": round_num, "consensus": round(consensus, 3)}
+                        if decision:
+                            break
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+            yield {"event": "result",
+                   "result": self._build_result(round_num, finals, controller.finish(round_num), context)}
+
+    async def debate_async(self, mode: str = 'independent') -> Dict[str, Any]:
+        """비동기 토론 실행 (라운드 참가자 동시 호출)
+
+        independent: 매 라운드 모든 참가자가 같은 컨텍스트에 동시에 답변
+        pipelined: 나머지 참가자의 N 라운드 동안 첫 참가자의 N+1 라운드를 미리 실행
+                   (첫 참가자는 직전 라운드 다른 참가자 의견 대신 한 라운드 전 의견을 보게 됨)
+
+        라운드 지연은 참가자 호출의 합이 아니라 가장 느린 참가자 수준이 된다.
+        """
+        executor = self._executor()
+
+        with _tracer.start_as_current_span('debate.run', {'debate.mode': mode,
+                                                          'participants': len(self.participants)}):
+            context = self._new_context()
+            finals: Dict[str, str] = {}
+            pending_lead = None
+            controller = ConvergenceController(CONSENSUS_THRESHOLD, MAX_ROUNDS)
+
+            try:
+                if mode == 'pipelined':
+                    pending_lead = self._submit(executor, self.participants[0], context)
+
+                for round_num in range(1, MAX_ROUNDS + 1):
+                    with _tracer.start_as_current_span('debate.round', {'round': round_num}):
+                        try:
+                            opinions, pending_lead = await self._async_round(
+                                mode, round_num, context, executor, pending_lead)
+                        except ProviderError as e:
+                            pending_lead = None
+                            round_num = self._abort(controller, round_num, e)
+                            break
+                        finals = opinions
+
+                        consensus = self.calculate_consensus(*finals.values())
+                        if controller.observe(round_num, consensus):
+                            break
+            finally:
+                # 조기 종료한 경우 미리 띄운 첫 참가자 호출은 버린다
+                if pending_lead is not None:
+                    pending_lead.cancel()
+                executor.shutdown(wait=False, cancel_futures=True)
+
+            return self._build_result(round_num, finals, controller.finish(round_num), context)
+
+    @staticmethod
+    def _submit(executor: Executor, provider: Provider, context: DebateContext,
+                deadline: Optional[float] = None) -> asyncio.Future:
+        # 호출 시점의 프롬프트를 고정해서 넘긴다 (태스크가 현재 스팬을 물려받음)
+        # 미리 띄우는 호출은 라운드 밖에서 시작하므로 시작 시점부터 ROUND_TIMEOUT
+        if deadline is None:
+            deadline = time.monotonic() + ROUND_TIMEOUT
+        return asyncio.ensure_future(provider.agenerate(context.render(), executor, deadline))
+
+    async def _gather_turns(self, round_num: int, futures: Dict[Provider, asyncio.Future],
+                            deadline: float) -> Tuple[Dict[str, str], List[ProviderError]]:
+        """제한 시간까지 기다린 발언 결과: ({이름: 의견}, 오류 목록), 늦은 호출은 취소"""
+        await asyncio.wait(list(futures.values()), timeout=max(deadline - time.monotonic(), 0))
+        opinions: Dict[str, str] = {}
+        errors: List[ProviderError] = []
+        for provider, future in futures.items():
+            if not future.done():
+                future.cancel()
+                error = self._timeout_error(provider)
+            elif isinstance(future.exception(), ProviderError):
+                error = future.exception()
+            else:
+                opinions[provider.name] = future.result()
+                continue
+            errors.append(error)
+            self._failed(round_num, provider, error)
+        return opinions, errors
+
+    async def _async_round(self, mode: str, round_num: int, context: DebateContext, executor: Executor,
+                           pending_lead: Optional[asyncio.Future]):
+        """비동기 한 라운드: ({이름: 의견}, 미리 띄운 다음 라운드 첫 참가자 호출 또는 None)"""
+        deadline = time.monotonic() + ROUND_TIMEOUT
+        lead, *others = self.participants
+        opinions: Dict[str, str] = {}
+        errors: List[ProviderError] = []
+        next_lead = None
+        if mode == 'pipelined':
+            opinions, errors = await self._gather_turns(round_num, {lead: pending_lead}, deadline)
+            for name, text in opinions.items():
+                context.add(name, round_num, text)
+            futures = {provider: self._submit(executor, provider, context, deadline) for provider in others}
+            # 다음 라운드 첫 참가자 호출을 나머지 참가자 응답과 겹쳐 실행
+            if round_num < MAX_ROUNDS:
+                next_lead = self._submit(executor, lead, context)
+        else:
+            futures = {provider: self._submit(executor, provider, context, deadline)
+                       for provider in self.participants}
 
+        spoken, failed = await self._gather_turns(round_num, futures, deadline)
+        errors.extend(failed)
         try:
-            # Vertex AI SDK uses generation_config as a dict
-            response = self.gemini.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'max_output_tokens': 500
-                }
-            )
-            return response.text
-        except Exception as e:
-            return f"Gemini 응답 오류: {e}"
+            self._check_quorum(errors)
+        except ProviderError:
+            if next_lead is not None:
+                next_lead.cancel()
+            raise
+        # 컨텍스트에는 참가자 순서대로 (결정적)
+        for name, text in spoken.items():
+            context.add(name, round_num, text)
+        return {**opinions, **spoken}, next_lead
+
+    def _abort(self, controller: ConvergenceController, round_num: int, error: ProviderError) -> int:
+        """제공자 오류로 토론 중단, 마지막으로 완료된 라운드 번호 반환 (완료된 라운드가 없으면 전파)"""
+        print(f"제공자 오류로 토론 중단 (Round {round_num}): {error}")
+        if round_num == 1:
+            raise error
+        controller.abort(round_num - 1, error)
+        return round_num - 1
+
+    def _build_result(self, round_num: int, finals: Dict[str, str],
+                      convergence: Dict[str, Any], context: DebateContext) -> Dict[str, Any]:
+        """토론 결과 구성 (참가자별 최종 입장은 {참가자}_position, 최종 답변이 없는 참가자는 None)"""
+        final_consensus = self.calculate_consensus(*finals.values())
+
+        result = {
+            "topic": self.topic,
+            "rounds": round_num,
+            "consensus_score": round(final_consensus, 2),
+            "status": "adopted" if final_consensus >= CONSENSUS_THRESHOLD else "review_required",
+            # 응답 스키마가 참가자 구성에 따라 달라지지 않도록 빠진 참가자도 키를 둔다
+            **{f"{provider.name.lower()}_position": finals.get(provider.name) for provider in self.participants},
+            "recommendation": self._generate_recommendation(final_consensus),
+            "convergence": convergence,
+            "context": context.stats(),
+            "participants": [provider.metadata() for provider in self.participants],
+            "models_used": self.models_used,
+            # 헤지를 띄운 호출과 이긴 쪽 (primary 또는 duplicate/fallback)
+            "hedges": [{"speaker": provider.name, **hedge} for provider in self.participants
+                       for hedge in provider.hedges],
+        }
 
-    def calculate_consensus(self, text1: str, text2: str) -> float:
-        """간단한 합의도 계산"""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
+        if convergence['action'] == 'escalate' and EXPERT_ENABLED:
+            judgment = self.get_expert_judgment(finals)
+            result["perplexity_judgment"] = judgment
+            result["perplexity_approved"] = judgment['approved']
 
-        # 공통 불용어 제거
-        stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for'}
-        words1 -= stopwords
-        words2 -= stopwords
+        # 단계/라운드별 시간, 토큰, 추정 비용
+        result["timing"] = tracing.breakdown()
 
-        if not words1 or not words2:
-            return 0.0
+        if self.cache is not None:
+            if self.seed is not None:
+                result["cache"] = {key: value for key, value in self.seed.items() if key != 'result'}
+            # 제공자 오류로 중단됐거나 일부 참가자가 빠진 결과는 재사용하지 않는다
+            completed = convergence['action'] != 'aborted' and len(finals) == len(self.participants)
+            if completed:
+                self.cache.put(self.topic, CACHE_FINGERPRINT, result, self._topic_embedding)
 
-        intersection = len(words1 & words2)
-        union = len(words1 | words2)
+        return result
+
+    def _generate_recommendation(self, consensus: float) -> str:
+        """최종 추천안 생성"""
+        if consensus >= 0.85:
+            return f"참가자들이 높은 합의({consensus:.0%})를 보입니다. 제안된 접근 방식을 채택하는 것을 권장합니다."
+        elif consensus >= 0.70:
+            return f"중간 수준의 합의({consensus:.0%})입니다. 각 의견을 검토 후 결정하세요."
+        else:
+            return f"합의가 낮습니다({consensus:.0%}). 추가 논의가 필요합니다."
 
-        return intersection / union if union > 0 else 0.0
 
-    def debate(self) -> Dict[str, Any]:
-        """토론 실행"""
-        context = ""
-        claude_final = ""
-        gemini_final = ""
+def _format_event(event: Dict[str, Any], fmt: str) -> str:
+    """SSE 또는 NDJSON 한 줄"""
+    data = json.dumps(event, ensure_ascii=False)
+    if fmt == 'sse':
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
 
-        for round_num in range(1, MAX_ROUNDS + 1):
-            # Claude 의견
-            claude_opinion = self.get_claude_opinion(context)
-            context += f"\n\nClaude (Round {round_num}):\n{claude_opinion}"
-            claude_final = claude_opinion
 
-            # Gemini 의견
-            gemini_opinion = self.get_gemini_opinion(context)
-            context += f"\n\nGemini (Round {round_num}):\n{gemini_opinion}"
-            gemini_final = gemini_opinion
+def _stream_format(request, request_json: Optional[Dict[str, Any]]) -> Optional[str]:
+    """스트리밍 요청이면 'sse' 또는 'ndjson'"""
+    value = (request_json or {}).get('stream') or request.args.get('stream')
+    if value in (True, 'true', '1', 'sse'):
+        return 'sse'
+    if value == 'ndjson':
+        return 'ndjson'
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        return 'sse'
+    return None
 
-            # 합의도 계산
-            consensus = self.calculate_consensus(claude_final, gemini_final)
 
-            # 충분한 합의 도달?
-            if consensus >= CONSENSUS_THRESHOLD:
-                break
+def _stream_debate(engine: QuickDebateEngine, fmt: str, headers: Dict[str, str]) -> Response:
+    """토론 이벤트를 도착 즉시 흘려보내는 응답 (첫 바이트 = 첫 모델 토큰 지연)"""
+    def generate():
+        try:
+            for event in engine.debate_events(stream=True):
+                yield _format_event(event, fmt)
+        except Exception as e:
+            print(f"토론 스트리밍 중 오류 발생: {e}")
+            yield _format_event({"event": "error", "message": str(e)}, fmt)
 
-        final_consensus = self.calculate_consensus(claude_final, gemini_final)
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    # 프록시 버퍼링을 끄지 않으면 이벤트가 한꺼번에 전달된다
+    stream_headers = {**headers, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=stream_headers)
 
-        return {
-            "topic": self.topic,
-            "rounds": round_num,
-            "consensus_score": round(final_consensus, 2),
-            "status": "adopted" if final_consensus >= CONSENSUS_THRESHOLD else "review_required",
-            "claude_position": claude_final,
-            "gemini_position": gemini_final,
-            "recommendation": self._generate_recommendation(claude_final, gemini_final, final_consensus)
-        }
 
-    def _generate_recommendation(self, claude: str, gemini: str, consensus: float) -> str:
-        """최종 추천안 생성"""
-        if consensus >= 0.85:
-            return f"양측이 높은 합의({consensus:.0%})를 보입니다. 제안된 접근 방식을 채택하는 것을 권장합니다."
-        elif consensus >= 0.70:
-            return f"중간 수준의 합의({consensus:.0%})입니다. 양측 의견을 검토 후 결정하세요."
-        else:
-            return f"합의가 낮습니다({consensus:.0%}). 추가 논의가 필요합니다."
+def _format_result(result: Dict[str, Any]) -> str:
+    """토론 결과 텍스트"""
+    opinions = "\n\n".join(f"💭 **{name.capitalize()} 의견**:\n{text[:300]}..." if text else
+                             f"💭 **{name.capitalize()} 의견**: (최종 답변 없음)"
+                             for name, text in _positions(result).items())
+    response_text = f"""🤖 Multi-AI 토론 완료!
+
+📊 **토론 주제**: {result['topic']}
+**라운드**: {result['rounds']}
+**합의도**: {result['consensus_score']:.0%}
+**상태**: {"✅ 채택 권장" if result['status'] == 'adopted' else "⚠️ 검토 필요"}
+
+{opinions}
+
+📝 **추천사항**:
+{result['recommendation']}
+"""
+    if result.get('convergence', {}).get('action') == 'aborted':
+        response_text += f"""
+⚠️ 제공자 오류로 {result['rounds']}라운드 결과까지만 반영되었습니다: {result['convergence']['error'][:200]}
+"""
+    if 'perplexity_judgment' in result:
+        verdict = {True: "✅ 승인", False: "❌ 반려"}.get(result['perplexity_approved'], "⚠️ 판정 실패")
+        response_text += f"""
+🧑‍⚖️ **Perplexity 전문가 판정**: {verdict}
+{result['perplexity_judgment']['full_response'][:300]}
+"""
+    return response_text
+
+
+def _fulfillment(text: str, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Dialogflow CX 응답 형식 (parameters는 세션 파라미터로 저장)"""
+    response = {
+        "fulfillmentResponse": {
+            "messages": [{
+                "text": {"text": [text]}
+            }]
+        }
+    }
+    if parameters is not None:
+        response["sessionInfo"] = {"parameters": parameters}
+    return response
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def _run_job(topic: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    return QuickDebateEngine(topic, use_cache=not params.get('no_cache')).debate_events(stream=False)
+
+
+def get_job_queue() -> JobQueue:
+    """인스턴스 공유 작업 큐 (첫 비동기 요청 시 생성)"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(SQLiteJobStore(), _run_job)
+        return _job_queue
+
+
+def _handle_job(request, request_json: Optional[Dict[str, Any]], job_id: str,
+                is_dialogflow: bool, headers: Dict[str, str]):
+    """작업 상태 조회 / 이벤트 구독 / 취소"""
+    job_queue = get_job_queue()
+    body = request_json or {}
+    action = body.get('action') or request.args.get('action')
+    if action == 'cancel' or request.method == 'DELETE':
+        job_queue.cancel(job_id)
+
+    job = job_queue.store.get(job_id)
+    if is_dialogflow:
+        if job is None:
+            return jsonify(_fulfillment("토론 작업을 찾을 수 없습니다.", {"job_id": None})), 200, headers
+        if job['status'] == SUCCEEDED:
+            # 결과를 전달했으므로 세션의 작업 ID 제거
+            return jsonify(_fulfillment(_format_result(job['result']), {"job_id": None})), 200, headers
+        if job['status'] in TERMINAL_STATUSES:
+            message = f"토론이 {job['status']} 상태로 종료되었습니다. {job['error'] or ''}".strip()
+            return jsonify(_fulfillment(message, {"job_id": None})), 200, headers
+        rounds = [e['round'] for e in job_queue.store.events(job_id) if e['event'] == 'round']
+        progress = f"{rounds[-1]}라운드 완료" if rounds else "대기 중" if job['status'] == 'queued' else "1라운드 진행 중"
+        return jsonify(_fulfillment(f"토론 진행 중입니다 ({progress}). 잠시 후 다시 확인해주세요.",
+                                    {"job_id": job_id})), 200, headers
+
+    if job is None:
+        return jsonify({"error": "job not found", "job_id": job_id}), 404, headers
+
+    after = int(body.get('after') or request.args.get('after') or 0)
+    stream_format = _stream_format(request, request_json)
+    if stream_format:
+        mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+        events = (_format_event(event, stream_format) for event in job_queue.follow(job_id, after))
+        return Response(stream_with_context(events), mimetype=mimetype,
+                        headers={**headers, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return jsonify({**job, "events": job_queue.store.events(job_id, after)}), 200, headers
 
 
 @functions_framework.http
+@profile_first_response
 def debate(request):
     """
     HTTP 엔드포인트
 
     Request:
     {
-        "topic": "토론 주제"
+        "topic": "토론 주제",
+        "stream": "sse" | "ndjson"  (선택, ?stream= 또는 Accept: text/event-stream도 가능)
+        "async": true               (선택, 작업 큐에 넣고 {"job_id"}를 202로 즉시 반환)
+        "no_cache": true            (선택, 캐시된 과거 결과를 쓰지 않고 새로 토론)
     }
 
+    작업 조회: GET ?job_id=...&after=<seq>  (stream을 함께 주면 이벤트 구독)
+    작업 취소: DELETE ?job_id=... 또는 {"job_id": ..., "action": "cancel"}
+    Dialogflow CX는 세션 파라미터 job_id로 같은 작업을 다시 조회한다.
+
+    스트리밍 요청은 start/token/opinion/round/result 이벤트를 SSE 또는 JSON lines로 보낸다.
+    Dialogflow CX webhook은 항상 아래 비스트리밍 형식으로 응답한다.
+
     Response:
     {
         "fulfillmentResponse": {
@@ -163,7 +670,7 @@ def debate(request):
     if request.method == 'OPTIONS':
         headers = {
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST',
+            'Access-Control-Allow-Methods': 'GET, POST, DELETE',
             'Access-Control-Allow-Headers': 'Content-Type',
         }
         return ('', 204, headers)
@@ -173,11 +680,18 @@ def debate(request):
     try:
         # 요청 파싱
         request_json = request.get_json(silent=True)
+        is_dialogflow = bool(request_json and 'sessionInfo' in request_json)
+
+        parameters = request_json.get('sessionInfo', {}).get('parameters', {}) if is_dialogflow else (request_json or {})
+
+        # 비동기 작업 조회/취소
+        job_id = parameters.get('job_id') or (None if is_dialogflow else request.args.get('job_id'))
+        if job_id:
+            return _handle_job(request, request_json, job_id, is_dialogflow, headers)
 
         # Dialogflow CX webhook 형식 처리
-        if request_json and 'sessionInfo' in request_json:
+        if is_dialogflow:
             # Dialogflow CX webhook
-            parameters = request_json.get('sessionInfo', {}).get('parameters', {})
             topic = parameters.get('topic', '')
 
             if not topic:
@@ -189,56 +703,34 @@ def debate(request):
             topic = request_json.get('topic', '') if request_json else ''
 
         if not topic:
-            return jsonify({
-                "fulfillmentResponse": {
-                    "messages": [{
-                        "text": {"text": ["토론 주제를 입력해주세요."]}
-                    }]
-                }
-            }), 200, headers
+            return jsonify(_fulfillment("토론 주제를 입력해주세요.")), 200, headers
 
         # 토론 시작 메시지
         print(f"토론 시작: {topic}")
 
-        # 토론 실행
-        engine = QuickDebateEngine(topic)
-        result = engine.debate()
-
-        # 응답 포맷팅
-        response_text = f"""🤖 Multi-AI 토론 완료!
-
-📊 **토론 주제**: {result['topic']}
-**라운드**: {result['rounds']}
-**합의도**: {result['consensus_score']:.0%}
-**상태**: {"✅ 채택 권장" if result['status'] == 'adopted' else "⚠️ 검토 필요"}
+        # 긴 토론은 작업 큐로 넘기고 즉시 응답
+        if DEBATE_ASYNC or parameters.get('async'):
+            job_id = get_job_queue().submit(topic, {"no_cache": bool(parameters.get('no_cache'))})
+            if is_dialogflow:
+                return jsonify(_fulfillment(f"토론을 시작했습니다. 잠시 후 결과를 확인해주세요. (작업 ID: {job_id})",
+                                            {"job_id": job_id})), 200, headers
+            return jsonify({"job_id": job_id, "status": "queued"}), 202, headers
 
-💭 **Claude 의견**:
-{result['claude_position'][:300]}...
+        # 토론 실행
+        engine = QuickDebateEngine(topic, use_cache=not parameters.get('no_cache'))
 
-💭 **Gemini 의견**:
-{result['gemini_position'][:300]}...
+        # Dialogflow는 스트리밍 응답을 받지 않는다
+        stream_format = None if is_dialogflow else _stream_format(request, request_json)
+        if stream_format:
+            return _stream_debate(engine, stream_format, headers)
 
-📝 **추천사항**:
-{result['recommendation']}
-"""
+        result = engine.debate()
 
         # Dialogflow CX 응답 형식
-        return jsonify({
-            "fulfillmentResponse": {
-                "messages": [{
-                    "text": {"text": [response_text]}
-                }]
-            }
-        }), 200, headers
+        return jsonify(_fulfillment(_format_result(result))), 200, headers
 
     except Exception as e:
         error_msg = f"토론 중 오류 발생: {str(e)}"
         print(error_msg)
 
-        return jsonify({
-            "fulfillmentResponse": {
-                "messages": [{
-                    "text": {"text": [error_msg]}
-                }]
-            }
-        }), 200, headers
+        return jsonify(_fulfillment(error_msg)), 200, headers
@@ -0,0 +1,448 @@
+"""
+LLM 제공자 추상화
+참가자마다 같은 인터페이스(동기/비동기 생성, 스트리밍, 토큰 수, 비용 정보)를 두어
+토론 엔진이 제공자 종류나 참가자 수와 상관없이 라운드를 구성하도록 한다.
+모든 호출은 ProviderScheduler(할당량, 재시도, 대체 모델, 서킷 브레이커)를 거친다.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import tracing
+from clients import ClientPool, GEMINI_MODEL, GEMINI_FALLBACK_MODEL
+from context import estimate_tokens
+from hedging import LatencyTracker
+from ratelimit import ProviderError, ProviderScheduler
+
+CLAUDE_MODEL = os.getenv('CLAUDE_MODEL', 'claude-sonnet-4-5-20250929')
+# 주 모델이 할당량 초과/브레이커 열림일 때 쓰는 대체 모델 (비우면 대체하지 않음)
+CLAUDE_FALLBACK_MODEL = os.getenv('CLAUDE_FALLBACK_MODEL', 'claude-haiku-4-5-20251001')
+PERPLEXITY_MODEL = os.getenv('PERPLEXITY_MODEL', 'sonar-pro')
+# 라운드 참가자 (쉼표 구분, 순서 = 발언/결과 순서). fake로 시작하는 이름은 로컬 가짜 제공자
+DEBATE_PARTICIPANTS = [name.strip() for name in os.getenv('DEBATE_PARTICIPANTS', 'claude,gemini').split(',')
+                       if name.strip()]
+# 가짜 제공자 응답 지연 (초)
+FAKE_PROVIDER_LATENCY = float(os.getenv('FAKE_PROVIDER_LATENCY', '0'))
+TEMPERATURE = 0.7
+MAX_TOKENS = 500
+
+_tracer = tracing.get_tracer(__name__)
+# 헤지 경쟁 요청 전용 (엔진 스레드는 결과를 기다리고, 요청은 여기서 실행)
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='hedge')
+
+
+def record_usage(prompt: str, text: str, input_tokens: Optional[int] = None,
+                 output_tokens: Optional[int] = None) -> None:
+    """현재 스팬에 토큰 사용량 기록 (응답에 usage가 없으면 추정치)"""
+    tracing.set_attributes({
+        tracing.INPUT_TOKENS: input_tokens if input_tokens is not None else estimate_tokens(prompt),
+        tracing.OUTPUT_TOKENS: output_tokens if output_tokens is not None else estimate_tokens(text),
+        'gen_ai.usage.estimated': input_tokens is None or output_tokens is None,
+    })
+
+
+def _timeout_option(timeout: Optional[float]) -> Dict[str, float]:
+    """SDK 요청 제한 시간 인자 (timeout=None을 넘기면 SDK 기본 제한 시간까지 꺼지므로 생략)"""
+    return {'timeout': timeout} if timeout is not None else {}
+
+
+class Provider:
+    """토론 참가자 공통 인터페이스
+
+    하위 클래스는 _complete(model, prompt, timeout)와 (스트리밍 API가 있으면)
+    _open_stream(model, prompt, timeout, usage)만 구현한다.
+    name은 결과/이벤트에 쓰는 참가자 이름, system은 스케줄러 할당량/브레이커 단위 제공자 이름.
+    """
+
+    name = ''
+    system = ''
+
+    def __init__(self, scheduler: ProviderScheduler, models: Sequence[str],
+                 temperature: float = TEMPERATURE, max_tokens: int = MAX_TOKENS,
+                 tracker: Optional[LatencyTracker] = None):
+        self.scheduler = scheduler
+        self.models = [model for model in models if model]
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # 응답 시간 기록/헤지 판단 (None이면 헤지 없음)
+        self.tracker = tracker
+        self.models_used: Dict[str, int] = {}
+        # 헤지를 띄운 호출 기록 (결과에 남김)
+        self.hedges: List[Dict[str, Any]] = []
+
+    # ---- 하위 클래스 구현 ----
+
+    def _complete(self, model: str, prompt: str,
+                  timeout: Optional[float] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        """(응답, 입력 토큰, 출력 토큰) — 토큰 수를 모르면 None, timeout은 SDK가 지원하면 요청 제한 시간"""
+        raise NotImplementedError
+
+    def _open_stream(self, model: str, prompt: str, timeout: Optional[float] = None,
+                     usage: Optional[Dict[str, Optional[int]]] = None) -> Iterator[str]:
+        """응답 조각 스트림 (스트리밍 API가 없는 제공자는 전체 응답을 한 조각으로)
+
+        timeout은 _complete와 같은 SDK 요청 제한 시간 (조각 사이에 멈춘 연결도 끊긴다).
+        usage를 주면 끝까지 받았을 때 SDK가 알려준 input_tokens/output_tokens를 채운다.
+        """
+        text, input_tokens, output_tokens = self._complete(model, prompt, timeout)
+        if usage is not None:
+            usage.update(input_tokens=input_tokens, output_tokens=output_tokens)
+        yield text
+
+    # ---- 공통 ----
+
+    def count_tokens(self, text: str) -> int:
+        """토큰 수 추정 (API 왕복 없이)"""
+        return estimate_tokens(text)
+
+    def cost(self, input_tokens: int, output_tokens: int, model: Optional[str] = None) -> float:
+        """목록 가격 기준 추정 비용 (USD)"""
+        return tracing.price(model or self.models[0], input_tokens, output_tokens)
+
+    def metadata(self) -> Dict[str, Any]:
+        """결과/로그용 참가자 정보 (가격은 100만 토큰당 USD)"""
+        return {
+            'name': self.name,
+            'system': self.system,
+            'models': self.models,
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'price_per_1m': [self.cost(10 ** 6, 0), self.cost(0, 10 ** 6)],
+        }
+
+    def _budget(self, prompt: str) -> int:
+        """할당량 차감용 토큰 수 (입력 추정 + 최대 출력)"""
+        return self.count_tokens(prompt) + self.max_tokens
+
+    def _used(self, model: str) -> None:
+        self.models_used[model] = self.models_used.get(model, 0) + 1
+
+    def _attempt(self, prompt: str, models: Sequence[str], deadline: Optional[float],
+                 cancelled: Optional[threading.Event] = None) -> Tuple[str, str]:
+        """스케줄러를 거친 요청 하나: (응답, 모델)
+
+        cancelled를 주면 스트리밍으로 받아 이벤트가 켜지는 즉시 연결을 닫는다 (헤지 경쟁에서 진 요청).
+        """
+        def complete(model: str) -> str:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if cancelled is None:
+                text, input_tokens, output_tokens = self._complete(model, prompt, timeout)
+                record_usage(prompt, text, input_tokens, output_tokens)
+                return text
+            chunks = []
+            usage: Dict[str, Optional[int]] = {}
+            stream = self._open_stream(model, prompt, timeout, usage)
+            try:
+                for chunk in stream:
+                    chunks.append(chunk)
+                    if cancelled.is_set():
+                        break
+            finally:
+                stream.close()
+            text = ''.join(chunks)
+            # 끝까지 받은 스트림은 SDK 사용량, 중간에 끊은 스트림은 받은 만큼 추정
+            record_usage(prompt, text, usage.get('input_tokens'), usage.get('output_tokens'))
+            return text
+
+        started = time.monotonic()
+        text, model = self.scheduler.call(self.system, models, self._budget(prompt), complete, deadline)
+        if self.tracker is not None and not (cancelled is not None and cancelled.is_set()):
+            self.tracker.observe(model, time.monotonic() - started)
+        return text, model
+
+    def generate(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """응답 전체 (재시도/대체 모델까지 실패하면 ProviderError; 오류 문자열을 응답으로 쓰지 않음)
+
+        deadline(time.monotonic 기준)이 지나면 재시도/대체 없이 ProviderError.
+        주 모델의 p95 응답 시간이 알려져 있고 그 안에 끝날 수 없으면 헤지한다 (hedging.py).
+        """
+        delay = self.tracker.hedge_delay(self.models[0]) if self.tracker is not None else None
+        if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+            text, model = self._attempt(prompt, self.models, deadline)
+            if self.tracker is not None:
+                self.tracker.record_call(self.system, hedged=False)
+            self._used(model)
+            return text
+        return self._hedged(prompt, delay, deadline)
+
+    def _hedge_models(self) -> List[str]:
+        """헤지 요청 후보: fallback이면 대체 모델부터 (대체 모델이 없으면 같은 모델)"""
+        if self.tracker.mode == 'fallback' and len(self.models) > 1:
+            return self.models[1:]
+        return self.models
+
+    def _hedged(self, prompt: str, delay: float, deadline: Optional[float]) -> str:
+        """주 요청이 delay 안에 끝나지 않으면 헤지 요청을 띄워 먼저 성공한 응답 사용, 나머지는 끊음"""
+        with _tracer.start_as_current_span('llm.hedge', {'gen_ai.system': self.system,
+                                                         'hedge.delay_s': round(delay, 3)}) as span:
+            started = time.monotonic()
+            requests: Dict[Future, Tuple[str, threading.Event, float]] = {}
+
+            def launch(label: str, models: Sequence[str]) -> None:
+                cancelled = threading.Event()
+                future = _hedge_executor.submit(tracing.bind(self._attempt), prompt, models, deadline, cancelled)
+                requests[future] = (label, cancelled, time.monotonic())
+
+            def remaining() -> Optional[float]:
+                return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+            launch('primary', self.models)
+            done, pending = wait(requests, timeout=delay)
+            hedged = not done and self.tracker.allow_hedge(self.system)
+            self.tracker.record_call(self.system, hedged)
+            if hedged:
+                launch(self.tracker.mode, self._hedge_models())
+                pending = set(requests)
+
+            winner: Optional[Future] = None
+            errors: List[BaseException] = []
+            while winner is None:
+                for future in done:
+                    if future.exception() is None and winner is None:
+                        winner = future
+                    elif future.exception() is not None:
+                        errors.append(future.exception())
+                if winner is not None or not pending:
+                    break
+                done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+
+            # 진 요청은 스트림을 닫아 생성을 멈춘다 (끊긴 주 요청 시간은 p95 하한값으로 기록)
+            for future, (label, cancelled, launched) in requests.items():
+                if future is not winner and not future.done():
+                    cancelled.set()
+                    if label == 'primary':
+                        self.tracker.observe(self.models[0], time.monotonic() - launched)
+
+            if winner is None:
+                span.set_attribute('hedge.winner', None)
+                if errors:
+                    raise errors[0]
+                raise ProviderError(self.system, "호출 제한 시간 안에 응답하지 않음")
+
+            text, model = winner.result()
+            label = requests[winner][0]
+            self._used(model)
+            span.set_attributes({'hedge.launched': hedged, 'hedge.winner': label, tracing.MODEL: model})
+            if hedged:
+                self.hedges.append({'winner': label, 'model': model, 'mode': self.tracker.mode,
+                                    'delay_s': round(delay, 3), 'latency_s': round(time.monotonic() - started, 3)})
+            return text
+
+    async def agenerate(self, prompt: str, executor: Optional[Executor] = None,
+                        deadline: Optional[float] = None) -> str:
+        """generate()를 스레드 풀에서 실행 (SDK 호출이 블로킹이므로)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, tracing.bind(self.generate), prompt, deadline)
+
+    def stream(self, prompt: str, deadline: Optional[float] = None) -> Iterator[str]:
+        """토큰 스트리밍: 첫 토큰까지는 스케줄러가 재시도/대체하고, 그 뒤 오류는 ProviderError
+
+        헤지하지 않는다 (이미 보낸 토큰을 되돌릴 수 없음). deadline은 첫 토큰까지의 재시도/대체에만 적용.
+        """
+        def start(model: str):
+            chunks = self._open_stream(model, prompt)
+            return chunks, next(chunks, '')
+
+        # 스트림 전체 구간 스팬 (provider.call 스팬은 첫 토큰까지)
+        span = _tracer.start_span('llm.stream', {'gen_ai.system': self.system})
+        try:
+            with tracing.use_span(span):
+                (chunks, first), model = self.scheduler.call(self.system, self.models, self._budget(prompt),
+                                                             start, deadline)
+        except ProviderError:
+            span.end()
+            raise
+        span.set_attributes({tracing.MODEL: model, 'ttft_s': round(span.duration, 3)})
+        self._used(model)
+        received = [first]
+        try:
+            yield first
+            for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+        except Exception as e:
+            span.record_exception(e)
+            raise ProviderError(self.system, str(e)) from e
+        finally:
+            chunks.close()
+            with tracing.use_span(span):
+                record_usage(prompt, ''.join(received))
+            span.end()
+
+
+class AnthropicProvider(Provider):
+    """Claude (Messages API)"""
+
+    name = 'Claude'
+    system = 'anthropic'
+
+    def __init__(self, pool: ClientPool, scheduler: ProviderScheduler,
+                 models: Sequence[str] = (CLAUDE_MODEL, CLAUDE_FALLBACK_MODEL), **kwargs):
+        super().__init__(scheduler, models, **kwargs)
+        self.pool = pool
+
+    def _complete(self, model: str, prompt: str,
+                  timeout: Optional[float] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        msg = self.pool.get('anthropic').messages.create(
+            model=model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **_timeout_option(timeout)
+        )
+        usage = getattr(msg, 'usage', None)
+        return msg.content[0].text, getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None)
+
+    def _open_stream(self, model: str, prompt: str, timeout: Optional[float] = None,
+                     usage: Optional[Dict[str, Optional[int]]] = None) -> Iterator[str]:
+        with self.pool.get('anthropic').messages.stream(
+            model=model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **_timeout_option(timeout)
+        ) as stream:
+            yield from stream.text_stream
+            if usage is not None:
+                final = getattr(stream.get_final_message(), 'usage', None)
+                usage.update(input_tokens=getattr(final, 'input_tokens', None),
+                             output_tokens=getattr(final, 'output_tokens', None))
+
+
+class GeminiProvider(Provider):
+    """Gemini (Vertex AI GenerativeModel)"""
+
+    name = 'Gemini'
+    system = 'gemini'
+
+    def __init__(self, pool: ClientPool, scheduler: ProviderScheduler,
+                 models: Sequence[str] = (GEMINI_MODEL, GEMINI_FALLBACK_MODEL), **kwargs):
+        super().__init__(scheduler, models, **kwargs)
+        self.pool = pool
+
+    def _model(self, model: str) -> Any:
+        return self.pool.get('gemini' if model == GEMINI_MODEL else 'gemini_fallback')
+
+    def _generation_config(self) -> Dict[str, Any]:
+        # Vertex AI SDK uses generation_config as a dict
+        return {'temperature': self.temperature, 'max_output_tokens': self.max_tokens}
+
+    def _complete(self, model: str, prompt: str,
+                  timeout: Optional[float] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        # GenerativeModel.generate_content에는 요청별 제한 시간이 없어 timeout은 무시 (엔진이 결과를 버림)
+        response = self._model(model).generate_content(prompt, generation_config=self._generation_config())
+        usage = getattr(response, 'usage_metadata', None)
+        return (response.text, getattr(usage, 'prompt_token_count', None),
+                getattr(usage, 'candidates_token_count', None))
+
+    def _open_stream(self, model: str, prompt: str, timeout: Optional[float] = None,
+                     usage: Optional[Dict[str, Optional[int]]] = None) -> Iterator[str]:
+        # _complete와 같이 timeout은 지원하지 않음, 사용량은 마지막 조각의 usage_metadata가 누적값
+        responses = self._model(model).generate_content(
+            prompt,
+            generation_config=self._generation_config(),
+            stream=True
+        )
+        final = None
+        for chunk in responses:
+            final = getattr(chunk, 'usage_metadata', None) or final
+            if chunk.text:
+                yield chunk.text
+        if usage is not None and final is not None:
+            usage.update(input_tokens=getattr(final, 'prompt_token_count', None),
+                         output_tokens=getattr(final, 'candidates_token_count', None))
+
+
+class PerplexityProvider(Provider):
+    """Perplexity Sonar (OpenAI 호환 chat completions)"""
+
+    name = 'Perplexity'
+    system = 'perplexity'
+
+    def __init__(self, pool: ClientPool, scheduler: ProviderScheduler,
+                 models: Sequence[str] = (PERPLEXITY_MODEL,), **kwargs):
+        super().__init__(scheduler, models, **kwargs)
+        self.pool = pool
+
+    def _complete(self, model: str, prompt: str,
+                  timeout: Optional[float] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        response = self.pool.get('perplexity').post('/chat/completions', json={
+            'model': model,
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'messages': [{'role': 'user', 'content': prompt}],
+        }, **_timeout_option(timeout))
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get('usage') or {}
+        return body['choices'][0]['message']['content'], usage.get('prompt_tokens'), usage.get('completion_tokens')
+
+
+class FakeProvider(Provider):
+    """로컬 가짜 제공자 (API 키 없이 엔진 실행/테스트용)
+
+    프롬프트 해시로 고른 고정 문장을 돌려주므로 같은 입력이면 항상 같은 응답이다.
+    """
+
+    system = 'fake'
+    _STANCES = (
+        "단계적으로 도입하고 측정 지표를 먼저 정의해야 합니다.",
+        "기존 구조를 유지하면서 병목 구간만 개선하는 것이 안전합니다.",
+        "초기 비용이 들더라도 확장 가능한 구조로 전환하는 편이 낫습니다.",
+    )
+
+    def __init__(self, scheduler: ProviderScheduler, name: str = 'Fake',
+                 latency: float = FAKE_PROVIDER_LATENCY, **kwargs):
+        super().__init__(scheduler, [f'fake-{name.lower()}'], **kwargs)
+        self.name = name
+        self.latency = latency
+
+    def _complete(self, model: str, prompt: str,
+                  timeout: Optional[float] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        time.sleep(self.latency)
+        digest = int(hashlib.sha256(f"{self.name}\0{prompt}".encode('utf-8')).hexdigest(), 16)
+        text = f"{self.name} 입장: {self._STANCES[digest % len(self._STANCES)]} 근거는 운영 데이터와 위험도입니다."
+        return text, self.count_tokens(prompt), self.count_tokens(text)
+
+    def _open_stream(self, model: str, prompt: str, timeout: Optional[float] = None,
+                     usage: Optional[Dict[str, Optional[int]]] = None) -> Iterator[str]:
+        text, input_tokens, output_tokens = self._complete(model, prompt, timeout)
+        for word in text.split(' '):
+            yield word + ' '
+        if usage is not None:
+            usage.update(input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+# 참가자 이름 → 제공자 생성 함수
+PROVIDERS: Dict[str, Callable[..., Provider]] = {
+    'claude': AnthropicProvider,
+    'gemini': GeminiProvider,
+    'perplexity': PerplexityProvider,
+}
+
+
+def build_participants(pool: ClientPool, scheduler: ProviderScheduler,
+                       names: Sequence[str] = DEBATE_PARTICIPANTS) -> List[Provider]:
+    """참가자 목록 생성 (클라이언트는 첫 호출 때 풀에서 가져오므로 생성 비용 없음)
+
+    응답 시간 기록은 인스턴스 공유라 p95가 요청을 넘어 누적된다.
+    """
+    tracker = pool.get('latency_tracker')
+    participants = []
+    for name in names:
+        key = name.lower()
+        if key.startswith('fake'):
+            participants.append(FakeProvider(scheduler, name=name.title(), tracker=tracker))
+        elif key in PROVIDERS:
+            participants.append(PROVIDERS[key](pool, scheduler, tracker=tracker))
+        else:
+            raise ValueError(f"알 수 없는 토론 참가자: {name} (가능: {', '.join(PROVIDERS)}, fake*)")
+    if len(participants) < 2:
+        raise ValueError("토론 참가자는 2명 이상이어야 합니다")
+    return participants
@@ -0,0 +1,334 @@
+"""
+제공자 호출 스케줄러
+모델별 분당 요청 수(RPM)/토큰 수(TPM) 토큰 버킷과 서킷 브레이커를 SQLite에 두어
+같은 인스턴스의 스레드/프로세스가 할당량을 함께 나눠 쓴다.
+
+- 할당량 안에서는 기다렸다가 보내고, 넘칠 것 같으면 보내지 않는다
+- 429/일시 오류는 retry_delay 힌트(없으면 지수 백오프 + 지터)를 따라 재시도
+- 크레딧/인증 오류는 제공자 전체, 없는 모델/반복 429는 해당 모델 브레이커를 연다
+- 브레이커가 열린 모델은 건너뛰고 다음 후보(대체 모델)로 넘어간다
+"""
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import tracing
+
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB', '/tmp/provider_limits.sqlite3')
+# 할당량이 찰 때까지 기다리는 최대 시간 (넘으면 다음 후보 모델로)
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))
+PROVIDER_MAX_RETRIES = int(os.getenv('PROVIDER_MAX_RETRIES', '3'))
+BACKOFF_BASE = float(os.getenv('BACKOFF_BASE', '1.0'))
+BACKOFF_MAX = float(os.getenv('BACKOFF_MAX', '30'))
+# 연속 일시 오류가 이만큼 쌓이면 브레이커를 연다
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '3'))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '60'))
+# 크레딧 부족/인증 실패는 설정을 고치기 전까지 복구되지 않는다
+BREAKER_EXHAUSTED_COOLDOWN = float(os.getenv('BREAKER_EXHAUSTED_COOLDOWN', '900'))
+
+_tracer = tracing.get_tracer(__name__)
+
+# 모델별 기본 할당량 (RATE_LIMITS 환경 변수 JSON으로 덮어쓰기, 0은 무제한)
+DEFAULT_LIMITS = {
+    'claude': {'rpm': 50, 'tpm': 30000},
+    'gemini': {'rpm': 500, 'tpm': 1000000},
+    'sonar': {'rpm': 50, 'tpm': 0},
+}
+RATE_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv('RATE_LIMITS', '{}'))
+
+_RETRY_HINTS = (
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)'),
+    re.compile(r'retry in ([\d.]+)\s*s', re.IGNORECASE),
+    re.compile(r'retry[-_ ]after\W+([\d.]+)', re.IGNORECASE),
+)
+# 제공자 SDK 패키지: 여기서 온 예외만 재시도/대체 대상, 나머지는 코드 오류로 보고 그대로 올린다
+_SDK_PACKAGES = ('anthropic', 'httpx', 'httpcore', 'google', 'vertexai', 'grpc')
+# 상태 코드 없이 오는 SDK 예외 (클래스 계층 이름으로 판단해 SDK를 import하지 않는다)
+_EXHAUSTED_TYPES = ('GoogleAuthError',)
+_TRANSIENT_TYPES = ('APIConnectionError', 'TransportError', 'RetryError')
+# 400/429로 오지만 기다려도 풀리지 않는 크레딧/결제 한도 오류
+_BILLING = ('credit balance', 'insufficient_quota', 'billing')
+
+
+class ProviderError(Exception):
+    """재시도와 대체 모델까지 모두 실패한 제공자 호출"""
+
+    def __init__(self, provider: str, message: str, attempts: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.attempts = attempts or []
+
+
+def parse_retry_delay(error: Exception) -> Optional[float]:
+    """오류의 재시도 힌트(초): retry-after 헤더, retry_delay, 'retry in Ns'"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is not None:
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+
+    message = str(error)
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def _from_sdk(error: Exception) -> bool:
+    return type(error).__module__.split('.')[0] in _SDK_PACKAGES
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP 상태: anthropic APIStatusError.status_code, httpx HTTPStatusError.response.status_code,
+    google.api_core 예외의 code"""
+    for value in (getattr(error, 'status_code', None), getattr(getattr(error, 'response', None), 'status_code', None)):
+        if isinstance(value, int):
+            return value
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and _from_sdk(error):
+        return code
+    return None
+
+
+def is_provider_error(error: Exception) -> bool:
+    """제공자 호출 실패인지 (SDK 예외, HTTP 상태가 있는 오류, 네트워크 오류)"""
+    return _from_sdk(error) or status_code(error) is not None or isinstance(error, (TimeoutError, ConnectionError))
+
+
+def classify(error: Exception) -> str:
+    """exhausted | missing_model | rate_limited | transient | fatal (SDK 예외 타입과 HTTP 상태로 판단)"""
+    status = status_code(error)
+    types = {cls.__name__ for cls in type(error).__mro__}
+    if status in (401, 402, 403) or types.intersection(_EXHAUSTED_TYPES):
+        return 'exhausted'
+    if status in (400, 429) and any(marker in str(error).lower() for marker in _BILLING):
+        return 'exhausted'
+    if status == 404:
+        return 'missing_model'
+    if status == 429:
+        return 'rate_limited'
+    if status in (408, 409) or (status is not None and status >= 500):
+        return 'transient'
+    if status is None and (isinstance(error, (TimeoutError, ConnectionError)) or types.intersection(_TRANSIENT_TYPES)):
+        return 'transient'
+    return 'fatal'
+
+
+def limits_for(model: str) -> Dict[str, float]:
+    if model in RATE_LIMITS:
+        return RATE_LIMITS[model]
+    for prefix, limits in DEFAULT_LIMITS.items():
+        if model.startswith(prefix):
+            return limits
+    return {'rpm': 0, 'tpm': 0}
+
+
+class ProviderScheduler:
+    """SQLite 기반 토큰 버킷 + 서킷 브레이커 (프로세스 간 공유)"""
+
+    def __init__(self, path: str = RATE_LIMIT_DB, max_wait: float = RATE_LIMIT_MAX_WAIT,
+                 max_retries: int = PROVIDER_MAX_RETRIES, sleep: Callable[[float], None] = time.sleep):
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'retries': 0, 'failovers': 0, 'fast_failures': 0, 'waited_s': 0.0}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated_at REAL)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS breakers '
+            '(name TEXT PRIMARY KEY, failures INTEGER, open_until REAL, reason TEXT)'
+        )
+
+    # 토큰 버킷
+
+    def _try_take(self, model: str, tokens: int) -> float:
+        """RPM/TPM 버킷에서 차감, 부족하면 차감하지 않고 필요한 대기 시간 반환"""
+        limits = limits_for(model)
+        wanted = [(f"{model}:{kind}", float(limits.get(kind) or 0), amount)
+                  for kind, amount in (('rpm', 1), ('tpm', tokens))]
+        wanted = [(name, capacity, min(amount, capacity)) for name, capacity, amount in wanted if capacity > 0]
+        if not wanted:
+            return 0.0
+
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: 다른 프로세스가 같은 버킷을 동시에 읽고 쓰지 못하게 쓰기 락 선점
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                levels, wait = [], 0.0
+                for name, capacity, amount in wanted:
+                    row = self._db.execute('SELECT level, updated_at FROM buckets WHERE name = ?', (name,)).fetchone()
+                    level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * capacity / 60)
+                    if level < amount:
+                        wait = max(wait, (amount - level) * 60 / capacity)
+                    levels.append((name, level - amount))
+                if wait == 0:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)',
+                        [(name, level, now) for name, level in levels],
+                    )
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return wait
+
+    def acquire(self, model: str, tokens: int, deadline: Optional[float] = None) -> bool:
+        """할당량이 생길 때까지 대기 (max_wait 또는 호출 deadline(monotonic) 안에 안 되면 False)"""
+        limit = time.monotonic() + self.max_wait
+        if deadline is not None:
+            limit = min(limit, deadline)
+        while True:
+            wait = self._try_take(model, tokens)
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > limit:
+                return False
+            self._count('waited_s', wait)
+            span = tracing.current_span()
+            if span is not None:
+                span.increment('rate_limit_wait_s', wait)
+            self.sleep(wait)
+
+    # 서킷 브레이커
+
+    def open_for(self, *names: str) -> float:
+        """열린 브레이커 중 가장 긴 남은 시간 (닫혀 있으면 0)"""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT open_until FROM breakers WHERE name IN ({','.join('?' * len(names))})", names
+            ).fetchall()
+        return max([row[0] - now for row in rows if row[0] and row[0] > now] + [0.0])
+
+    def record_success(self, model: str) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM breakers WHERE name = ?', (model,))
+
+    def record_failure(self, name: str, reason: str, cooldown: Optional[float] = None) -> None:
+        """실패 누적; cooldown을 주면 바로 열고, 아니면 BREAKER_FAILURES번째에 연다"""
+        with self._lock:
+            row = self._db.execute('SELECT failures FROM breakers WHERE name = ?', (name,)).fetchone()
+            failures = (row[0] if row else 0) + 1
+            if cooldown is None and failures >= BREAKER_FAILURES:
+                cooldown = BREAKER_COOLDOWN
+            open_until = time.time() + cooldown if cooldown else None
+            self._db.execute(
+                'INSERT OR REPLACE INTO breakers (name, failures, open_until, reason) VALUES (?, ?, ?, ?)',
+                (name, failures, open_until, reason[:300]),
+            )
+
+    # 호출
+
+    def call(self, provider: str, models: Sequence[str], tokens: int, fn: Callable[[str], Any],
+             deadline: Optional[float] = None) -> Tuple[Any, str]:
+        """후보 모델을 순서대로 시도해 (결과, 사용한 모델) 반환
+
+        fn(model)은 실제 SDK 호출. 모두 실패하면 ProviderError, 제공자 오류가 아닌 예외는 그대로 전파.
+        fn 안에서 tracing.set_attributes()로 토큰 사용량을 이 호출의 스팬에 남길 수 있다.
+        deadline(time.monotonic 기준)을 주면 그 뒤로는 할당량 대기, 재시도, 대체 모델 시도를 하지 않는다.
+        """
+        with _tracer.start_as_current_span('provider.call', {'gen_ai.system': provider}) as span:
+            attempts: List[Dict[str, Any]] = []
+            for model in self.candidates(provider, models, tokens, attempts, deadline):
+                span.set_attribute(tracing.MODEL, model)
+                for attempt in range(self.max_retries + 1):
+                    self._count('calls')
+                    try:
+                        result = fn(model)
+                    except Exception as e:
+                        if not is_provider_error(e):
+                            # 코드 오류(TypeError, KeyError 등)는 재시도/대체하지 않고 그대로 올린다
+                            raise
+                        kind = classify(e)
+                        attempts.append({'model': model, 'error': kind, 'message': str(e)[:200]})
+                        span.add_event('attempt_failed', {'model': model, 'error': kind})
+                        delay = self.handle_failure(provider, model, e, kind)
+                        if delay is None or attempt == self.max_retries:
+                            break
+                        delay = delay if delay > 0 else self.backoff(attempt)
+                        if deadline is not None and time.monotonic() + delay >= deadline:
+                            attempts.append({'model': model, 'error': 'deadline', 'message': '호출 제한 시간 초과'})
+                            break
+                        self._count('retries')
+                        span.increment('retries')
+                        self.sleep(delay)
+                        # 재시도도 요청 하나로 센다
+                        if not self.acquire(model, tokens, deadline):
+                            break
+                    else:
+                        self.record_success(model)
+                        span.set_attribute('attempts', len(attempts) + 1)
+                        return result, model
+
+                if attempts[-1]['error'] in ('exhausted', 'deadline'):
+                    # 제공자 전체가 막혔거나 시간이 없음: 같은 제공자의 다른 모델도 소용없음
+                    break
+
+            span.set_attribute('attempts', len(attempts))
+            raise ProviderError(provider, attempts[-1]['message'] if attempts else "사용 가능한 모델 없음", attempts)
+
+    def candidates(self, provider: str, models: Sequence[str], tokens: int, attempts: List[Dict[str, Any]],
+                   deadline: Optional[float] = None):
+        """브레이커가 닫혀 있고 할당량을 얻은 모델만 순서대로 (다음 후보로 넘어가면 failover)"""
+        first = True
+        for model in filter(None, models):
+            if deadline is not None and time.monotonic() >= deadline:
+                attempts.append({'model': model, 'error': 'deadline', 'message': '호출 제한 시간 초과'})
+                break
+            remaining = self.open_for(provider, model)
+            if remaining:
+                self._count('fast_failures')
+                attempts.append({'model': model, 'error': 'circuit_open', 'message': f"{remaining:.0f}s 후 재시도"})
+                continue
+            if not self.acquire(model, tokens, deadline):
+                attempts.append({'model': model, 'error': 'rate_limited', 'message': '할당량 대기 시간 초과'})
+                continue
+            if not first:
+                self._count('failovers')
+            first = False
+            yield model
+
+    def handle_failure(self, provider: str, model: str, error: Exception, kind: str) -> Optional[float]:
+        """실패 기록 후 재시도 대기 시간 반환 (재시도하지 않을 오류는 None)"""
+        if kind == 'exhausted':
+            self.record_failure(provider, str(error), BREAKER_EXHAUSTED_COOLDOWN)
+            return None
+        if kind == 'missing_model':
+            self.record_failure(model, str(error), BREAKER_EXHAUSTED_COOLDOWN)
+            return None
+        if kind == 'fatal':
+            return None
+
+        hint = parse_retry_delay(error)
+        # 힌트가 너무 길면 기다리지 말고 모델을 잠시 막은 뒤 다음 후보로
+        if hint is not None and hint > BACKOFF_MAX:
+            self.record_failure(model, str(error), hint)
+            return None
+        self.record_failure(model, str(error))
+        return hint or 0.0
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """지수 백오프 + full jitter"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
@@ -0,0 +1,166 @@
+"""
+토론 결과 캐시
+정규화된 주제 + 참가 모델/파라미터 + 프롬프트 버전을 키로 결과를 SQLite에 저장한다.
+정확히 같은 키가 없으면 주제 임베딩으로 유사한 과거 토론을 찾아
+충분히 가까우면 그 결과를 바로 돌려주고, 조금 덜 가까우면 시드 컨텍스트로 쓴다.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from lazy import LazyModule
+
+np = LazyModule('numpy')
+
+# 비어 있으면 캐시 비활성화
+DEBATE_CACHE_DB = os.getenv('DEBATE_CACHE_DB', '/tmp/debate_results.sqlite3')
+DEBATE_CACHE_TTL = float(os.getenv('DEBATE_CACHE_TTL', str(7 * 86400)))
+# 이 유사도 이상이면 과거 결과를 그대로 반환
+DEBATE_CACHE_SIMILARITY = float(os.getenv('DEBATE_CACHE_SIMILARITY', '0.95'))
+# 이 유사도 이상이면 과거 결정을 컨텍스트 시드로 사용 (0이면 끔)
+DEBATE_SEED_SIMILARITY = float(os.getenv('DEBATE_SEED_SIMILARITY', '0.85'))
+# 바로 반환해도 되는 결과 상태 (검토가 필요했던 결과는 시드로만 사용)
+DEBATE_CACHE_STATUSES = tuple(os.getenv('DEBATE_CACHE_STATUSES', 'adopted').split(','))
+# 유사도 검색 대상 (최근 항목부터)
+DEBATE_CACHE_MAX_SCAN = int(os.getenv('DEBATE_CACHE_MAX_SCAN', '2000'))
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_topic(topic: str) -> str:
+    """전각/반각, 대소문자, 구두점, 공백 차이를 무시"""
+    text = unicodedata.normalize('NFKC', topic).casefold()
+    return ' '.join(_PUNCTUATION.sub(' ', text).split())
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """모델/파라미터/프롬프트 버전 지문 (주제 제외)"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def make_key(topic: str, fingerprint: str) -> str:
+    return hashlib.sha256(f"{fingerprint}\0{normalize_topic(topic)}".encode('utf-8')).hexdigest()
+
+
+class DebateResultCache:
+    """스레드 안전 SQLite 토론 결과 캐시"""
+
+    def __init__(self, path: str = DEBATE_CACHE_DB, ttl_seconds: float = DEBATE_CACHE_TTL,
+                 similarity: float = DEBATE_CACHE_SIMILARITY, seed_similarity: float = DEBATE_SEED_SIMILARITY,
+                 reusable_statuses: Tuple[str, ...] = DEBATE_CACHE_STATUSES, max_scan: int = DEBATE_CACHE_MAX_SCAN):
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.seed_similarity = seed_similarity
+        self.reusable_statuses = reusable_statuses
+        self.max_scan = max_scan
+        self._lock = threading.Lock()
+        self._counters = {'exact_hits': 0, 'semantic_hits': 0, 'seeds': 0, 'misses': 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS debate_results ('
+                'key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, topic TEXT NOT NULL, status TEXT NOT NULL, '
+                'embedding BLOB, result TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS debate_results_recent ON debate_results (fingerprint, created_at)'
+            )
+            self._db.execute('DELETE FROM debate_results WHERE expires_at < ?', (time.time(),))
+        except sqlite3.Error as e:
+            print(f"토론 결과 캐시 비활성화: {e}")
+            self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def get(self, topic: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """정확히 같은 (정규화) 주제 + 설정의 결과"""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                'SELECT result, status, created_at FROM debate_results WHERE key = ? AND expires_at > ?',
+                (make_key(topic, fingerprint), time.time()),
+            ).fetchone()
+        if row is None or row[1] not in self.reusable_statuses:
+            return None
+        self._count('exact_hits')
+        return {'hit': 'exact', 'similarity': 1.0, 'cached_at': row[2], 'result': json.loads(row[0])}
+
+    def nearest(self, embedding: List[float], fingerprint: str) -> Optional[Dict[str, Any]]:
+        """주제 임베딩이 가장 가까운 과거 토론
+
+        similarity 이상이고 재사용 가능한 상태면 hit='semantic', seed_similarity 이상이면 hit='seed'.
+        """
+        if self._db is None or embedding is None:
+            return None
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT embedding, result, status, created_at, topic FROM debate_results '
+                'WHERE fingerprint = ? AND expires_at > ? AND embedding IS NOT NULL '
+                'ORDER BY created_at DESC LIMIT ?',
+                (fingerprint, time.time(), self.max_scan),
+            ).fetchall()
+        if not rows:
+            self._count('misses')
+            return None
+
+        matrix = np.frombuffer(b''.join(row[0] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        _, result, status, created_at, topic = rows[best]
+
+        if score >= self.similarity and status in self.reusable_statuses:
+            hit = 'semantic'
+        elif self.seed_similarity and score >= self.seed_similarity:
+            hit = 'seed'
+        else:
+            self._count('misses')
+            return None
+
+        self._count('semantic_hits' if hit == 'semantic' else 'seeds')
+        return {'hit': hit, 'similarity': round(score, 3), 'cached_at': created_at,
+                'source_topic': topic, 'result': json.loads(result)}
+
+    def put(self, topic: str, fingerprint: str, result: Dict[str, Any],
+            embedding: Optional[List[float]] = None) -> None:
+        if self._db is None:
+            return
+        now = time.time()
+        blob = array('f', embedding).tobytes() if embedding is not None else None
+        try:
+            with self._lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO debate_results '
+                    '(key, fingerprint, topic, status, embedding, result, created_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (make_key(topic, fingerprint), fingerprint, topic, result.get('status', ''), blob,
+                     json.dumps(result, ensure_ascii=False), now, now + self.ttl_seconds),
+                )
+        except sqlite3.Error as e:
+            print(f"토론 결과 캐시 저장 오류: {e}")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
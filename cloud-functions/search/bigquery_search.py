@@ -0,0 +1,131 @@
+"""
+BigQuery 벡터 검색 쿼리
+임베딩과 검색 조건은 쿼리 파라미터로 전달 (설정이 같으면 SQL 텍스트가 항상 같아 결과 캐시 재사용)
+거리는 한 번만 계산하고, 본문은 서버에서 잘라낸 요약 컬럼만 반환
+"""
+import json
+import os
+from typing import Any, Dict, List
+
+import tracing
+from lazy import LazyModule
+from vector_index import SNIPPET_CHARS
+
+bigquery = LazyModule('google.cloud.bigquery')
+
+# 검색 잡 하나가 청구할 수 있는 최대 바이트 (초과 시 잡 실패, 0이면 제한 없음)
+SEARCH_MAX_BYTES_BILLED = int(os.getenv('SEARCH_MAX_BYTES_BILLED', str(10 ** 9)))
+
+_tracer = tracing.get_tracer(__name__)
+
+
+def build_query(table: str, collapse: bool) -> str:
+    """검색 SQL (테이블과 청크 병합 여부에만 의존)
+
+    @embeddings는 쿼리 임베딩을 이어 붙인 ARRAY<FLOAT64>이고 @dim 단위로 잘라 쿼리별 벡터로 복원한다.
+    """
+    # 청크 행은 원본 문서당 가장 가까운 하나만 남김 (청크가 아닌 행은 그대로)
+    parent_expr = (
+        "COALESCE(JSON_VALUE(t.metadata, '$.parent_doc_id'), CAST(FARM_FINGERPRINT(t.content) AS STRING))"
+        if collapse else "CAST(NULL AS STRING)"
+    )
+    collapse_clause = (
+        "QUALIFY ROW_NUMBER() OVER (PARTITION BY qid, parent_id ORDER BY distance ASC) = 1"
+        if collapse else ""
+    )
+
+    return f"""
+        WITH query_embeddings AS (
+            SELECT
+                qid,
+                ARRAY(
+                    SELECT value FROM UNNEST(@embeddings) AS value WITH OFFSET pos
+                    WHERE DIV(pos, @dim) = qid
+                    ORDER BY pos
+                ) AS embedding
+            FROM
+                UNNEST(GENERATE_ARRAY(0, @query_count - 1)) AS qid
+        ),
+        scored AS (
+            SELECT
+                q.qid,
+                t.content,
+                t.metadata,
+                {parent_expr} as parent_id,
+                ML.DISTANCE(t.embedding, q.embedding, 'COSINE') as distance
+            FROM
+                `{table}` t
+            CROSS JOIN
+                query_embeddings q
+        ),
+        matched AS (
+            SELECT * FROM scored
+            WHERE distance < @max_distance
+            {collapse_clause}
+        )
+        SELECT
+            qid,
+            IF(CHAR_LENGTH(content) > @snippet_chars,
+               CONCAT(SUBSTR(content, 1, @snippet_chars), '...'), content) AS snippet,
+            metadata,
+            distance
+        FROM
+            matched
+        WHERE
+            TRUE
+        QUALIFY
+            ROW_NUMBER() OVER (PARTITION BY qid ORDER BY distance ASC) <= @limit
+        ORDER BY
+            qid, distance ASC
+        """
+
+
+def job_stats(job: Any) -> Dict[str, Any]:
+    """끝난 잡의 스캔 비용 (스팬 속성 이름 그대로)"""
+    return {
+        'bigquery.job_id': getattr(job, 'job_id', None),
+        'bigquery.bytes_processed': getattr(job, 'total_bytes_processed', None),
+        'bigquery.bytes_billed': getattr(job, 'total_bytes_billed', None),
+        'bigquery.slot_ms': getattr(job, 'slot_millis', None),
+        'bigquery.cache_hit': getattr(job, 'cache_hit', None),
+    }
+
+
+def search(bq_client: Any, table: str, query_embeddings: List[List[float]], threshold: float,
+           limit: int, collapse: bool) -> List[List[Dict[str, Any]]]:
+    """모든 쿼리를 잡 하나로 검색: 쿼리별 [{'content', 'relevance', 'metadata'}] (거리 오름차순)"""
+    results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+    if not query_embeddings:
+        return results
+
+    dim = len(query_embeddings[0])
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter('embeddings', 'FLOAT64',
+                                         [value for embedding in query_embeddings for value in embedding]),
+            bigquery.ScalarQueryParameter('dim', 'INT64', dim),
+            bigquery.ScalarQueryParameter('query_count', 'INT64', len(query_embeddings)),
+            bigquery.ScalarQueryParameter('max_distance', 'FLOAT64', 1 - threshold),
+            bigquery.ScalarQueryParameter('limit', 'INT64', limit),
+            bigquery.ScalarQueryParameter('snippet_chars', 'INT64', SNIPPET_CHARS),
+        ],
+        maximum_bytes_billed=SEARCH_MAX_BYTES_BILLED or None,
+    )
+
+    with _tracer.start_as_current_span('bigquery.query', {'queries': len(query_embeddings)}) as span:
+        query_job = bq_client.query(build_query(table, collapse), job_config=job_config)
+
+        for row in query_job:
+            results[row.qid].append({
+                'content': row.snippet,
+                'relevance': round(1 - row.distance, 2),
+                'metadata': json.loads(row.metadata) if isinstance(row.metadata, str) else row.metadata
+            })
+
+        stats = job_stats(query_job)
+        span.set_attributes({'hits': sum(map(len, results)), **stats})
+        # 구조화 로그 한 줄 (Cloud Logging에서 잡별 스캔 비용 집계용)
+        print(json.dumps({'message': 'BigQuery 검색 잡', 'queries': len(query_embeddings), **stats},
+                         ensure_ascii=False))
+
+    return results
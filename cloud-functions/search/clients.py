@@ -0,0 +1,113 @@
+"""
+Search Function 클라이언트 풀
+인스턴스당 한 번 생성해 요청 간 재사용 (웜 요청은 초기화 비용 없음)
+"""
+import os
+import threading
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from lazy import LazyModule
+import lexical_index
+import vector_index
+from embedding_cache import EmbeddingCache
+from result_cache import GenerationWatcher, SearchResultCache
+
+# SDK import는 첫 클라이언트 생성 시점까지 지연 (콜드 스타트 단축)
+bigquery = LazyModule('google.cloud.bigquery')
+vertexai = LazyModule('vertexai')
+language_models = LazyModule('vertexai.language_models')
+
+PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'phsysics')
+LOCATION = os.getenv('GCP_LOCATION', 'us-central1')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'textembedding-gecko@003')
+
+
+class ClientPool:
+    """스레드 안전한 지연 생성 클라이언트 레지스트리
+
+    이름별 팩토리를 등록해 두고 최초 get() 시점에 한 번만 생성한다.
+    이름마다 락을 따로 두어 느린 클라이언트 생성이 다른 클라이언트를 막지 않는다.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """팩토리 등록 (이미 생성된 클라이언트는 버림)"""
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._clients.pop(name, None)
+            self._locks.setdefault(name, threading.Lock())
+
+    def override(self, name: str, client: Any) -> None:
+        """생성된 클라이언트를 직접 주입 (로컬 실행, 벤치마크용)"""
+        with self._registry_lock:
+            self._clients[name] = client
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """클라이언트 조회, 없으면 생성"""
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        with self._registry_lock:
+            if name not in self._locks:
+                raise KeyError(f"등록되지 않은 클라이언트: {name}")
+            lock = self._locks[name]
+
+        with lock:
+            # 다른 스레드가 먼저 생성했을 수 있음
+            client = self._clients.get(name)
+            if client is None:
+                client = self._factories[name]()
+                self._clients[name] = client
+            return client
+
+    def reset(self) -> None:
+        """생성된 클라이언트 모두 폐기"""
+        with self._registry_lock:
+            self._clients.clear()
+
+
+def _create_bigquery() -> Any:
+    # Client 내부 requests 세션이 커넥션을 keep-alive로 유지하므로 재사용이 핵심
+    return bigquery.Client(project=PROJECT_ID)
+
+
+def _init_vertex() -> bool:
+    vertexai.init(project=PROJECT_ID, location=LOCATION)
+    return True
+
+
+def _create_embedding_model(pool: ClientPool) -> Any:
+    pool.get('vertexai')
+    return language_models.TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+
+
+def _open_vector_index() -> Any:
+    return vector_index.open_index()
+
+
+def _open_lexical_index() -> Any:
+    return lexical_index.open_index()
+
+
+_pool = ClientPool()
+_pool.register('bigquery', _create_bigquery)
+_pool.register('vertexai', _init_vertex)
+_pool.register('embedding_model', partial(_create_embedding_model, _pool))
+_pool.register('vector_index', _open_vector_index)
+_pool.register('lexical_index', _open_lexical_index)
+_pool.register('embedding_cache', EmbeddingCache)
+_pool.register('result_cache', SearchResultCache)
+_pool.register('generation_watcher', GenerationWatcher)
+
+
+def get_pool(pool: Optional[ClientPool] = None) -> ClientPool:
+    """모듈 단위 공유 풀 반환"""
+    return pool if pool is not None else _pool
@@ -0,0 +1,141 @@
+"""
+쿼리 임베딩 캐시
+정규화된 쿼리 + 모델 이름 기준 LRU/TTL 메모리 캐시, 선택적 SQLite 디스크 계층
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '2048'))
+EMBEDDING_CACHE_TTL = float(os.getenv('EMBEDDING_CACHE_TTL', '86400'))
+# 비어 있으면 메모리 계층만 사용 (Cloud Functions에서는 /tmp 경로 사용)
+EMBEDDING_CACHE_DB = os.getenv('EMBEDDING_CACHE_DB', '')
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv('EMBEDDING_CACHE_DISK_SIZE', '50000'))
+
+
+def normalize_query(text: str) -> str:
+    """사소한 차이(전각/반각, 대소문자, 공백)를 무시하도록 쿼리 정규화"""
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def _pack(values: List[float]) -> bytes:
+    return array('f', values).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """float32로 압축 저장하는 스레드 안전 임베딩 캐시"""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl_seconds: float = EMBEDDING_CACHE_TTL,
+                 disk_path: str = EMBEDDING_CACHE_DB, disk_max_entries: int = EMBEDDING_CACHE_DISK_SIZE):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings '
+                '(key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM embeddings WHERE expires_at < ?', (time.time(),))
+        except sqlite3.Error as e:
+            print(f"임베딩 디스크 캐시 비활성화: {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode('utf-8')).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """캐시 조회 (메모리 → 디스크 순)"""
+        key = self.make_key(model, text)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, blob = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return _unpack(blob)
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT vector, expires_at FROM embeddings WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    self._counters['disk_hits'] += 1
+                    return _unpack(row[0])
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, model: str, text: str, values: List[float]) -> None:
+        """캐시 저장"""
+        key = self.make_key(model, text)
+        expires_at = time.time() + self.ttl_seconds
+        blob = _pack(values)
+
+        with self._lock:
+            self._remember(key, expires_at, blob)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)',
+                        (key, blob, expires_at),
+                    )
+                    self._disk_writes += 1
+                    if self._disk_writes % 100 == 0:
+                        self._prune_disk()
+                except sqlite3.Error as e:
+                    print(f"임베딩 디스크 캐시 저장 오류: {e}")
+
+    def _remember(self, key: str, expires_at: float, blob: bytes) -> None:
+        self._entries[key] = (expires_at, blob)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _prune_disk(self) -> None:
+        # 만료 시각이 가장 이른 항목부터 정리 (TTL이 같으므로 오래된 순서와 같음)
+        count = self._db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        if count > self.disk_max_entries:
+            self._db.execute(
+                'DELETE FROM embeddings WHERE key IN '
+                '(SELECT key FROM embeddings ORDER BY expires_at LIMIT ?)',
+                (count - self.disk_max_entries,),
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """적중률 카운터"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,358 @@
+"""
+로컬 BM25 역색인
+knowledge_base.embeddings의 본문을 토큰화해 인스턴스 내 역색인으로 유지
+정확한 용어("NoiseComputer", "256x256", "RTL")는 벡터 유사도보다 키워드 일치가 잘 찾는다
+벡터 인덱스와 같은 watermark 기준 증분 갱신 (임베딩 컬럼은 읽지 않음)
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import tracing
+from lazy import LazyModule
+from vector_index import INDEX_REFRESH_SECONDS, format_snippet, source_columns
+
+bigquery = LazyModule('google.cloud.bigquery')
+
+LEXICAL_INDEX_DIR = Path(os.getenv('LEXICAL_INDEX_DIR', '/tmp/lexical_index'))
+BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+
+_DOCS_FILE = 'docs.jsonl'
+_MANIFEST_FILE = 'manifest.json'
+
+# 영문/숫자 토큰, 한글 음절 연속 구간
+_ALNUM = re.compile(r'[A-Za-z0-9]+')
+_HANGUL = re.compile(r'[가-힣]+')
+# camelCase, 대문자 약어, 문자/숫자 경계에서 분리 ("NoiseComputer" → noise, computer)
+_SUBWORD = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+_tracer = tracing.get_tracer(__name__)
+
+
+def tokenize(text: str) -> List[str]:
+    """한/영 혼합 토큰화
+
+    영문/숫자는 소문자 토큰 그대로 + camelCase/숫자 경계 하위 단어(2자 이상).
+    한글은 형태소 분석기 없이 음절 bigram으로 색인해 조사가 붙은 어절도 일치시킨다
+    ("컴퓨터를" → 컴퓨, 퓨터, 터를). 한 글자 구간은 그대로 쓴다.
+    """
+    text = unicodedata.normalize('NFKC', text)
+    tokens = []
+    for match in _ALNUM.finditer(text):
+        word = match.group()
+        lower = word.lower()
+        tokens.append(lower)
+        # 대부분의 단어(전부 소문자/대문자 알파벳, 숫자)는 나눌 경계가 없음
+        if word.isdigit() or (word.isalpha() and (word == lower or word.isupper())):
+            continue
+        parts = _SUBWORD.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if len(part) > 1)
+    for match in _HANGUL.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 역색인 (문서 추가/교체는 증분, 검색은 메모리 내 postings만 사용)
+
+    문서 파일은 append-only이고 같은 key가 다시 들어오면 이전 문서를 삭제 표시한다.
+    검색 결과 형식은 VectorIndex와 같다: [{'key', 'parent', 'content', 'metadata', 'score'}]
+    """
+
+    def __init__(self, directory: Path = LEXICAL_INDEX_DIR, k1: float = BM25_K1, b: float = BM25_B):
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self._docs: List[Dict[str, Any]] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._deleted: set = set()
+        self._keys: Dict[str, int] = {}
+        self._total_length = 0
+        self._watermark: Optional[str] = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._last_refresh = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def count(self) -> int:
+        return len(self._docs) - len(self._deleted)
+
+    # ---- 색인 ----
+
+    def _index(self, record: Dict[str, Any], terms: Dict[str, int]) -> None:
+        """문서 하나를 postings에 반영 (호출자가 _lock 보유)"""
+        doc_id = len(self._docs)
+        self._docs.append(record)
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+        key = record.get('key')
+        if key:
+            previous = self._keys.get(key)
+            if previous is not None:
+                self._remove(previous)
+            self._keys[key] = doc_id
+
+    def _remove(self, doc_id: int) -> None:
+        if doc_id in self._deleted:
+            return
+        self._deleted.add(doc_id)
+        self._total_length -= self._lengths[doc_id]
+        for term in self._docs[doc_id]['terms']:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """행 추가 (key가 같은 기존 문서는 대체). 추가된 행 수 반환"""
+        added = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / _DOCS_FILE, 'a', encoding='utf-8') as f:
+            for row in rows:
+                content = row.get('content') or ''
+                metadata = row.get('metadata')
+                # 제목/주제도 색인 (본문에 없는 용어로 찾는 경우)
+                topic = (metadata or {}).get('topic', '') if isinstance(metadata, dict) else ''
+                terms = dict(Counter(tokenize(f"{topic}\n{content}" if topic else content)))
+                if not terms:
+                    continue
+
+                record = {
+                    'key': row.get('key'),
+                    'parent': (metadata or {}).get('parent_doc_id') if isinstance(metadata, dict) else None,
+                    'content': format_snippet(content),
+                    'metadata': metadata,
+                    'terms': terms,
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                with self._lock:
+                    self._index(record, terms)
+
+                watermark = row.get('watermark')
+                if watermark and (self._watermark is None or watermark > self._watermark):
+                    self._watermark = watermark
+                added += 1
+
+        with self._lock:
+            if self._deleted and len(self._deleted) > len(self._docs) // 4:
+                self._compact()
+            self._write_manifest()
+            self._ready = True
+        return added
+
+    def _compact(self) -> None:
+        """삭제 표시된 문서를 제거하고 파일/postings 재구축 (호출자가 _lock 보유)"""
+        keep = [record for i, record in enumerate(self._docs) if i not in self._deleted]
+        tmp_path = self.directory / (_DOCS_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in keep:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.directory / _DOCS_FILE)
+        self._rebuild(keep, set())
+
+    def _rebuild(self, docs: List[Dict[str, Any]], deleted: set) -> None:
+        self._docs, self._lengths, self._postings = [], [], {}
+        self._deleted, self._keys, self._total_length = set(), {}, 0
+        for i, record in enumerate(docs):
+            self._index(record, record['terms'])
+            if i in deleted:
+                self._remove(i)
+
+    def _write_manifest(self) -> None:
+        manifest = {'count': len(self._docs), 'watermark': self._watermark, 'deleted': sorted(self._deleted)}
+        tmp_path = self.directory / (_MANIFEST_FILE + '.tmp')
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, self.directory / _MANIFEST_FILE)
+
+    def load(self) -> bool:
+        """디스크의 색인 로드 (파일이 불완전하면 False)"""
+        manifest_path = self.directory / _MANIFEST_FILE
+        if not manifest_path.exists():
+            return False
+
+        manifest = json.loads(manifest_path.read_text())
+        with open(self.directory / _DOCS_FILE, encoding='utf-8') as f:
+            docs = [json.loads(line) for line in f]
+        if len(docs) != manifest['count']:
+            return False
+
+        with self._lock:
+            self._rebuild(docs, set(manifest.get('deleted', [])))
+            self._watermark = manifest.get('watermark')
+            self._ready = True
+        return True
+
+    def retain(self, keys: set) -> int:
+        """key가 keys에 없는 문서를 삭제 표시 (원본에서 지워진 행 정리). 제거된 문서 수 반환"""
+        with self._lock:
+            removed = [(key, doc_id) for key, doc_id in self._keys.items() if key not in keys]
+            if not removed:
+                return 0
+            for key, doc_id in removed:
+                self._remove(doc_id)
+                del self._keys[key]
+
+            if len(self._deleted) > len(self._docs) // 4:
+                self._compact()
+            self._write_manifest()
+        return len(removed)
+
+    def reset(self) -> None:
+        """색인 파일 삭제"""
+        with self._lock:
+            for name in (_DOCS_FILE, _MANIFEST_FILE):
+                (self.directory / name).unlink(missing_ok=True)
+            self._rebuild([], set())
+            self._watermark, self._ready = None, False
+
+    # ---- 검색 ----
+
+    def search(self, query: str, limit: int, collapse: bool = False) -> List[Dict[str, Any]]:
+        """BM25 top-k: [{'key', 'parent', 'content', 'metadata', 'score'}] (점수 내림차순)
+
+        collapse=True이면 같은 원본 문서(parent)의 청크 중 점수가 가장 높은 것만 남긴다.
+        """
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+
+        with self._lock:
+            count = self.count
+            if not count:
+                return []
+            avg_length = self._total_length / count
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            docs = self._docs
+
+        # 점수 → 문서 번호 순으로 정렬해 동점에서도 결과 순서가 결정적
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0])) if collapse else \
+            heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        results, parents = [], set()
+        for doc_id, score in ranked:
+            record = docs[doc_id]
+            if collapse:
+                parent = record.get('parent') or record.get('key') or doc_id
+                if parent in parents:
+                    continue
+                parents.add(parent)
+            results.append({
+                'key': record.get('key'),
+                'parent': record.get('parent'),
+                'content': record['content'],
+                'metadata': record['metadata'],
+                'score': score,
+            })
+            if len(results) == limit:
+                break
+        return results
+
+    # ---- BigQuery 동기화 ----
+
+    def refresh(self, bq_client: Any, table: str,
+                columns: Optional[Tuple[Optional[str], Optional[str]]] = None) -> int:
+        """BigQuery에서 watermark 이후 행(임베딩 제외)을 읽어 색인에 반영. 추가된 행 수 반환
+
+        columns는 source_columns() 결과 (없으면 여기서 조회).
+        """
+        with self._refreshing, _tracer.start_as_current_span('lexical_index.refresh') as span:
+            key_column, watermark = columns or source_columns(bq_client, table)
+            if not watermark:
+                self.reset()
+
+            key_expr = key_column or 'CAST(NULL AS STRING)'
+            watermark_expr = watermark or 'CAST(NULL AS TIMESTAMP)'
+            where = f"WHERE {watermark} > @watermark" if watermark and self._watermark else ""
+
+            sql = f"""
+            SELECT
+                {key_expr} AS doc_key,
+                content,
+                metadata,
+                {watermark_expr} AS watermark
+            FROM
+                `{table}`
+            {where}
+            ORDER BY
+                watermark
+            """
+            params = []
+            if self._watermark:
+                params.append(bigquery.ScalarQueryParameter(
+                    'watermark', 'TIMESTAMP', datetime.fromisoformat(self._watermark)))
+            job_config = bigquery.QueryJobConfig(query_parameters=params)
+
+            def rows():
+                for row in bq_client.query(sql, job_config=job_config):
+                    yield {
+                        'key': row.doc_key,
+                        'content': row.content,
+                        'metadata': json.loads(row.metadata) if isinstance(row.metadata, str) else row.metadata,
+                        'watermark': row.watermark.isoformat() if row.watermark else None,
+                    }
+
+            added = self.add(rows())
+            span.set_attributes({'rows_added': added, 'index.rows': self.count, 'index.terms': len(self._postings)})
+            self._last_refresh = time.time()
+            return added
+
+    def maybe_refresh(self, bq_client: Any, table: str) -> None:
+        """갱신 주기가 지났으면 백그라운드에서 증분 갱신"""
+        if time.time() - self._last_refresh < INDEX_REFRESH_SECONDS or self._refreshing.locked():
+            return
+        # 동시에 들어온 요청이 중복 갱신을 띄우지 않도록 먼저 시각을 갱신
+        self._last_refresh = time.time()
+
+        def run():
+            try:
+                added = self.refresh(bq_client, table)
+                print(f"키워드 색인 갱신: +{added}행 (총 {self.count}행)")
+            except Exception as e:
+                print(f"키워드 색인 갱신 오류: {e}")
+
+        threading.Thread(target=run, name='lexical-index-refresh', daemon=True).start()
+
+
+def open_index(directory: Path = LEXICAL_INDEX_DIR) -> LexicalIndex:
+    """디스크 색인이 있으면 로드, 없으면 빈 색인 (첫 갱신 때 구축)"""
+    index = LexicalIndex(directory)
+    try:
+        if not index.load():
+            index.reset()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"키워드 색인 로드 실패, 재구축: {e}")
+        index.reset()
+    return index
@@ -4,74 +4,313 @@ Vertex AI Search Cloud Function
 """
 import os
 import json
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 import functions_framework
 from flask import jsonify
-from google.cloud import bigquery
-import vertexai
-from vertexai.language_models import TextEmbeddingModel
+
+import bigquery_search
+import tracing
+import vector_index
+from lazy import profile_first_response
+from clients import ClientPool, get_pool, PROJECT_ID, EMBEDDING_MODEL
+from result_cache import SearchResultCache
 
 # Config
-PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'phsysics')
-LOCATION = os.getenv('GCP_LOCATION', 'us-central1')
 SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', '0.7'))
 MAX_RESULTS = int(os.getenv('MAX_RESULTS', '5'))
+# 임베딩 API 요청당 최대 텍스트 수, 배치 요청당 최대 쿼리 수
+EMBEDDING_BATCH_LIMIT = int(os.getenv('EMBEDDING_BATCH_LIMIT', '5'))
+MAX_BATCH_QUERIES = int(os.getenv('MAX_BATCH_QUERIES', '20'))
+KNOWLEDGE_TABLE = os.getenv('KNOWLEDGE_TABLE', f'{PROJECT_ID}.knowledge_base.embeddings')
+# 청크 단위로 저장된 문서는 원본 문서당 가장 관련 높은 청크 하나만 반환
+COLLAPSE_CHUNKS = os.getenv('COLLAPSE_CHUNKS', 'true').lower() == 'true'
+# local: 인스턴스 내 벡터 인덱스 (준비 전에는 BigQuery로 대체), bigquery: 매 검색 BigQuery 잡
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'local')
+# hybrid: 벡터 + BM25 키워드 후보를 RRF로 결합, vector: 벡터 검색만
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'hybrid')
+# 결합 전 각 검색기에서 가져올 후보 수, RRF 순위 상수
+HYBRID_CANDIDATES = max(int(os.getenv('HYBRID_CANDIDATES', '20')), MAX_RESULTS)
+RRF_K = int(os.getenv('RRF_K', '60'))
+
+_tracer = tracing.get_tracer(__name__)
+# 키워드 검색은 임베딩/벡터 검색과 병렬로 실행
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='lexical')
+# 세대 전환(인덱스 따라잡기 + 캐시 폐기)은 인스턴스당 한 요청만 수행
+_generation_lock = threading.Lock()
+
+
+def _identity(hit: Dict[str, Any]) -> str:
+    """결합 시 같은 문서로 볼 기준 (청크는 원본 문서, 그 외는 본문 요약)"""
+    metadata = hit.get('metadata')
+    parent = metadata.get('parent_doc_id') if COLLAPSE_CHUNKS and isinstance(metadata, dict) else None
+    return parent or hit['content']
+
+
+def fuse_rankings(rankings: Dict[str, List[Dict[str, Any]]], limit: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Reciprocal Rank Fusion: 문서 점수 = Σ 1 / (k + 순위)
+
+    정렬은 rrf_score(결과를 낸 검색기 모두에서 1위일 때 1.0으로 정규화)로 하고,
+    relevance는 벡터 검색 결과와 같은 의미(코사인 유사도)를 유지한다 (키워드로만 찾았으면 None).
+    match에 어느 검색기에서 찾았는지 남긴다. 동점이면 먼저 넣은 검색기 순서를 따른다.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for source, hits in rankings.items():
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.setdefault(_identity(hit), {'hit': hit, 'score': 0.0, 'relevance': None, 'match': []})
+            entry['score'] += 1.0 / (k + rank)
+            entry['match'].append(source)
+            if source == 'vector' and entry['relevance'] is None:
+                entry['relevance'] = hit.get('relevance')
+
+    best = sum(1.0 / (k + 1) for hits in rankings.values() if hits)
+    ranked = sorted(fused.values(), key=lambda entry: -entry['score'])[:limit]
+    return [
+        {
+            'content': entry['hit']['content'],
+            'relevance': entry['relevance'],
+            'rrf_score': round(entry['score'] / best, 2),
+            'metadata': entry['hit']['metadata'],
+            'match': entry['match'],
+        }
+        for entry in ranked
+    ]
 
 
 class VertexSearch:
     """Vertex AI 검색"""
 
-    def __init__(self):
-        self.bq_client = bigquery.Client(project=PROJECT_ID)
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        self.embedding_model = TextEmbeddingModel.from_pretrained('textembedding-gecko@003')
+    def __init__(self, pool: Optional[ClientPool] = None):
+        # 인스턴스 공유 클라이언트 재사용 (요청마다 생성하지 않음)
+        self.pool = get_pool(pool)
+        self.bq_client = self.pool.get('bigquery')
+        self.embedding_model = self.pool.get('embedding_model')
+        self.embedding_cache = self.pool.get('embedding_cache')
+        self.result_cache = self.pool.get('result_cache')
+        self.generation_watcher = self.pool.get('generation_watcher')
+
+    def embed_query(self, query: str) -> List[float]:
+        """쿼리 임베딩 (캐시 적중 시 API 호출 생략)"""
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """여러 쿼리 임베딩: 캐시 미스만 모아 모델 한도 크기로 나눠 호출"""
+        embeddings: List[Optional[List[float]]] = [
+            self.embedding_cache.get(EMBEDDING_MODEL, query) for query in queries
+        ]
+
+        # 같은 쿼리가 반복되면 한 번만 임베딩
+        missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(queries[i], []).append(i)
+
+        texts = list(missing)
+        tracing.set_attributes({'embedding_cache.hits': len(queries) - sum(map(len, missing.values())),
+                                'embedding_cache.misses': len(texts)})
+        for start in range(0, len(texts), EMBEDDING_BATCH_LIMIT):
+            chunk = texts[start:start + EMBEDDING_BATCH_LIMIT]
+            with _tracer.start_as_current_span('embedding', {
+                tracing.MODEL: EMBEDDING_MODEL,
+                tracing.INPUT_TOKENS: sum(len(text) // 2 + 1 for text in chunk),
+                'texts': len(chunk),
+            }):
+                response = self.embedding_model.get_embeddings(chunk)
+            for text, embedding in zip(chunk, response):
+                values = list(embedding.values)
+                self.embedding_cache.put(EMBEDDING_MODEL, text, values)
+                for i in missing[text]:
+                    embeddings[i] = values
+
+        return embeddings
 
     def search(self, query: str) -> List[Dict[str, Any]]:
         """검색 실행"""
-        # 쿼리 임베딩 생성
-        embeddings = self.embedding_model.get_embeddings([query])
-        query_embedding = embeddings[0].values
-
-        # BigQuery 검색
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-
-        sql = f"""
-        WITH query_embedding AS (
-            SELECT {embedding_str} as embedding
-        )
-        SELECT
-            content,
-            metadata,
-            ML.DISTANCE(embedding, query_embedding.embedding, 'COSINE') as distance
-        FROM
-            `{PROJECT_ID}.knowledge_base.embeddings`,
-            query_embedding
-        WHERE
-            ML.DISTANCE(embedding, query_embedding.embedding, 'COSINE') < {1 - SIMILARITY_THRESHOLD}
-        ORDER BY
-            distance ASC
-        LIMIT {MAX_RESULTS}
+        return self.search_many([query])[0]
+
+    def search_many(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """배치 검색 실행 (쿼리 순서대로 결과 반환, 현재 세대의 캐시 결과 우선)"""
+        with _tracer.start_as_current_span('search', {'queries': len(queries), 'search.backend': SEARCH_BACKEND,
+                                                      'search.mode': SEARCH_MODE}) as span:
+            generation = self._sync_generation()
+            settings = f"{SEARCH_MODE}:{SEARCH_BACKEND}:{COLLAPSE_CHUNKS}"
+            keys = [SearchResultCache.make_key(query, SIMILARITY_THRESHOLD, MAX_RESULTS, settings)
+                    for query in queries]
+            results: List[Optional[List[Dict[str, Any]]]] = [
+                self.result_cache.get(key) if generation is not None else None for key in keys
+            ]
+
+            # 같은 쿼리가 반복되면 한 번만 검색
+            missing: Dict[str, List[int]] = {}
+            for i, cached in enumerate(results):
+                if cached is None:
+                    missing.setdefault(keys[i], []).append(i)
+            span.set_attributes({'result_cache.hits': len(queries) - sum(map(len, missing.values())),
+                                 'result_cache.generation': generation})
+
+            if missing:
+                fresh, degraded = self._search_uncached([queries[indices[0]] for indices in missing.values()])
+                span.set_attribute('search.degraded', degraded)
+                for (key, indices), hits in zip(missing.items(), fresh):
+                    # 검색기 오류로 비었거나 축소된 결과는 캐시하지 않음 (다음 요청에서 다시 검색)
+                    if not degraded:
+                        self.result_cache.put(key, hits, generation)
+                    for i in indices:
+                        results[i] = hits
+            return results
+
+    def _sync_generation(self) -> Optional[int]:
+        """지식 베이스 세대 확인. 바뀌었으면 로컬 인덱스를 따라잡은 뒤 캐시를 새 세대로 전환
+
+        None이면 이번 요청은 캐시를 쓰지 않는다 (세대를 모르거나 인덱스가 아직 준비 전).
         """
+        generation = self.generation_watcher.current(self.bq_client, KNOWLEDGE_TABLE)
+        if generation is None or generation == self.result_cache.generation:
+            return generation
+
+        indexes = []
+        if SEARCH_BACKEND == 'local':
+            indexes.append(self.pool.get('vector_index'))
+        if SEARCH_MODE == 'hybrid':
+            indexes.append(self.pool.get('lexical_index'))
+        # 구축 중인 인덱스로 만든 결과는 캐시하지 않음 (구축은 maybe_refresh가 백그라운드로)
+        if not all(index.ready for index in indexes):
+            return None
+
+        with _generation_lock:
+            if generation != self.result_cache.generation:
+                try:
+                    with _tracer.start_as_current_span('result_cache.advance', {'generation': generation}):
+                        # 업로더가 방금 넣은 행까지 반영한 뒤에야 새 세대 결과를 캐시
+                        if indexes:
+                            self._catch_up(indexes)
+                except Exception as e:
+                    print(f"세대 전환 인덱스 갱신 오류: {e}")
+                    return None
+                self.result_cache.advance(generation)
+        return generation
+
+    def _catch_up(self, indexes: List[Any]) -> None:
+        """새 세대 행을 인덱스에 반영하고 원본에서 지워진 행 정리"""
+        columns = vector_index.source_columns(self.bq_client, KNOWLEDGE_TABLE)
+        key_column = columns[0]
+        for index in indexes:
+            if not key_column:
+                # key 없이는 지워진 행을 가릴 수 없으니 전체 재구축
+                index.reset()
+            index.refresh(self.bq_client, KNOWLEDGE_TABLE, columns)
+        # 업로더가 지운 행은 watermark로 드러나지 않으므로 남은 key 집합과 대조해 정리
+        if key_column:
+            keys = vector_index.fetch_keys(self.bq_client, KNOWLEDGE_TABLE, key_column)
+            for index in indexes:
+                index.retain(keys)
+
+    def _search_uncached(self, queries: List[str]) -> Tuple[List[List[Dict[str, Any]]], bool]:
+        """벡터/키워드 검색 실행: (결과, 축소 여부)
+
+        벡터 검색이 실패해 빈 결과를 돌려주거나 hybrid인데 키워드 검색이 빠지면 축소 결과다.
+        """
+        hybrid = SEARCH_MODE == 'hybrid'
+        lexical = _executor.submit(tracing.bind(self._search_lexical), queries) if hybrid else None
+        vector = self._search_vector(queries, HYBRID_CANDIDATES if hybrid else MAX_RESULTS)
+        degraded = vector is None
+        if vector is None:
+            vector = [[] for _ in queries]
+
+        lexical_results = lexical.result() if lexical is not None else None
+        if lexical_results is None:
+            return [hits[:MAX_RESULTS] for hits in vector], degraded or hybrid
+        return [
+            fuse_rankings({'vector': vector_hits, 'lexical': lexical_hits}, MAX_RESULTS)
+            for vector_hits, lexical_hits in zip(vector, lexical_results)
+        ], degraded
+
+    def _search_vector(self, queries: List[str], limit: int) -> Optional[List[List[Dict[str, Any]]]]:
+        """벡터 검색 (로컬 인덱스 우선, 준비 전에는 BigQuery, 둘 다 실패하면 None)"""
+        # 쿼리 임베딩 생성
+        query_embeddings = self.embed_queries(queries)
+
+        if SEARCH_BACKEND == 'local':
+            results = self._search_local(query_embeddings, limit)
+            if results is not None:
+                return results
 
+        return self._search_bigquery(query_embeddings, limit)
+
+    def _search_lexical(self, queries: List[str]) -> Optional[List[List[Dict[str, Any]]]]:
+        """BM25 키워드 검색 (색인이 준비되지 않았으면 None)"""
         try:
-            results = []
-            query_job = self.bq_client.query(sql)
+            index = self.pool.get('lexical_index')
+            index.maybe_refresh(self.bq_client, KNOWLEDGE_TABLE)
+            if not index.ready:
+                return None
 
-            for row in query_job:
-                results.append({
-                    'content': row.content[:200] + "..." if len(row.content) > 200 else row.content,
-                    'relevance': round(1 - row.distance, 2),
-                    'metadata': json.loads(row.metadata) if isinstance(row.metadata, str) else row.metadata
-                })
+            with _tracer.start_as_current_span('lexical_index.search', {'index.rows': index.count}) as span:
+                batch = [index.search(query, HYBRID_CANDIDATES, COLLAPSE_CHUNKS) for query in queries]
+                span.set_attribute('hits', sum(map(len, batch)))
+            return batch
 
-            return results
+        except Exception as e:
+            print(f"키워드 색인 검색 오류: {e}")
+            return None
+
+    def _search_local(self, query_embeddings: List[List[float]], limit: int) -> Optional[List[List[Dict[str, Any]]]]:
+        """로컬 벡터 인덱스 검색 (인덱스가 준비되지 않았으면 None)"""
+        try:
+            index = self.pool.get('vector_index')
+            index.maybe_refresh(self.bq_client, KNOWLEDGE_TABLE)
+            if not index.ready:
+                return None
+
+            with _tracer.start_as_current_span('vector_index.search', {'index.rows': index.count}) as span:
+                batch = index.search_batch(query_embeddings, SIMILARITY_THRESHOLD, limit, COLLAPSE_CHUNKS)
+                span.set_attribute('hits', sum(map(len, batch)))
+
+            return [
+                [
+                    {
+                        'content': hit['content'],
+                        'relevance': round(1 - hit['distance'], 2),
+                        'metadata': hit['metadata']
+                    }
+                    for hit in hits
+                ]
+                for hits in batch
+            ]
+
+        except Exception as e:
+            print(f"로컬 인덱스 검색 오류: {e}")
+            return None
+
+    def _search_bigquery(self, query_embeddings: List[List[float]],
+                         limit: int) -> Optional[List[List[Dict[str, Any]]]]:
+        """BigQuery 검색 (모든 쿼리를 잡 하나로 처리, 실패하면 None)"""
+        try:
+            return bigquery_search.search(self.bq_client, KNOWLEDGE_TABLE, query_embeddings,
+                                          SIMILARITY_THRESHOLD, limit, COLLAPSE_CHUNKS)
 
         except Exception as e:
             print(f"검색 오류: {e}")
-            return []
+            return None
+
+
+def _format_results(query: str, results: List[Dict[str, Any]]) -> str:
+    """검색 결과 응답 텍스트"""
+    if not results:
+        return f"'{query}'에 대한 검색 결과가 없습니다."
+
+    response_text = f"🔍 '{query}' 검색 결과 ({len(results)}개):\n\n"
+    for i, result in enumerate(results, 1):
+        relevance = result.get('relevance')
+        label = f"관련도 {relevance:.0%}" if relevance is not None else "키워드 일치"
+        response_text += f"**{i}. {label}**\n"
+        response_text += f"{result['content']}\n\n"
+    return response_text
 
 
 @functions_framework.http
+@profile_first_response
 def search(request):
     """
     HTTP 엔드포인트
@@ -80,6 +319,10 @@ def search(request):
     {
         "query": "검색어"
     }
+    또는 배치 검색 (임베딩 호출과 BigQuery 잡을 한 번으로 묶음):
+    {
+        "queries": ["검색어1", "검색어2", ...]
+    }
 
     Response:
     {
@@ -89,6 +332,8 @@ def search(request):
             }]
         }
     }
+    배치 검색은 쿼리별 메시지와 함께 구조화된 결과를 돌려준다
+    (Dialogflow CX: sessionInfo.parameters.search_results, 일반 HTTP: results).
     """
     # CORS
     if request.method == 'OPTIONS':
@@ -103,17 +348,25 @@ def search(request):
 
     try:
         request_json = request.get_json(silent=True)
+        is_dialogflow = bool(request_json and 'sessionInfo' in request_json)
 
         # Dialogflow CX 형식
-        if request_json and 'sessionInfo' in request_json:
+        if is_dialogflow:
             parameters = request_json.get('sessionInfo', {}).get('parameters', {})
             query = parameters.get('query', '')
+            queries = parameters.get('queries')
 
-            if not query:
+            if not query and not queries:
                 text = request_json.get('text', '')
                 query = text.replace('검색', '').replace('search', '').strip()
         else:
             query = request_json.get('query', '') if request_json else ''
+            queries = request_json.get('queries') if request_json else None
+
+        if isinstance(queries, list):
+            queries = [q.strip() for q in queries if isinstance(q, str) and q.strip()]
+            if queries:
+                return _batch_search(queries[:MAX_BATCH_QUERIES], is_dialogflow, headers)
 
         if not query:
             return jsonify({
@@ -129,15 +382,10 @@ def search(request):
         # 검색 실행
         searcher = VertexSearch()
         results = searcher.search(query)
+        print(f"임베딩 캐시: {json.dumps(searcher.embedding_cache.stats())}")
+        print(f"검색 결과 캐시: {json.dumps(searcher.result_cache.stats())}")
 
-        if not results:
-            response_text = f"'{query}'에 대한 검색 결과가 없습니다."
-        else:
-            response_text = f"🔍 '{query}' 검색 결과 ({len(results)}개):\n\n"
-
-            for i, result in enumerate(results, 1):
-                response_text += f"**{i}. 관련도 {result['relevance']:.0%}**\n"
-                response_text += f"{result['content']}\n\n"
+        response_text = _format_results(query, results)
 
         return jsonify({
             "fulfillmentResponse": {
@@ -158,3 +406,33 @@ def search(request):
                 }]
             }
         }), 200, headers
+
+
+def _batch_search(queries: List[str], is_dialogflow: bool, headers: Dict[str, str]):
+    """배치 검색 응답"""
+    print(f"배치 검색 시작: {len(queries)}개 쿼리")
+
+    searcher = VertexSearch()
+    batch_results = searcher.search_many(queries)
+    print(f"임베딩 캐시: {json.dumps(searcher.embedding_cache.stats())}")
+    print(f"검색 결과 캐시: {json.dumps(searcher.result_cache.stats())}")
+
+    structured = [
+        {'query': query, 'results': results}
+        for query, results in zip(queries, batch_results)
+    ]
+    response = {
+        "fulfillmentResponse": {
+            "messages": [
+                {"text": {"text": [_format_results(item['query'], item['results'])]}}
+                for item in structured
+            ]
+        }
+    }
+
+    if is_dialogflow:
+        response["sessionInfo"] = {"parameters": {"search_results": structured}}
+    else:
+        response["results"] = structured
+
+    return jsonify(response), 200, headers
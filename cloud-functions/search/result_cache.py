@@ -0,0 +1,178 @@
+"""
+검색 결과 캐시
+(정규화된 쿼리, 임계값, 최대 결과 수, 검색 설정) 기준 LRU 메모리 캐시, 선택적 SQLite 디스크 계층
+항목마다 지식 베이스 세대(generation)를 함께 저장하고, 업로더가 세대를 올리면 이전 세대 항목은 모두 무효
+세대는 지식 테이블 라벨에 있어 잡 없이 메타데이터 조회만으로 확인한다
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from embedding_cache import normalize_query
+
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+# 세대 무효화가 누락돼도 이 시간이 지나면 만료
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '3600'))
+# 비어 있으면 메모리 계층만 사용 (Cloud Functions에서는 /tmp 경로 사용)
+SEARCH_CACHE_DB = os.getenv('SEARCH_CACHE_DB', '')
+# 테이블 라벨의 세대를 다시 확인하는 주기 (초)
+GENERATION_CHECK_SECONDS = float(os.getenv('GENERATION_CHECK_SECONDS', '10'))
+# 업로더(scripts/bq_writer.py)가 올리는 테이블 라벨
+GENERATION_LABEL = 'search_generation'
+
+
+def read_generation(bq_client: Any, table: str) -> int:
+    """지식 테이블 라벨의 세대 (메타데이터 API, 쿼리 잡 없음)"""
+    labels = bq_client.get_table(table).labels or {}
+    return int(labels.get(GENERATION_LABEL, 0))
+
+
+class GenerationWatcher:
+    """세대 값을 주기적으로 다시 읽음 (한 스레드만 조회, 나머지는 직전 값 사용)"""
+
+    def __init__(self, interval: float = GENERATION_CHECK_SECONDS):
+        self.interval = interval
+        self._generation: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, bq_client: Any, table: str) -> Optional[int]:
+        """현재 세대 (한 번도 읽지 못했으면 None)"""
+        if time.time() - self._checked_at < self.interval:
+            return self._generation
+        # 이미 다른 스레드가 조회 중이면 기다리지 않고 직전 값 사용 (첫 조회는 기다림)
+        if not self._lock.acquire(blocking=self._generation is None):
+            return self._generation
+        try:
+            if time.time() - self._checked_at >= self.interval:
+                try:
+                    self._generation = read_generation(bq_client, table)
+                except Exception as e:
+                    print(f"검색 세대 조회 오류: {e}")
+                self._checked_at = time.time()
+            return self._generation
+        finally:
+            self._lock.release()
+
+
+class SearchResultCache:
+    """세대 단위로 무효화되는 스레드 안전 검색 결과 캐시
+
+    결과는 JSON 문자열로 보관해 호출자가 반환값을 바꿔도 캐시가 오염되지 않는다.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl_seconds: float = SEARCH_CACHE_TTL,
+                 disk_path: str = SEARCH_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation: Optional[int] = None
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS search_results '
+                '(key TEXT PRIMARY KEY, generation INTEGER NOT NULL, results TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM search_results WHERE expires_at < ?', (time.time(),))
+        except sqlite3.Error as e:
+            print(f"검색 결과 디스크 캐시 비활성화: {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(query: str, threshold: float, max_results: int, settings: str = '') -> str:
+        return hashlib.sha256(
+            f"{normalize_query(query)}\0{threshold}\0{max_results}\0{settings}".encode('utf-8')
+        ).hexdigest()
+
+    def advance(self, generation: int) -> None:
+        """새 세대로 전환: 이전 세대 항목 폐기"""
+        with self._lock:
+            if generation == self.generation:
+                return
+            if self.generation is not None:
+                self._counters['invalidations'] += 1
+            self.generation = generation
+            self._entries.clear()
+            if self._db is not None:
+                try:
+                    # 같은 파일을 쓰는 다른 프로세스가 이미 새 세대를 저장했을 수 있으므로 이전 세대만 삭제
+                    self._db.execute('DELETE FROM search_results WHERE generation < ?', (generation,))
+                except sqlite3.Error as e:
+                    print(f"검색 결과 디스크 캐시 정리 오류: {e}")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """현재 세대의 캐시 결과 (메모리 → 디스크 순)"""
+        now = time.time()
+        with self._lock:
+            if self.generation is None:
+                return None
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return json.loads(payload)
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT results, expires_at FROM search_results WHERE key = ? AND generation = ?',
+                    (key, self.generation),
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    self._counters['disk_hits'] += 1
+                    return json.loads(row[0])
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, key: str, results: List[Dict[str, Any]], generation: Optional[int]) -> None:
+        """검색 시작 시점의 세대로 저장 (그 사이 세대가 바뀌었으면 버림)"""
+        payload = json.dumps(results, ensure_ascii=False)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            if generation is None or generation != self.generation:
+                return
+            self._remember(key, expires_at, payload)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO search_results (key, generation, results, expires_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        (key, generation, payload, expires_at),
+                    )
+                except sqlite3.Error as e:
+                    print(f"검색 결과 디스크 캐시 저장 오류: {e}")
+
+    def _remember(self, key: str, expires_at: float, payload: str) -> None:
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """적중률 카운터"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+            stats['generation'] = self.generation
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
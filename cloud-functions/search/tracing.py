@@ -0,0 +1,334 @@
+"""
+트레이싱 및 단계별 비용 집계
+OpenTelemetry 스타일 스팬 API (start_as_current_span / set_attribute / record_exception).
+끝난 스팬은 TRACE_EXPORTER로 내보내고, 같은 트레이스의 스팬을 모아 단계/라운드별
+시간, 토큰, 비용 요약(breakdown)을 만든다.
+
+cloud-functions/debate, cloud-functions/search, scripts에 같은 파일을 둔다
+(배포 단위마다 소스 디렉터리만 올라가므로). 세 사본은 바이트 단위로 같아야 한다.
+"""
+import contextlib
+import contextvars
+import functools
+import importlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 쉼표로 여러 개: console (stdout JSON 한 줄), file (TRACE_FILE에 JSON lines),
+# otel (설치된 OpenTelemetry SDK의 tracer provider로 전달). 비우면 내보내지 않음
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', '')
+TRACE_FILE = os.getenv('TRACE_FILE', '/tmp/traces.jsonl')
+SERVICE_NAME = os.getenv('K_SERVICE', 'local')
+
+# 모델 접두사별 목록 가격 (USD / 1M 토큰, [입력, 출력]). MODEL_PRICES JSON으로 덮어쓰기
+DEFAULT_PRICES = {
+    'claude-sonnet-4-5': [3.0, 15.0],
+    'claude-haiku-4-5': [1.0, 5.0],
+    'gemini-2.0-flash-lite': [0.075, 0.30],
+    'gemini-2.0-flash': [0.10, 0.40],
+    'sonar-pro': [3.0, 15.0],
+    'sonar': [1.0, 1.0],
+    'text-multilingual-embedding': [0.05, 0.0],
+    'textembedding-gecko': [0.05, 0.0],
+}
+MODEL_PRICES: Dict[str, List[float]] = {**DEFAULT_PRICES, **json.loads(os.getenv('MODEL_PRICES', '{}'))}
+
+# OpenTelemetry GenAI 시맨틱 컨벤션 속성 이름
+MODEL = 'gen_ai.request.model'
+INPUT_TOKENS = 'gen_ai.usage.input_tokens'
+OUTPUT_TOKENS = 'gen_ai.usage.output_tokens'
+
+_current: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+_export_lock = threading.Lock()
+
+
+def price(model: str, input_tokens: int, output_tokens: int) -> float:
+    """목록 가격 기준 추정 비용 (USD, 모르는 모델은 0)"""
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            input_price, output_price = MODEL_PRICES[prefix]
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+class Trace:
+    """한 요청(루트 스팬)에 속한 스팬 모음"""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List['Span'] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: 'Span') -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def snapshot(self) -> List['Span']:
+        with self._lock:
+            return list(self.spans)
+
+
+class Span:
+    """시간 구간 하나 (끝나기 전에도 속성 추가 가능)"""
+
+    def __init__(self, name: str, parent: Optional['Span'], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.trace = parent.trace if parent is not None else Trace()
+        self.span_id = os.urandom(8).hex()
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = 'OK'
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._otel = _otel_start(self)
+        self.trace.add(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def increment(self, key: str, amount: float = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append({'name': name, 'time_unix_nano': time.time_ns(), 'attributes': attributes or {}})
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = 'ERROR'
+        self.add_event('exception', {'exception.type': type(error).__name__, 'exception.message': str(error)[:300]})
+
+    @property
+    def duration(self) -> float:
+        """초 단위 (아직 진행 중이면 지금까지)"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        _export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """OTLP JSON과 같은 필드 이름"""
+        return {
+            'name': self.name,
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent.span_id if self.parent is not None else None,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'duration_ms': round(self.duration * 1000, 1),
+            'attributes': self.attributes,
+            'events': self.events,
+            'status': self.status,
+            'resource': {'service.name': SERVICE_NAME},
+        }
+
+
+class Tracer:
+    """opentelemetry.trace.Tracer와 같은 모양의 최소 구현"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Span:
+        """현재 스팬의 자식 스팬 시작 (현재 스팬으로 바꾸지 않음, end()는 호출한 쪽에서)"""
+        return Span(name, _current.get(), attributes)
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+        span = self.start_span(name, attributes)
+        with use_span(span, end_on_exit=True):
+            yield span
+
+
+def get_tracer(name: str) -> Tracer:
+    return Tracer(name)
+
+
+@contextlib.contextmanager
+def use_span(span: Span, end_on_exit: bool = False) -> Iterator[Span]:
+    """span을 현재 스팬으로 (예외는 스팬에 기록 후 전파)"""
+    previous = _current.get()
+    # 제너레이터 안에서 yield를 넘나들면 토큰 reset이 다른 컨텍스트에서 불릴 수 있어 set으로 복원
+    _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            span.record_exception(e)
+        raise
+    finally:
+        _current.set(previous)
+        if end_on_exit:
+            span.end()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attributes(attributes: Dict[str, Any]) -> None:
+    """현재 스팬이 있으면 속성 추가"""
+    span = _current.get()
+    if span is not None:
+        span.set_attributes(attributes)
+
+
+def bind(fn: Callable) -> Callable:
+    """다른 스레드(executor)에서 실행될 함수를 지금의 현재 스팬 아래로 묶음"""
+    parent = _current.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = _current.get()
+        _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.set(previous)
+
+    return wrapper
+
+
+# ---- 내보내기 ----
+
+def _exporters() -> List[str]:
+    return [name.strip() for name in TRACE_EXPORTER.split(',') if name.strip()]
+
+
+def _export(span: Span) -> None:
+    exporters = _exporters()
+    if not exporters:
+        return
+    try:
+        if 'console' in exporters or 'file' in exporters:
+            line = json.dumps({'span': span.to_dict()}, ensure_ascii=False, default=str)
+            if 'console' in exporters:
+                print(line)
+            if 'file' in exporters:
+                with _export_lock, open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+        if span._otel is not None:
+            span._otel.set_attributes({k: v for k, v in span.attributes.items()
+                                       if isinstance(v, (str, bool, int, float))})
+            for event in span.events:
+                span._otel.add_event(event['name'], event['attributes'], event['time_unix_nano'])
+            if span.status == 'ERROR':
+                otel_trace = _otel_trace()
+                span._otel.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+            span._otel.end(end_time=span.end_ns)
+    except Exception as e:
+        # 트레이싱 실패가 요청을 실패시키면 안 된다
+        print(f"스팬 내보내기 오류: {e}")
+
+
+def _otel_trace() -> Any:
+    """opentelemetry.trace (otel 내보내기를 켰을 때만 import)"""
+    return importlib.import_module('opentelemetry.trace')
+
+
+def _otel_start(span: Span) -> Any:
+    """otel 내보내기가 켜져 있으면 SDK 스팬을 같은 부모 아래에 시작"""
+    if 'otel' not in _exporters():
+        return None
+    try:
+        otel_trace = _otel_trace()
+        parent = span.parent._otel if span.parent is not None else None
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        return otel_trace.get_tracer(SERVICE_NAME).start_span(
+            span.name, context=context, attributes=span.attributes, start_time=span.start_ns)
+    except Exception as e:
+        print(f"OpenTelemetry 스팬 시작 오류: {e}")
+        return None
+
+
+# ---- 요약 ----
+
+def breakdown(trace: Optional[Trace] = None, group_by: str = 'round') -> Dict[str, Any]:
+    """트레이스의 단계별 시간/토큰/비용과 group_by 속성(라운드) 단위 요약
+
+    {"total_s", "stages": {스팬 이름: {"count", "seconds"}}, "tokens": {"input", "output"},
+     "cost_usd", "retries", "models": {모델: {...}}, "rounds": [{"round", "seconds", ...}]}
+    단계 시간은 스팬 시간의 합이라 병렬 실행이나 중첩된 스팬이 있으면 총 시간보다 클 수 있다.
+    """
+    if trace is None:
+        span = _current.get()
+        if span is None:
+            return {}
+        trace = span.trace
+    spans = trace.snapshot()
+    if not spans:
+        return {}
+
+    def group_of(span: Span) -> Optional[Any]:
+        while span is not None:
+            if group_by in span.attributes:
+                return span.attributes[group_by]
+            span = span.parent
+        return None
+
+    stages: Dict[str, Dict[str, float]] = {}
+    models: Dict[str, Dict[str, float]] = {}
+    groups: Dict[Any, Dict[str, float]] = {}
+    totals = {'input': 0, 'output': 0, 'cost_usd': 0.0, 'retries': 0}
+
+    for span in spans:
+        stage = stages.setdefault(span.name, {'count': 0, 'seconds': 0.0})
+        stage['count'] += 1
+        stage['seconds'] += span.duration
+
+        key = group_of(span)
+        group = None
+        if key is not None:
+            group = groups.setdefault(key, {'seconds': 0.0, 'input_tokens': 0, 'output_tokens': 0,
+                                            'cost_usd': 0.0, 'retries': 0})
+            if group_by in span.attributes:
+                # 속성을 직접 가진 가장 바깥 스팬(라운드 스팬)이 가장 길다
+                group['seconds'] = max(group['seconds'], span.duration)
+
+        retries = span.attributes.get('retries', 0)
+        totals['retries'] += retries
+        if group is not None:
+            group['retries'] += retries
+
+        if INPUT_TOKENS not in span.attributes and OUTPUT_TOKENS not in span.attributes:
+            continue
+        model = span.attributes.get(MODEL, 'unknown')
+        input_tokens = span.attributes.get(INPUT_TOKENS, 0)
+        output_tokens = span.attributes.get(OUTPUT_TOKENS, 0)
+        cost = price(model, input_tokens, output_tokens)
+
+        usage = models.setdefault(model, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0})
+        usage['calls'] += 1
+        usage['input_tokens'] += input_tokens
+        usage['output_tokens'] += output_tokens
+        usage['cost_usd'] += cost
+        totals['input'] += input_tokens
+        totals['output'] += output_tokens
+        totals['cost_usd'] += cost
+        if group is not None:
+            group['input_tokens'] += input_tokens
+            group['output_tokens'] += output_tokens
+            group['cost_usd'] += cost
+
+    root = next((span for span in spans if span.parent is None), spans[0])
+    return {
+        'total_s': round(root.duration, 3),
+        'stages': {name: {'count': s['count'], 'seconds': round(s['seconds'], 3)} for name, s in stages.items()},
+        'tokens': {'input': totals['input'], 'output': totals['output']},
+        'cost_usd': round(totals['cost_usd'], 6),
+        'retries': totals['retries'],
+        'models': {name: {**m, 'cost_usd': round(m['cost_usd'], 6)} for name, m in models.items()},
+        'rounds': [
+            {group_by: key, **{k: round(v, 6 if k == 'cost_usd' else 3) if isinstance(v, float) else v
+                               for k, v in group.items()}}
+            for key, group in sorted(groups.items(), key=lambda item: item[0])
+        ],
+    }
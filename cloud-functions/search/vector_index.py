@@ -0,0 +1,453 @@
+"""
+로컬 벡터 인덱스
+knowledge_base.embeddings 스냅샷을 float32 행렬 파일로 저장하고 memmap으로 top-k 검색
+BigQuery는 원본(source of truth)으로만 사용하고, 인덱스는 watermark 기준으로 증분 갱신
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import tracing
+from lazy import LazyModule
+
+np = LazyModule('numpy')
+bigquery = LazyModule('google.cloud.bigquery')
+
+INDEX_DIR = Path(os.getenv('VECTOR_INDEX_DIR', '/tmp/vector_index'))
+INDEX_REFRESH_SECONDS = float(os.getenv('INDEX_REFRESH_SECONDS', '300'))
+# 같은 키의 행이 다시 들어오면 이전 행을 대체 (빈 값이거나 테이블에 없으면 append-only)
+INDEX_KEY_COLUMN = os.getenv('INDEX_KEY_COLUMN', 'doc_id')
+# 증분 갱신 기준 컬럼 (쉼표 구분, 행마다 NULL이 아닌 첫 값 사용. 테이블에 하나도 없으면 매번 전체 재구축)
+# 업로더의 MERGE가 찍는 synced_at이 우선이고, 다른 경로로 들어와 synced_at이 NULL인 행은 created_at으로 잡는다
+INDEX_WATERMARK_COLUMNS = [column.strip() for column in
+                           os.getenv('INDEX_WATERMARK_COLUMN', 'synced_at,created_at').split(',') if column.strip()]
+# 행 수가 이 값 이상이면 IVF 근사 검색, 미만이면 전체 행렬 정확 검색
+IVF_MIN_ROWS = int(os.getenv('IVF_MIN_ROWS', '20000'))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '8'))
+EMBEDDING_DIM = 768
+SNIPPET_CHARS = 200
+
+_VECTORS_FILE = 'vectors.f32'
+_ROWS_FILE = 'rows.jsonl'
+_MANIFEST_FILE = 'manifest.json'
+
+_tracer = tracing.get_tracer(__name__)
+
+
+def format_snippet(content: str) -> str:
+    """검색 결과용 본문 요약"""
+    return content[:SNIPPET_CHARS] + "..." if len(content) > SNIPPET_CHARS else content
+
+
+class _IVF:
+    """역파일(IVF) 조대 양자화기: 구형 k-means 중심점 + 행별 클러스터 배정"""
+
+    def __init__(self, centroids, assignments, trained_rows: Optional[int] = None):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_rows = trained_rows if trained_rows is not None else len(assignments)
+
+    @classmethod
+    def train(cls, vectors, iterations: int = 10, seed: int = 0) -> '_IVF':
+        count = len(vectors)
+        nlist = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(seed)
+
+        # 학습은 표본으로, 배정은 전체 행으로
+        sample = vectors[np.sort(rng.choice(count, size=min(count, nlist * 40), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        return cls(centroids, cls._assign(centroids, vectors))
+
+    @staticmethod
+    def _assign(centroids, vectors):
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 8192):
+            block = vectors[start:start + 8192]
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def extend(self, vectors) -> '_IVF':
+        """새 행을 배정한 사본 (기존 스냅샷이 참조하는 객체는 건드리지 않음)"""
+        assignments = np.concatenate([self.assignments, self._assign(self.centroids, vectors)])
+        return _IVF(self.centroids, assignments, self.trained_rows)
+
+    def candidates(self, query, nprobe: int):
+        nprobe = min(nprobe, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self.assignments, clusters))
+
+
+class _Snapshot:
+    """검색 시점에 참조하는 불변 스냅샷 (갱신 시 통째로 교체)"""
+
+    def __init__(self, vectors, rows: List[Dict[str, Any]], alive, ivf: Optional[_IVF]):
+        self.vectors = vectors
+        self.rows = rows
+        self.alive = alive
+        self.ivf = ivf
+
+
+class VectorIndex:
+    """memmap 기반 로컬 근접 이웃 인덱스
+
+    벡터는 L2 정규화해 저장하므로 코사인 거리 = 1 - 내적.
+    검색 결과는 BigQuery 경로와 같은 의미를 유지한다:
+    distance < 1 - threshold 인 행만, 거리 오름차순으로 최대 limit개.
+    """
+
+    def __init__(self, directory: Path = INDEX_DIR, dim: int = EMBEDDING_DIM):
+        self.directory = Path(directory)
+        self.dim = dim
+        self._snapshot: Optional[_Snapshot] = None
+        self._rows: List[Dict[str, Any]] = []
+        self._deleted: set = set()
+        self._keys: Dict[str, int] = {}
+        self._watermark: Optional[str] = None
+        self._ivf: Optional[_IVF] = None
+        self._write_lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._last_refresh = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def count(self) -> int:
+        return len(self._rows) - len(self._deleted)
+
+    # ---- 영속화 ----
+
+    def load(self) -> bool:
+        """디스크의 인덱스 로드 (파일이 불완전하면 False)"""
+        manifest_path = self.directory / _MANIFEST_FILE
+        if not manifest_path.exists():
+            return False
+
+        manifest = json.loads(manifest_path.read_text())
+        count = manifest['count']
+        vectors_path = self.directory / _VECTORS_FILE
+        if manifest['dim'] != self.dim or vectors_path.stat().st_size != count * self.dim * 4:
+            return False
+
+        with open(self.directory / _ROWS_FILE, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        if len(rows) != count:
+            return False
+
+        with self._write_lock:
+            self._rows = rows
+            self._deleted = set(manifest.get('deleted', []))
+            self._keys = {row['key']: i for i, row in enumerate(rows) if row.get('key') and i not in self._deleted}
+            self._watermark = manifest.get('watermark')
+            self._ivf = None
+            self._publish()
+        return True
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            'dim': self.dim,
+            'count': len(self._rows),
+            'watermark': self._watermark,
+            'deleted': sorted(self._deleted),
+        }
+        tmp_path = self.directory / (_MANIFEST_FILE + '.tmp')
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, self.directory / _MANIFEST_FILE)
+
+    def _publish(self) -> None:
+        """현재 파일 상태로 새 스냅샷을 만들어 교체"""
+        count = len(self._rows)
+        if count:
+            vectors = np.memmap(self.directory / _VECTORS_FILE, dtype=np.float32, mode='r',
+                                shape=(count, self.dim))
+        else:
+            vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+        alive = np.ones(count, dtype=bool)
+        if self._deleted:
+            alive[sorted(self._deleted)] = False
+
+        if count < IVF_MIN_ROWS:
+            self._ivf = None
+        elif self._ivf is None or count > 2 * self._ivf.trained_rows:
+            self._ivf = _IVF.train(vectors)
+        elif len(self._ivf.assignments) < count:
+            self._ivf = self._ivf.extend(vectors[len(self._ivf.assignments):])
+
+        self._snapshot = _Snapshot(vectors, list(self._rows), alive, self._ivf)
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """행 추가 (key가 같은 기존 행은 삭제 표시). 추가된 행 수 반환"""
+        added = 0
+        with self._write_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / _VECTORS_FILE, 'ab') as vf, \
+                    open(self.directory / _ROWS_FILE, 'a', encoding='utf-8') as rf:
+                for row in rows:
+                    vector = np.asarray(row['embedding'], dtype=np.float32)
+                    norm = float(np.linalg.norm(vector))
+                    if vector.shape != (self.dim,) or norm == 0.0:
+                        continue
+
+                    metadata = row.get('metadata')
+                    record = {
+                        'key': row.get('key'),
+                        # 청크 행은 원본 문서 단위로 묶어서 반환
+                        'parent': (metadata or {}).get('parent_doc_id') if isinstance(metadata, dict) else None,
+                        'content': format_snippet(row.get('content') or ''),
+                        'metadata': metadata,
+                    }
+                    vf.write((vector / norm).tobytes())
+                    rf.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+                    index = len(self._rows)
+                    self._rows.append(record)
+                    if record['key']:
+                        previous = self._keys.get(record['key'])
+                        if previous is not None:
+                            self._deleted.add(previous)
+                        self._keys[record['key']] = index
+
+                    watermark = row.get('watermark')
+                    if watermark and (self._watermark is None or watermark > self._watermark):
+                        self._watermark = watermark
+                    added += 1
+
+            if self._deleted and len(self._deleted) > len(self._rows) // 4:
+                self._compact()
+            self._write_manifest()
+            self._publish()
+        return added
+
+    def _compact(self) -> None:
+        """삭제 표시된 행을 제거해 파일 재작성"""
+        keep = [i for i in range(len(self._rows)) if i not in self._deleted]
+        old = np.memmap(self.directory / _VECTORS_FILE, dtype=np.float32, mode='r',
+                        shape=(len(self._rows), self.dim))
+
+        tmp_vectors = self.directory / (_VECTORS_FILE + '.tmp')
+        tmp_rows = self.directory / (_ROWS_FILE + '.tmp')
+        with open(tmp_vectors, 'wb') as vf, open(tmp_rows, 'w', encoding='utf-8') as rf:
+            for i in keep:
+                vf.write(np.asarray(old[i]).tobytes())
+                rf.write(json.dumps(self._rows[i], ensure_ascii=False) + '\n')
+
+        # 기존 스냅샷의 memmap은 교체 후에도 유효 (inode 유지)
+        os.replace(tmp_vectors, self.directory / _VECTORS_FILE)
+        os.replace(tmp_rows, self.directory / _ROWS_FILE)
+        self._rows = [self._rows[i] for i in keep]
+        self._deleted = set()
+        self._keys = {row['key']: i for i, row in enumerate(self._rows) if row.get('key')}
+        self._ivf = None
+
+    def retain(self, keys: set) -> int:
+        """key가 keys에 없는 행을 삭제 표시 (원본에서 지워진 행 정리). 제거된 행 수 반환"""
+        with self._write_lock:
+            removed = [i for key, i in self._keys.items() if key not in keys]
+            if not removed:
+                return 0
+            for i in removed:
+                self._deleted.add(i)
+                del self._keys[self._rows[i]['key']]
+
+            if len(self._deleted) > len(self._rows) // 4:
+                self._compact()
+            self._write_manifest()
+            self._publish()
+        return len(removed)
+
+    def reset(self) -> None:
+        """인덱스 파일 삭제"""
+        with self._write_lock:
+            for name in (_VECTORS_FILE, _ROWS_FILE, _MANIFEST_FILE):
+                (self.directory / name).unlink(missing_ok=True)
+            self._rows, self._deleted, self._keys = [], set(), {}
+            self._watermark, self._ivf, self._snapshot = None, None, None
+
+    # ---- 검색 ----
+
+    def search(self, query_embedding: List[float], threshold: float, limit: int,
+               collapse: bool = False) -> List[Dict[str, Any]]:
+        """top-k 검색: [{'content', 'metadata', 'key', 'distance'}] (거리 오름차순)"""
+        return self.search_batch([query_embedding], threshold, limit, collapse)[0]
+
+    def search_batch(self, query_embeddings: List[List[float]], threshold: float,
+                     limit: int, collapse: bool = False) -> List[List[Dict[str, Any]]]:
+        """여러 쿼리를 한 번의 행렬 곱으로 검색 (입력 순서대로 결과 반환)
+
+        collapse=True이면 같은 원본 문서(parent)의 청크 중 가장 가까운 것만 남기고
+        서로 다른 문서 limit개를 반환한다.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or not len(snapshot.rows) or limit <= 0 or not query_embeddings:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), self.dim)
+        norms = np.linalg.norm(queries, axis=1)
+        queries = queries / np.where(norms == 0.0, 1.0, norms)[:, None]
+
+        if snapshot.ivf is None:
+            candidates = np.flatnonzero(snapshot.alive)
+            distance_matrix = 1.0 - queries @ snapshot.vectors.T
+
+        results = []
+        for i, query in enumerate(queries):
+            if norms[i] == 0.0:
+                results.append([])
+                continue
+
+            if snapshot.ivf is not None:
+                candidates = snapshot.ivf.candidates(query, IVF_NPROBE)
+                candidates = candidates[snapshot.alive[candidates]]
+                distances = 1.0 - snapshot.vectors[candidates] @ query
+            else:
+                distances = distance_matrix[i, candidates]
+
+            results.append(self._top_k(snapshot, candidates, distances, threshold, limit, collapse))
+        return results
+
+    @staticmethod
+    def _top_k(snapshot: _Snapshot, candidates, distances, threshold: float,
+               limit: int, collapse: bool) -> List[Dict[str, Any]]:
+        mask = distances < (1.0 - threshold)
+        candidates, distances = candidates[mask], distances[mask]
+        if len(candidates) > limit and not collapse:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            candidates, distances = candidates[top], distances[top]
+
+        # 거리 → 행 번호 순으로 정렬해 동점에서도 결과 순서가 결정적
+        order = np.lexsort((candidates, distances))
+        if collapse:
+            picked, parents = [], set()
+            for i in order:
+                row = snapshot.rows[candidates[i]]
+                parent = row.get('parent') or row.get('key') or int(candidates[i])
+                if parent not in parents:
+                    parents.add(parent)
+                    picked.append(i)
+                    if len(picked) == limit:
+                        break
+            order = picked
+        return [
+            {**snapshot.rows[candidates[i]], 'distance': float(distances[i])}
+            for i in order
+        ]
+
+    # ---- BigQuery 동기화 ----
+
+    def refresh(self, bq_client: Any, table: str,
+                columns: Optional[Tuple[Optional[str], Optional[str]]] = None) -> int:
+        """BigQuery에서 watermark 이후 행을 읽어 인덱스에 반영. 추가된 행 수 반환
+
+        columns는 source_columns() 결과 (없으면 여기서 조회).
+        """
+        with self._refreshing, _tracer.start_as_current_span('vector_index.refresh') as span:
+            key_column, watermark = columns or source_columns(bq_client, table)
+            if not watermark:
+                self.reset()
+
+            key_expr = key_column or 'CAST(NULL AS STRING)'
+            watermark_expr = watermark or 'CAST(NULL AS TIMESTAMP)'
+            where = f"WHERE {watermark} > @watermark" if watermark and self._watermark else ""
+
+            sql = f"""
+            SELECT
+                {key_expr} AS doc_key,
+                content,
+                metadata,
+                embedding,
+                {watermark_expr} AS watermark
+            FROM
+                `{table}`
+            {where}
+            ORDER BY
+                watermark
+            """
+            params = []
+            if self._watermark:
+                params.append(bigquery.ScalarQueryParameter(
+                    'watermark', 'TIMESTAMP', datetime.fromisoformat(self._watermark)))
+            job_config = bigquery.QueryJobConfig(query_parameters=params)
+
+            def rows():
+                for row in bq_client.query(sql, job_config=job_config):
+                    yield {
+                        'key': row.doc_key,
+                        'content': row.content,
+                        'metadata': json.loads(row.metadata) if isinstance(row.metadata, str) else row.metadata,
+                        'embedding': row.embedding,
+                        'watermark': row.watermark.isoformat() if row.watermark else None,
+                    }
+
+            added = self.add(rows())
+            span.set_attributes({'rows_added': added, 'index.rows': self.count})
+            if not self.ready:
+                # 빈 테이블이어도 검색 가능한 상태로
+                with self._write_lock:
+                    self._publish()
+            self._last_refresh = time.time()
+            return added
+
+    def maybe_refresh(self, bq_client: Any, table: str) -> None:
+        """갱신 주기가 지났으면 백그라운드에서 증분 갱신"""
+        if time.time() - self._last_refresh < INDEX_REFRESH_SECONDS or self._refreshing.locked():
+            return
+        # 동시에 들어온 요청이 중복 갱신을 띄우지 않도록 먼저 시각을 갱신
+        self._last_refresh = time.time()
+
+        def run():
+            try:
+                added = self.refresh(bq_client, table)
+                print(f"벡터 인덱스 갱신: +{added}행 (총 {self.count}행)")
+            except Exception as e:
+                print(f"벡터 인덱스 갱신 오류: {e}")
+
+        threading.Thread(target=run, name='vector-index-refresh', daemon=True).start()
+
+
+def source_columns(bq_client: Any, table: str) -> Tuple[Optional[str], Optional[str]]:
+    """테이블에 실제로 있는 (key 컬럼, watermark 식) — 메타데이터 조회만, 쿼리 잡 없음
+
+    업로더가 컬럼을 추가하기 전의 오래된 테이블이면 해당 값이 None이다
+    (key 없음 → 같은 키 대체/삭제 정리 불가, watermark 없음 → 매번 전체 재구축).
+    """
+    existing = {field.name for field in bq_client.get_table(table).schema}
+    key_column = INDEX_KEY_COLUMN if INDEX_KEY_COLUMN in existing else None
+    watermarks = [column for column in INDEX_WATERMARK_COLUMNS if column in existing]
+    if len(watermarks) > 1:
+        return key_column, f"COALESCE({', '.join(watermarks)})"
+    return key_column, watermarks[0] if watermarks else None
+
+
+def fetch_keys(bq_client: Any, table: str, key_column: str = INDEX_KEY_COLUMN) -> set:
+    """원본 테이블에 현재 남아 있는 key 집합 (key 컬럼만 읽음)"""
+    sql = f"SELECT DISTINCT {key_column} AS doc_key FROM `{table}`"
+    with _tracer.start_as_current_span('vector_index.fetch_keys') as span:
+        keys = {row.doc_key for row in bq_client.query(sql)}
+        span.set_attribute('keys', len(keys))
+    return keys
+
+
+def open_index(directory: Path = INDEX_DIR) -> VectorIndex:
+    """디스크 인덱스가 있으면 로드, 없으면 빈 인덱스 (첫 갱신 때 구축)"""
+    index = VectorIndex(directory)
+    try:
+        if not index.load():
+            index.reset()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"벡터 인덱스 로드 실패, 재구축: {e}")
+        index.reset()
+    return index
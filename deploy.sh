@@ -30,9 +30,12 @@ fi
 # GCP 프로젝트 설정
 PROJECT_ID=${GCP_PROJECT_ID:-"phsysics"}
 REGION=${GCP_REGION:-"us-central1"}
+# 업로더(scripts/upload_to_vertex.py)와 검색 함수가 같은 테이블을 써야 세대 라벨이 맞는다
+KNOWLEDGE_TABLE=${KNOWLEDGE_TABLE:-"$PROJECT_ID.knowledge_base.embeddings"}
 
 echo -e "${YELLOW}📍 프로젝트: $PROJECT_ID${NC}"
 echo -e "${YELLOW}📍 리전: $REGION${NC}"
+echo -e "${YELLOW}📍 지식 테이블: $KNOWLEDGE_TABLE${NC}"
 echo ""
 
 # 1. Debate Function 배포
@@ -50,9 +53,17 @@ gcloud functions deploy multi-ai-debate \
   --entry-point=debate \
   --trigger-http \
   --allow-unauthenticated \
-  --set-env-vars ANTHROPIC_API_KEY=$ANTHROPIC_API_KEY,GEMINI_API_KEY=$GEMINI_API_KEY,MAX_ROUNDS=3,CONSENSUS_THRESHOLD=0.85 \
+  --set-env-vars ANTHROPIC_API_KEY=$ANTHROPIC_API_KEY,GEMINI_API_KEY=$GEMINI_API_KEY,PERPLEXITY_API_KEY=$PERPLEXITY_API_KEY,MAX_ROUNDS=3,CONSENSUS_THRESHOLD=0.85,EXPERT_THRESHOLD=0.70,TRACE_EXPORTER=console \
   --memory=512MB \
-  --timeout=300s
+  --timeout=300s \
+  --min-instances=1 \
+  --max-instances=1
+
+# 비동기 작업 저장소(jobs.py)는 인스턴스 로컬 SQLite이므로 단일 인스턴스로 고정하고,
+# 응답 후에도 백그라운드 워커가 실행되도록 CPU를 상시 할당
+gcloud run services update multi-ai-debate \
+  --region=$REGION \
+  --no-cpu-throttling
 
 DEBATE_URL=$(gcloud functions describe multi-ai-debate --region=$REGION --gen2 --format='value(serviceConfig.uri)')
 echo -e "${GREEN}✅ Debate Function 배포 완료!${NC}"
@@ -76,7 +87,7 @@ gcloud functions deploy multi-ai-search \
   --entry-point=search \
   --trigger-http \
   --allow-unauthenticated \
-  --set-env-vars GCP_PROJECT_ID=$PROJECT_ID,GCP_LOCATION=$REGION,SIMILARITY_THRESHOLD=0.7,MAX_RESULTS=5 \
+  --set-env-vars GCP_PROJECT_ID=$PROJECT_ID,GCP_LOCATION=$REGION,KNOWLEDGE_TABLE=$KNOWLEDGE_TABLE,SIMILARITY_THRESHOLD=0.7,MAX_RESULTS=5,TRACE_EXPORTER=console \
   --memory=512MB \
   --timeout=60s
 
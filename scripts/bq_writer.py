@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+BigQuery Writer
+Streams rows from a generator into a newline-delimited JSON file on local
+disk and hands the file to a sink. BigQueryLoadSink submits it as a single
+batch load job into a staging table and MERGEs it into the target (no
+streaming buffer, no 90-minute MERGE/DELETE lockout). LocalSink applies the
+same upsert semantics to NDJSON files so the pipeline runs offline.
+Both sinks keep a generation counter that the search function uses to
+invalidate its result cache whenever the table changes.
+"""
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import tracing
+
+KEY_FIELD = 'doc_id'
+SYNCED_AT_FIELD = 'synced_at'
+# Table label read by cloud-functions/search/result_cache.py
+GENERATION_LABEL = 'search_generation'
+
+_tracer = tracing.get_tracer(__name__)
+
+
+def _job_stats(job: Any) -> Dict[str, Any]:
+    """Span attributes from a finished BigQuery job"""
+    return {
+        'bigquery.job_id': getattr(job, 'job_id', None),
+        'bigquery.bytes_processed': getattr(job, 'total_bytes_processed', None),
+        'bigquery.bytes_billed': getattr(job, 'total_bytes_billed', None),
+        'bigquery.rows_affected': getattr(job, 'num_dml_affected_rows', None),
+    }
+
+
+def write_ndjson(rows: Iterable[Dict[str, Any]], directory: Optional[Path] = None) -> Tuple[Path, int]:
+    """Write rows one line at a time; memory use does not grow with the row count"""
+    fd, name = tempfile.mkstemp(prefix='bq_rows_', suffix='.ndjson', dir=directory)
+    count = 0
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, default=str))
+            f.write('\n')
+            count += 1
+    return Path(name), count
+
+
+class BigQueryLoadSink:
+    """Batch load job into <table>_staging, then MERGE on doc_id"""
+
+    def __init__(self, client: Any, table_id: str, schema: List[Any]):
+        from google.cloud import bigquery
+
+        self._bigquery = bigquery
+        self.client = client
+        self.table_id = table_id
+        self.staging_table_id = f'{table_id}_staging'
+        self.schema = schema
+
+    def _merge_sql(self) -> str:
+        columns = [field.name for field in self.schema if field.name != SYNCED_AT_FIELD]
+        updates = ',\n    '.join(f'{name} = S.{name}' for name in columns if name != KEY_FIELD)
+        return f"""
+MERGE `{self.table_id}` T
+USING `{self.staging_table_id}` S
+ON T.{KEY_FIELD} = S.{KEY_FIELD}
+WHEN MATCHED THEN UPDATE SET
+    {updates},
+    {SYNCED_AT_FIELD} = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED THEN INSERT
+    ({', '.join(columns)}, {SYNCED_AT_FIELD})
+VALUES
+    ({', '.join(f'S.{name}' for name in columns)}, CURRENT_TIMESTAMP())
+"""
+
+    def upsert(self, path: Path) -> None:
+        job_config = self._bigquery.LoadJobConfig(
+            schema=self.schema,
+            source_format=self._bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=self._bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        with _tracer.start_as_current_span('bigquery.load') as span, open(path, 'rb') as f:
+            job = self.client.load_table_from_file(f, self.staging_table_id, job_config=job_config)
+            job.result()
+            span.set_attributes({'bigquery.job_id': job.job_id, 'bigquery.rows_loaded': job.output_rows})
+        with _tracer.start_as_current_span('bigquery.merge') as span:
+            job = self.client.query(self._merge_sql())
+            job.result()
+            span.set_attributes(_job_stats(job))
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Every row in the target table (used to rebuild a lost sync manifest)"""
+        columns = ', '.join(field.name for field in self.schema)
+        with _tracer.start_as_current_span('bigquery.scan') as span:
+            job = self.client.query(f"SELECT {columns} FROM `{self.table_id}` WHERE {KEY_FIELD} IS NOT NULL")
+            result = job.result()
+            span.set_attributes(_job_stats(job))
+        for row in result:
+            yield dict(row.items())
+
+    def delete(self, doc_ids: List[str]) -> None:
+        job_config = self._bigquery.QueryJobConfig(query_parameters=[
+            self._bigquery.ArrayQueryParameter('doc_ids', 'STRING', doc_ids)
+        ])
+        with _tracer.start_as_current_span('bigquery.delete', {'doc_ids': len(doc_ids)}) as span:
+            job = self.client.query(
+                f"DELETE FROM `{self.table_id}` WHERE {KEY_FIELD} IN UNNEST(@doc_ids)",
+                job_config=job_config
+            )
+            job.result()
+            span.set_attributes(_job_stats(job))
+
+    def bump_generation(self) -> int:
+        """Increment the table's generation label (metadata update, no query job)"""
+        table = self.client.get_table(self.table_id)
+        labels = dict(table.labels or {})
+        generation = int(labels.get(GENERATION_LABEL, 0)) + 1
+        labels[GENERATION_LABEL] = str(generation)
+        table.labels = labels
+        # The fetched etag makes a concurrent bump fail instead of being lost
+        self.client.update_table(table, ['labels'])
+        return generation
+
+
+class LocalSink:
+    """Offline stand-in: the table is an NDJSON file, upserts rewrite it in a single pass"""
+
+    def __init__(self, directory: Path, table: str = 'embeddings'):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.table_path = self.directory / f'{table}.ndjson'
+        self.generation_path = self.directory / f'{table}.generation'
+        self.loads = 0
+
+    def _rewrite(self, replace: Dict[str, str], drop: set) -> None:
+        tmp_path = self.table_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            if self.table_path.exists():
+                with open(self.table_path, encoding='utf-8') as current:
+                    for line in current:
+                        doc_id = json.loads(line)[KEY_FIELD]
+                        if doc_id in drop:
+                            continue
+                        out.write(replace.pop(doc_id, line))
+            # Whatever was not matched is a new row
+            out.writelines(replace.values())
+        os.replace(tmp_path, self.table_path)
+
+    def upsert(self, path: Path) -> None:
+        # Only the diff (staging rows) is held in memory, never the whole table
+        staged: Dict[str, str] = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                row[SYNCED_AT_FIELD] = 'local'
+                staged[row[KEY_FIELD]] = json.dumps(row, ensure_ascii=False) + '\n'
+        self._rewrite(staged, set())
+        self.loads += 1
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        if not self.table_path.exists():
+            return
+        with open(self.table_path, encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def delete(self, doc_ids: List[str]) -> None:
+        self._rewrite({}, set(doc_ids))
+
+    def bump_generation(self) -> int:
+        generation = int(self.generation_path.read_text()) + 1 if self.generation_path.exists() else 1
+        self.generation_path.write_text(str(generation))
+        return generation
+
+    def export(self, destination: Path) -> None:
+        shutil.copyfile(self.table_path, destination)
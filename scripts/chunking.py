@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Chunking
+Splits source documents into overlapping, round- and section-aware chunks.
+Each chunk becomes its own embedding row that points back to its parent doc_id.
+"""
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+DEFAULT_MAX_CHARS = 2000
+DEFAULT_OVERLAP_CHARS = 200
+
+_HEADING = re.compile(r'^#{1,6}\s+(.*)$')
+_SENTENCE_END = re.compile(r'(?<=[.!?。])\s+|\n')
+
+
+def debate_sections(debate: Dict[str, Any], title: str, summary: str) -> List[Tuple[str, str]]:
+    """Summary first, then one section per debate round (all speakers of that round)"""
+    sections = [('summary', summary)]
+    rounds: Dict[Any, List[str]] = {}
+    for turn in debate.get('history', []):
+        response = turn.get('response') or ''
+        if not response:
+            continue
+        rounds.setdefault(turn.get('round', 0), []).append(f"{turn.get('ai', 'Unknown')}:\n{response}")
+
+    for round_num, turns in rounds.items():
+        sections.append((f"round {round_num}", f"주제: {title} (Round {round_num})\n\n" + '\n\n'.join(turns)))
+    return sections
+
+
+def markdown_sections(text: str) -> List[Tuple[str, str]]:
+    """Split markdown at headings; each section keeps its heading line"""
+    sections: List[Tuple[str, str]] = []
+    heading, lines = 'preamble', []
+    for line in text.splitlines():
+        match = _HEADING.match(line)
+        if match and lines:
+            sections.append((heading, '\n'.join(lines).strip()))
+            lines = []
+        if match:
+            heading = match.group(1).strip()
+        lines.append(line)
+    if lines:
+        sections.append((heading, '\n'.join(lines).strip()))
+    return [(label, body) for label, body in sections if body]
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Split a single oversized paragraph at sentence boundaries, then hard-wrap"""
+    pieces, current = [], ''
+    for sentence in filter(None, _SENTENCE_END.split(text)):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ''
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _overlap_tail(text: str, overlap_chars: int) -> str:
+    if overlap_chars <= 0:
+        return ''
+    if len(text) <= overlap_chars:
+        return text
+    tail = text[-overlap_chars:]
+    # Start the overlap at a word boundary
+    space = tail.find(' ')
+    return tail[space + 1:] if 0 <= space < len(tail) // 2 else tail
+
+
+def chunk_text(text: str, max_chars: int = DEFAULT_MAX_CHARS,
+               overlap_chars: int = DEFAULT_OVERLAP_CHARS) -> List[str]:
+    """Paragraph-packed chunks of at most ~max_chars, each prefixed by the previous chunk's tail"""
+    paragraphs: List[str] = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if paragraph:
+            paragraphs.extend(_split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph])
+
+    chunks, current = [], ''
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            tail = _overlap_tail(current, overlap_chars)
+            current = f"{tail}\n\n{paragraph}" if tail else paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_document(doc: Dict[str, Any], max_chars: int = DEFAULT_MAX_CHARS,
+                   overlap_chars: int = DEFAULT_OVERLAP_CHARS) -> Iterator[Dict[str, Any]]:
+    """Yield chunk rows for one source document.
+
+    The document supplies `sections` as (label, text) pairs; chunks never
+    span two sections, so a hit always maps to one round or one heading.
+    """
+    parent_id = doc['doc_id']
+    index = 0
+    for label, text in doc.get('sections') or [('body', doc['content'])]:
+        for piece in chunk_text(text, max_chars, overlap_chars):
+            yield {
+                'doc_id': f"{parent_id}#{index:03d}",
+                'parent_doc_id': parent_id,
+                'chunk_index': index,
+                'doc_type': doc['doc_type'],
+                'title': doc['title'],
+                'content': piece,
+                'metadata': {**doc['metadata'], 'parent_doc_id': parent_id, 'chunk_index': index, 'section': label},
+                'created_at': doc['created_at'],
+            }
+            index += 1
+
+
+def chunk_documents(docs: Iterable[Dict[str, Any]], max_chars: int = DEFAULT_MAX_CHARS,
+                    overlap_chars: int = DEFAULT_OVERLAP_CHARS) -> Iterator[Dict[str, Any]]:
+    """Lazily chunk a stream of documents"""
+    for doc in docs:
+        yield from chunk_document(doc, max_chars, overlap_chars)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Debate Archive
+Append-only compact store for docs/brain debate records.
+
+Each record is split into two zlib-compressed JSON blocks appended to a
+segment file: a small summary (topic, scores, final positions, judgment)
+and the bulky history array. A one-line-per-record index (index.jsonl)
+holds topic, timestamp, consensus_score, status and the block offsets, so
+listing and filtering read only the index and transcripts are decompressed
+on first access.
+
+Usage:
+    python scripts/debate_archive.py convert                 # import docs/brain/debate_*.json
+    python scripts/debate_archive.py convert --prune --new-segment   # CI: archive, drop sources, new segment
+    python scripts/debate_archive.py list --status adopted --min-consensus 0.8
+    python scripts/debate_archive.py latest --field consensus_score
+    python scripts/debate_archive.py latest --export /tmp/latest.json
+    python scripts/debate_archive.py show debate_20260117_213709 --history
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BRAIN_DIR = Path(__file__).parent.parent / 'docs' / 'brain'
+ARCHIVE_DIR = Path(os.getenv('DEBATE_ARCHIVE_DIR', str(BRAIN_DIR / 'archive')))
+# Start a new segment once the current one passes this size
+SEGMENT_MAX_BYTES = int(os.getenv('DEBATE_SEGMENT_MAX_BYTES', str(8 * 2 ** 20)))
+
+INDEX_FILE = 'index.jsonl'
+SEGMENT_MAGIC = b'DEBSEG1\n'
+# Index columns copied from the record (everything else lives in the segment)
+INDEX_FIELDS = ('topic', 'timestamp', 'consensus_score', 'status')
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class DebateRecord(Mapping):
+    """Read-only debate dict whose `history` is loaded on first access"""
+
+    def __init__(self, archive: 'DebateArchive', entry: Dict[str, Any]):
+        self._archive = archive
+        self.entry = entry
+        self._summary: Optional[Dict[str, Any]] = None
+        self._history: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def id(self) -> str:
+        return self.entry['id']
+
+    @property
+    def summary(self) -> Dict[str, Any]:
+        if self._summary is None:
+            self._summary = self._archive._read_block(self.entry, 'summary')
+        return self._summary
+
+    @property
+    def history(self) -> List[Dict[str, Any]]:
+        if self._history is None:
+            self._history = self._archive._read_block(self.entry, 'history') if self.entry.get('history') else []
+        return self._history
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'history' and 'history' in self.summary:
+            return self.history
+        return self.summary[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.summary)
+
+    def __len__(self) -> int:
+        return len(self.summary)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The original JSON document (same keys, same order)"""
+        return {key: self[key] for key in self.summary}
+
+
+class DebateArchive:
+    """Segments + index under one directory; a single writer at a time"""
+
+    def __init__(self, directory: Path = ARCHIVE_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 reuse_segments: bool = True):
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        # False: never append to a segment written before this instance, so segments
+        # already committed to git stay byte-identical and each run adds new files only
+        self.reuse_segments = reuse_segments
+        self._written: set = set()
+        self.index_path = self.directory / INDEX_FILE
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._index_stat: Optional[Tuple[float, int]] = None
+
+    # ---- index ----
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """id -> latest entry (reloaded only when index.jsonl changes)"""
+        try:
+            stat = self.index_path.stat()
+        except FileNotFoundError:
+            self._entries, self._index_stat = {}, None
+            return self._entries
+        if self._entries is not None and self._index_stat == (stat.st_mtime, stat.st_size):
+            return self._entries
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A write interrupted mid-line; the record behind it is ignored
+                    continue
+                # Later lines supersede earlier ones for the same id
+                entries[entry['id']] = entry
+        self._entries, self._index_stat = entries, (stat.st_mtime, stat.st_size)
+        return entries
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Index entries, oldest first by timestamp"""
+        return sorted(self._load_index().values(), key=lambda entry: (entry.get('timestamp') or '', entry['id']))
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def find(self, status: Optional[str] = None, min_consensus: Optional[float] = None,
+             max_consensus: Optional[float] = None, since: Optional[str] = None,
+             until: Optional[str] = None, topic: Optional[str] = None,
+             newest_first: bool = True, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Filter index entries without touching the segments"""
+        needle = topic.casefold() if topic else None
+        matched = []
+        for entry in self.entries():
+            score = entry.get('consensus_score') or 0
+            timestamp = entry.get('timestamp') or ''
+            if status and entry.get('status') != status:
+                continue
+            if min_consensus is not None and score < min_consensus:
+                continue
+            if max_consensus is not None and score > max_consensus:
+                continue
+            if since and timestamp < since:
+                continue
+            if until and timestamp > until:
+                continue
+            if needle and needle not in (entry.get('topic') or '').casefold():
+                continue
+            matched.append(entry)
+        if newest_first:
+            matched.reverse()
+        return matched[:limit] if limit is not None else matched
+
+    def latest(self) -> Optional[DebateRecord]:
+        entries = self.entries()
+        return DebateRecord(self, entries[-1]) if entries else None
+
+    def get(self, record_id: str) -> Optional[DebateRecord]:
+        entry = self._load_index().get(record_id)
+        return DebateRecord(self, entry) if entry is not None else None
+
+    def __iter__(self) -> Iterator[DebateRecord]:
+        for entry in self.entries():
+            yield DebateRecord(self, entry)
+
+    # ---- segments ----
+
+    def _read_block(self, entry: Dict[str, Any], block: str) -> Any:
+        offset, length, crc = entry[block]
+        with open(self.directory / entry['segment'], 'rb') as f:
+            f.seek(offset)
+            blob = f.read(length)
+        if len(blob) != length or zlib.crc32(blob) != crc:
+            raise ValueError(f"Corrupt {block} block for {entry['id']} in {entry['segment']}")
+        return _unpack(blob)
+
+    def _segment_for_append(self) -> Path:
+        segments = sorted(self.directory.glob('segment-*.seg'))
+        if (segments and segments[-1].stat().st_size < self.segment_max_bytes
+                and (self.reuse_segments or segments[-1].name in self._written)):
+            return segments[-1]
+        number = int(segments[-1].stem.split('-')[1]) + 1 if segments else 1
+        path = self.directory / f'segment-{number:05d}.seg'
+        path.write_bytes(SEGMENT_MAGIC)
+        self._written.add(path.name)
+        return path
+
+    def append(self, record_id: str, debate: Dict[str, Any], source_sha: Optional[str] = None) -> Dict[str, Any]:
+        """Append a debate; the index line is written last, so a crash leaves no dangling entry"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        history = debate.get('history')
+        # Keep the key position of history so to_dict() reproduces the document
+        summary = {key: (None if key == 'history' else value) for key, value in debate.items()}
+        blocks = [('summary', _pack(summary))]
+        if history is not None:
+            blocks.append(('history', _pack(history)))
+
+        segment = self._segment_for_append()
+        entry: Dict[str, Any] = {'id': record_id}
+        entry.update({field: debate.get(field) for field in INDEX_FIELDS})
+        entry['rounds'] = debate.get('total_rounds', debate.get('rounds'))
+        entry['turns'] = len(history) if isinstance(history, list) else 0
+        entry['segment'] = segment.name
+        with open(segment, 'ab') as f:
+            for name, blob in blocks:
+                entry[name] = [f.tell(), len(blob), zlib.crc32(blob)]
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        if source_sha:
+            entry['source_sha'] = source_sha
+
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        if self._entries is not None:
+            self._entries[record_id] = entry
+            stat = self.index_path.stat()
+            self._index_stat = (stat.st_mtime, stat.st_size)
+        return entry
+
+    # ---- conversion ----
+
+    def convert(self, source_dir: Path = BRAIN_DIR, prune: bool = False) -> Dict[str, int]:
+        """Import debate_*.json files; unchanged files already archived are skipped"""
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'pruned': 0}
+        for path in sorted(Path(source_dir).glob('debate_*.json')):
+            raw = path.read_bytes()
+            sha = hashlib.sha256(raw).hexdigest()
+            existing = self._load_index().get(path.stem)
+            if existing is not None and existing.get('source_sha') == sha:
+                counts['unchanged'] += 1
+            else:
+                try:
+                    debate = json.loads(raw)
+                except json.JSONDecodeError as e:
+                    print(f"⚠ Skip {path.name}: {e}")
+                    counts['failed'] += 1
+                    continue
+                self.append(path.stem, debate, source_sha=sha)
+                counts['updated' if existing is not None else 'added'] += 1
+
+            # Only drop a source once its archived copy reads back identically
+            if prune and self.get(path.stem).to_dict() == json.loads(raw):
+                path.unlink()
+                counts['pruned'] += 1
+        return counts
+
+
+def iter_debates(source_dir: Path = BRAIN_DIR, archive: Optional[DebateArchive] = None
+                 ) -> Iterator[Tuple[str, Mapping]]:
+    """(id, debate) for every debate: archived records plus loose JSON files not archived yet
+
+    A loose file whose content changed since it was archived wins over the archived copy.
+    """
+    archive = archive if archive is not None else DebateArchive()
+    loose = {path.stem: path for path in Path(source_dir).glob('debate_*.json')}
+    for record in archive:
+        path = loose.get(record.id)
+        if path is not None and record.entry.get('source_sha') != hashlib.sha256(path.read_bytes()).hexdigest():
+            continue
+        loose.pop(record.id, None)
+        yield record.id, record
+    for record_id, path in sorted(loose.items()):
+        try:
+            with open(path, encoding='utf-8') as f:
+                debate = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠ Skip {path.name}: {e}")
+            continue
+        yield record_id, debate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append-only archive of docs/brain debates')
+    parser.add_argument('--archive', type=Path, default=ARCHIVE_DIR, help='Archive directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help='Import debate_*.json files into the archive')
+    convert.add_argument('--source', type=Path, default=BRAIN_DIR)
+    convert.add_argument('--prune', action='store_true',
+                         help='Delete source files after verifying the archived copy')
+    convert.add_argument('--new-segment', action='store_true',
+                         help='Write to a new segment instead of growing the last one (keeps committed segments immutable)')
+
+    listing = commands.add_parser('list', help='List debates from the index')
+    listing.add_argument('--status')
+    listing.add_argument('--min-consensus', type=float)
+    listing.add_argument('--max-consensus', type=float)
+    listing.add_argument('--since', help='ISO timestamp (inclusive)')
+    listing.add_argument('--until', help='ISO timestamp (inclusive)')
+    listing.add_argument('--topic', help='Case-insensitive substring')
+    listing.add_argument('--limit', type=int)
+    listing.add_argument('--json', action='store_true', help='Print index entries as JSON lines')
+
+    latest = commands.add_parser('latest', help='Newest debate by timestamp')
+    latest.add_argument('--field', help='Print a single summary field')
+    latest.add_argument('--export', type=Path, help='Write the full debate JSON to this path')
+
+    show = commands.add_parser('show', help='Print one debate')
+    show.add_argument('id')
+    show.add_argument('--history', action='store_true', help='Include the full history')
+
+    args = parser.parse_args()
+    archive = DebateArchive(args.archive, reuse_segments=not getattr(args, 'new_segment', False))
+
+    if args.command == 'convert':
+        counts = archive.convert(args.source, prune=args.prune)
+        print(f"✅ Archive {args.archive}: {len(archive)} debates "
+              f"(+{counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+              f"{counts['failed']} failed, {counts['pruned']} pruned)")
+
+    elif args.command == 'list':
+        entries = archive.find(status=args.status, min_consensus=args.min_consensus,
+                               max_consensus=args.max_consensus, since=args.since, until=args.until,
+                               topic=args.topic, limit=args.limit)
+        for entry in entries:
+            if args.json:
+                print(json.dumps(entry, ensure_ascii=False))
+            else:
+                print(f"{entry['id']}  {entry.get('timestamp') or '-':<26}  "
+                      f"{entry.get('consensus_score') or 0:5.2f}  {entry.get('status') or '-':<16}  {entry.get('topic')}")
+
+    elif args.command == 'latest':
+        record = archive.latest()
+        if record is None:
+            print("❌ Archive is empty", file=sys.stderr)
+            sys.exit(1)
+        if args.export:
+            args.export.write_text(json.dumps(record.to_dict(), ensure_ascii=False, indent=2), encoding='utf-8')
+        if args.field:
+            print(record[args.field])
+        elif not args.export:
+            print(record.id)
+
+    elif args.command == 'show':
+        record = archive.get(args.id)
+        if record is None:
+            print(f"❌ No debate {args.id}", file=sys.stderr)
+            sys.exit(1)
+        document = record.to_dict() if args.history else {**record.summary, 'history': f"<{record.entry['turns']} turns>"}
+        print(json.dumps(document, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
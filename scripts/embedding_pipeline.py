@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Embedding Pipeline
+Concurrent, rate-limited embedding stage for the uploader.
+Batches are sized by config, sent through a bounded worker pool behind a
+token-bucket limiter, retried with jittered backoff on transient errors and
+split in half when the API rejects a batch for being too large.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import tracing
+
+# Error classes (google.api_core.exceptions) worth retrying as-is
+TRANSIENT_ERRORS = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+    'InternalServerError', 'DeadlineExceeded', 'Aborted', 'GatewayTimeout',
+}
+# Messages that mean "this request was too big", fixed by splitting the batch
+SIZE_LIMIT_HINTS = ('too many', 'exceed', 'token', 'too long', 'limit', 'payload size')
+
+# The model truncates longer inputs, so never bill more than this per text
+MAX_INPUT_TOKENS = 3072
+
+_tracer = tracing.get_tracer(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (Korean runs close to one token per 1-2 characters)"""
+    return min(MAX_INPUT_TOKENS, len(text) // 2 + 1)
+
+
+def is_transient(error: Exception) -> bool:
+    message = str(error).lower()
+    return (type(error).__name__ in TRANSIENT_ERRORS
+            or '429' in message or 'quota' in message or 'unavailable' in message)
+
+
+def is_size_limit(error: Exception) -> bool:
+    if type(error).__name__ not in ('InvalidArgument', 'BadRequest', 'ValueError'):
+        return False
+    message = str(error).lower()
+    return any(hint in message for hint in SIZE_LIMIT_HINTS)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> None:
+        """Block until `amount` tokens are available"""
+        if self.rate <= 0:
+            return
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingPipeline:
+    """Bounded-concurrency embedding stage driven by config/vertex_config.yaml"""
+
+    def __init__(self, model: Any, batch_size: int = 5, max_workers: int = 4,
+                 requests_per_minute: float = 600, tokens_per_minute: float = 0,
+                 max_tokens_per_request: int = 20000, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep, model_name: str = ''):
+        self.model = model
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.stats = {'requests': 0, 'retries': 0, 'splits': 0, 'failed_texts': 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, model: Any, config: Dict[str, Any], model_name: str = '') -> 'EmbeddingPipeline':
+        """Build from the `embedding:` block of vertex_config.yaml"""
+        return cls(
+            model,
+            model_name=model_name,
+            batch_size=config.get('batch_size', 5),
+            max_workers=config.get('max_workers', 4),
+            requests_per_minute=config.get('requests_per_minute', 600),
+            tokens_per_minute=config.get('tokens_per_minute', 0),
+            max_tokens_per_request=config.get('max_tokens_per_request', 20000),
+            max_retries=config.get('max_retries', 5),
+            backoff_base=config.get('backoff_base', 1.0),
+            backoff_max=config.get('backoff_max', 60.0),
+        )
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _batches(self, items: Iterable[Tuple[Any, str]]) -> Iterator[List[Tuple[Any, str]]]:
+        """Group items by batch_size and per-request token budget"""
+        batch: List[Tuple[Any, str]] = []
+        tokens = 0
+        for item in items:
+            item_tokens = estimate_tokens(item[1])
+            if batch and (len(batch) >= self.batch_size or tokens + item_tokens > self.max_tokens_per_request):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            yield batch
+
+    def _embed_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed one batch: retry transient errors, split on size limits"""
+        tokens = sum(estimate_tokens(text) for text in texts)
+        with _tracer.start_as_current_span('embedding', {
+            tracing.MODEL: self.model_name, tracing.INPUT_TOKENS: tokens, 'texts': len(texts),
+        }) as span:
+            return self._embed_attempts(texts, tokens, span)
+
+    def _embed_attempts(self, texts: List[str], tokens: int, span: tracing.Span) -> List[Optional[List[float]]]:
+        """Retry loop of _embed_batch; retries and failures are recorded on span"""
+        for attempt in range(self.max_retries + 1):
+            self._requests.acquire(1)
+            self._tokens.acquire(tokens)
+            self._count('requests')
+            try:
+                return [embedding.values for embedding in self.model.get_embeddings(texts)]
+            except Exception as e:
+                if is_size_limit(e) and len(texts) > 1:
+                    self._count('splits')
+                    # The halves get their own spans; this one no longer bills its tokens
+                    span.set_attributes({'split': True, tracing.INPUT_TOKENS: 0})
+                    middle = len(texts) // 2
+                    # Shrink later batches so they do not hit the same limit again
+                    with self._stats_lock:
+                        self.batch_size = max(1, min(self.batch_size, middle))
+                    return self._embed_batch(texts[:middle]) + self._embed_batch(texts[middle:])
+                if not is_transient(e) or attempt == self.max_retries:
+                    print(f"  ⚠ Embedding batch of {len(texts)} failed: {e}")
+                    span.record_exception(e)
+                    self._count('failed_texts', len(texts))
+                    return [None] * len(texts)
+
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                self._count('retries')
+                span.increment('retries')
+                self._sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+        return [None] * len(texts)
+
+    def embed(self, items: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, Optional[List[float]]]]:
+        """Embed (key, text) pairs; yields (key, embedding or None) in input order.
+
+        Input is consumed lazily and at most 2 * max_workers batches are in
+        flight, so arbitrarily long streams do not pile up in memory.
+        """
+        window: Deque[Tuple[List[Tuple[Any, str]], Future]] = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='embed') as executor:
+            for batch in self._batches(items):
+                window.append((batch, executor.submit(tracing.bind(self._embed_batch), [text for _, text in batch])))
+                if len(window) >= 2 * self.max_workers:
+                    yield from self._drain(window.popleft())
+            while window:
+                yield from self._drain(window.popleft())
+
+    @staticmethod
+    def _drain(entry: Tuple[List[Tuple[Any, str]], Future]) -> Iterator[Tuple[Any, Optional[List[float]]]]:
+        batch, future = entry
+        for (key, _), embedding in zip(batch, future.result()):
+            yield key, embedding
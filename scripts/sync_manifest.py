@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Sync Manifest
+Local record of what has already been embedded and upserted to BigQuery:
+doc_id -> content hash, row hash and packed float32 embedding.
+"""
+import base64
+import hashlib
+import json
+import os
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+# Fields that describe a row in BigQuery; created_at is excluded because the
+# markdown sources are stamped with the extraction time on every run
+ROW_FIELDS = ('doc_type', 'title', 'content', 'metadata', 'parent_doc_id', 'chunk_index')
+
+
+def content_hash(doc: Dict[str, Any]) -> str:
+    """Hash of the text that gets embedded"""
+    return hashlib.sha256(doc['content'].encode('utf-8')).hexdigest()
+
+
+def row_hash(doc: Dict[str, Any]) -> str:
+    """Hash of everything that ends up in the BigQuery row"""
+    payload = json.dumps({field: doc.get(field) for field in ROW_FIELDS},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pack_embedding(values: List[float]) -> str:
+    return base64.b64encode(array('f', values).tobytes()).decode('ascii')
+
+
+def unpack_embedding(packed: str) -> List[float]:
+    vector = array('f')
+    vector.frombytes(base64.b64decode(packed))
+    return vector.tolist()
+
+
+class SyncManifest:
+    """doc_id -> {content_hash, row_hash, embedding, synced_at}"""
+
+    def __init__(self, path: Path, model: str):
+        self.path = Path(path)
+        self.model = model
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.seen: Set[str] = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: Path, model: str) -> 'SyncManifest':
+        manifest = cls(path, model)
+        if manifest.path.exists():
+            data = json.loads(manifest.path.read_text())
+            # Embeddings from a different model cannot be reused
+            if data.get('model') == model:
+                manifest.entries = data.get('docs', {})
+            else:
+                print(f"⚠ Manifest model {data.get('model')} != {model}, re-embedding everything")
+        return manifest
+
+    @classmethod
+    def rebuild(cls, path: Path, model: str, rows: Iterable[Dict[str, Any]]) -> 'SyncManifest':
+        """Recreate a lost manifest from the rows already in the table.
+
+        Only this uploader writes the table, so its embeddings are taken to come
+        from ``model``. Rows without a doc_id (written before the key column
+        existed) are left out and get replaced on the next upsert.
+        """
+        manifest = cls(path, model)
+        for row in rows:
+            if not row.get('doc_id') or not row.get('embedding'):
+                continue
+            manifest.entries[row['doc_id']] = {
+                'content_hash': content_hash(row),
+                'row_hash': row_hash(row),
+                'embedding': pack_embedding(row['embedding']),
+                'synced_at': str(row.get('synced_at')),
+            }
+        return manifest
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_text(json.dumps({'model': self.model, 'docs': self.entries}))
+        os.replace(tmp_path, self.path)
+
+    def diff(self, docs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield docs that need an upsert, remembering every doc_id seen.
+
+        Docs whose text is unchanged get their cached embedding attached, so
+        only new or edited content is sent to the embedding model.
+        """
+        self.seen = set()
+        for doc in docs:
+            self.seen.add(doc['doc_id'])
+            entry = self.entries.get(doc['doc_id'])
+            doc['_content_hash'] = content_hash(doc)
+            doc['_row_hash'] = row_hash(doc)
+
+            if entry and entry['row_hash'] == doc['_row_hash']:
+                continue
+            if entry and entry['content_hash'] == doc['_content_hash']:
+                doc['embedding'] = unpack_embedding(entry['embedding'])
+            yield doc
+
+    def removed(self) -> List[str]:
+        """doc_ids in the manifest that the last diff() did not see"""
+        return [doc_id for doc_id in self.entries if doc_id not in self.seen]
+
+    def stage(self, doc: Dict[str, Any], synced_at: Optional[str] = None) -> None:
+        """Remember a doc that is being uploaded; applied by commit()"""
+        self._pending[doc['doc_id']] = {
+            'content_hash': doc.get('_content_hash') or content_hash(doc),
+            'row_hash': doc.get('_row_hash') or row_hash(doc),
+            'embedding': pack_embedding(doc['embedding']),
+            'synced_at': synced_at or datetime.now().isoformat(),
+        }
+
+    def commit(self) -> None:
+        """The upload landed: staged docs become synced"""
+        self.entries.update(self._pending)
+        self._pending = {}
+
+    def discard(self) -> None:
+        """The upload failed: staged docs are retried next run"""
+        self._pending = {}
+
+    def forget(self, doc_ids: List[str]) -> None:
+        for doc_id in doc_ids:
+            self.entries.pop(doc_id, None)
@@ -3,17 +3,25 @@
 Upload Multi-AI Debate Results to Vertex AI
 Extracts debate results and decisions, creates embeddings, uploads to BigQuery
 """
-import json
+import argparse
 import os
 import sys
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import yaml
 import vertexai
 from vertexai.language_models import TextEmbeddingModel
 from google.cloud import bigquery
 from dotenv import load_dotenv
 
+from bq_writer import BigQueryLoadSink, LocalSink, write_ndjson
+from chunking import chunk_documents, debate_sections, markdown_sections
+from debate_archive import iter_debates
+from embedding_pipeline import EmbeddingPipeline
+from sync_manifest import SyncManifest
+import tracing
+
 # Load environment
 load_dotenv()
 GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'phsysics')
@@ -22,57 +30,114 @@ GCP_REGION = os.getenv('GCP_REGION', 'us-central1')
 # Initialize Vertex AI
 vertexai.init(project=GCP_PROJECT_ID, location=GCP_REGION)
 
-# BigQuery configuration
-DATASET_ID = 'multi_ai_knowledge'
-TABLE_ID = 'debate_embeddings'
-FULL_TABLE_ID = f'{GCP_PROJECT_ID}.{DATASET_ID}.{TABLE_ID}'
+CONFIG_PATH = Path(__file__).parent.parent / 'config' / 'vertex_config.yaml'
 
-class VertexAIUploader:
-    def __init__(self):
-        self.embedding_model = TextEmbeddingModel.from_pretrained('textembedding-gecko@003')
-        self.bq_client = bigquery.Client(project=GCP_PROJECT_ID)
-        self.ensure_dataset_exists()
 
-    def ensure_dataset_exists(self):
-        """Create dataset and table if not exists"""
-        try:
-            # Create dataset
-            dataset = bigquery.Dataset(f'{GCP_PROJECT_ID}.{DATASET_ID}')
-            dataset.location = GCP_REGION
-            self.bq_client.create_dataset(dataset, exists_ok=True)
-            print(f"✓ Dataset {DATASET_ID} ready")
-
-            # Create table schema
-            schema = [
-                bigquery.SchemaField("doc_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("doc_type", "STRING", mode="REQUIRED"),  # debate, decision, context
-                bigquery.SchemaField("title", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("content", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("embedding", "FLOAT64", mode="REPEATED"),
-                bigquery.SchemaField("metadata", "JSON", mode="NULLABLE"),
-                bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED"),
-            ]
-
-            table = bigquery.Table(FULL_TABLE_ID, schema=schema)
-            self.bq_client.create_table(table, exists_ok=True)
-            print(f"✓ Table {TABLE_ID} ready")
+def load_config() -> Dict[str, Any]:
+    """Load config/vertex_config.yaml (empty dict if missing)"""
+    if not CONFIG_PATH.exists():
+        return {}
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f) or {}
 
-        except Exception as e:
-            print(f"⚠ Dataset/Table setup warning: {e}")
 
-    def extract_debate_data(self) -> List[Dict[str, Any]]:
-        """Extract data from docs/brain/ debate JSONs"""
-        docs = []
+# BigQuery configuration (same KNOWLEDGE_TABLE the search function reads and watches)
+FULL_TABLE_ID = os.getenv('KNOWLEDGE_TABLE', f'{GCP_PROJECT_ID}.knowledge_base.embeddings')
+_, DATASET_ID, TABLE_ID = FULL_TABLE_ID.split('.')
+EMBEDDING_MODEL = 'textembedding-gecko@003'
+
+# Local record of synced content hashes and embeddings (not committed)
+MANIFEST_PATH = Path(os.getenv(
+    'VERTEX_MANIFEST_PATH',
+    str(Path(__file__).parent.parent / '.cache' / 'vertex_manifest.json')
+))
+
+_tracer = tracing.get_tracer(__name__)
+
+SCHEMA = [
+    bigquery.SchemaField("doc_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("doc_type", "STRING", mode="REQUIRED"),  # debate, decision, context
+    bigquery.SchemaField("title", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("content", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("embedding", "FLOAT64", mode="REPEATED"),
+    bigquery.SchemaField("metadata", "JSON", mode="NULLABLE"),
+    bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("synced_at", "TIMESTAMP", mode="NULLABLE"),  # set by MERGE
+    bigquery.SchemaField("parent_doc_id", "STRING", mode="NULLABLE"),  # source document of a chunk
+    bigquery.SchemaField("chunk_index", "INT64", mode="NULLABLE"),
+]
+
+# Legacy SQL names returned by the API for the standard SQL types used in SCHEMA
+_TYPE_ALIASES = {'FLOAT64': 'FLOAT', 'INT64': 'INTEGER', 'BOOL': 'BOOLEAN'}
+
+
+def _compatible(existing: Any, wanted: Any) -> bool:
+    """Same type and the same repeated-ness (REQUIRED vs NULLABLE does not matter for writes)"""
+    def kind(field):
+        return _TYPE_ALIASES.get(field.field_type, field.field_type), field.mode == 'REPEATED'
+    return kind(existing) == kind(wanted)
+
+
+def _appendable(field: Any) -> Any:
+    """Column definition that BigQuery accepts when appending to an existing table"""
+    if field.mode != 'REQUIRED':
+        return field
+    return bigquery.SchemaField(field.name, field.field_type, mode='NULLABLE')
+
+
+class VertexAIUploader:
+    def __init__(self, sink: Optional[Any] = None, embedding_model: Optional[Any] = None):
+        self.config = load_config()
+        self.embedding_model = embedding_model or TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+        self.pipeline = EmbeddingPipeline.from_config(self.embedding_model, self.config.get('embedding', {}),
+                                                      model_name=EMBEDDING_MODEL)
+
+        # A local sink (offline runs, benchmarks) needs no BigQuery client
+        if sink is None:
+            self.bq_client = bigquery.Client(project=GCP_PROJECT_ID)
+            self.ensure_dataset_exists()
+            sink = BigQueryLoadSink(self.bq_client, FULL_TABLE_ID, SCHEMA)
+        self.sink = sink
+
+    def ensure_dataset_exists(self):
+        """Create the dataset and table, or bring an existing table up to SCHEMA
+
+        BigQuery can only append NULLABLE/REPEATED columns to an existing table,
+        so REQUIRED fields are appended as NULLABLE (rows written before the
+        migration have no doc_id/synced_at). Columns whose type cannot be changed
+        in place raise instead of letting the MERGE fail later.
+        """
+        dataset = bigquery.Dataset(f'{GCP_PROJECT_ID}.{DATASET_ID}')
+        dataset.location = GCP_REGION
+        self.bq_client.create_dataset(dataset, exists_ok=True)
+        print(f"✓ Dataset {DATASET_ID} ready")
+
+        table = self.bq_client.create_table(bigquery.Table(FULL_TABLE_ID, schema=SCHEMA), exists_ok=True)
+        existing = {field.name: field for field in table.schema}
+        conflicts = [
+            f"{field.name} is {existing[field.name].field_type} {existing[field.name].mode}, "
+            f"expected {field.field_type} {field.mode}"
+            for field in SCHEMA
+            if field.name in existing and not _compatible(existing[field.name], field)
+        ]
+        if conflicts:
+            raise RuntimeError(f"Table {FULL_TABLE_ID} cannot be migrated in place: {'; '.join(conflicts)}")
+
+        missing = [field for field in SCHEMA if field.name not in existing]
+        if missing:
+            table.schema = list(table.schema) + [_appendable(field) for field in missing]
+            self.bq_client.update_table(table, ['schema'])
+            print(f"✓ Added columns: {', '.join(field.name for field in missing)}")
+        print(f"✓ Table {TABLE_ID} ready")
+
+    def extract_debate_data(self) -> Iterator[Dict[str, Any]]:
+        """Extract data from docs/brain/ debate JSONs (one file in memory at a time)"""
         debate_dir = Path(__file__).parent.parent / 'docs' / 'brain'
 
-        # Process debate JSON files
-        for json_file in debate_dir.glob('debate_*.json'):
+        # Process debates (archive segments plus JSON files not archived yet)
+        for doc_id, debate in iter_debates(debate_dir):
             try:
-                with open(json_file) as f:
-                    debate = json.load(f)
-
                 # Extract key information
-                doc_id = json_file.stem
                 title = debate.get('topic', 'Unknown topic')
 
                 # Combine all responses into searchable content
@@ -92,11 +157,12 @@ class VertexAIUploader:
 
                 content = '\n'.join(content_parts)
 
-                docs.append({
+                yield {
                     'doc_id': doc_id,
                     'doc_type': 'debate',
                     'title': title,
                     'content': content,
+                    'sections': debate_sections(debate, title, content),
                     'metadata': {
                         'status': debate.get('status', 'unknown'),
                         'consensus_score': debate.get('consensus_score', 0),
@@ -104,24 +170,25 @@ class VertexAIUploader:
                         'timestamp': debate.get('timestamp', '')
                     },
                     'created_at': debate.get('timestamp', datetime.now().isoformat())
-                })
+                }
 
             except Exception as e:
-                print(f"⚠ Skip {json_file.name}: {e}")
+                print(f"⚠ Skip {doc_id}: {e}")
 
         # Process DECISIONS.md
         decisions_file = debate_dir / 'DECISIONS.md'
         if decisions_file.exists():
             try:
                 content = decisions_file.read_text()
-                docs.append({
+                yield {
                     'doc_id': 'decisions_master',
                     'doc_type': 'decision',
                     'title': 'Multi-AI 결정 사항 모음',
                     'content': content,
+                    'sections': markdown_sections(content),
                     'metadata': {'source': 'DECISIONS.md'},
                     'created_at': datetime.now().isoformat()
-                })
+                }
             except Exception as e:
                 print(f"⚠ Skip DECISIONS.md: {e}")
 
@@ -130,93 +197,187 @@ class VertexAIUploader:
         if context_file.exists():
             try:
                 content = context_file.read_text()
-                docs.append({
+                yield {
                     'doc_id': 'context_master',
                     'doc_type': 'context',
                     'title': 'Multi-AI Orchestrator 컨텍스트',
                     'content': content,
+                    'sections': markdown_sections(content),
                     'metadata': {'source': 'CONTEXT.md'},
                     'created_at': datetime.now().isoformat()
-                })
+                }
             except Exception as e:
                 print(f"⚠ Skip CONTEXT.md: {e}")
 
-        return docs
-
-    def create_embeddings(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Create embeddings for documents"""
-        print(f"\n📊 Creating embeddings for {len(docs)} documents...")
+    def create_embeddings(self, docs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Stream docs through the embedding pipeline (concurrent, rate-limited).
+
+        Docs that already carry a reused embedding pass straight through;
+        docs whose embedding failed are dropped and retried on the next run.
+        """
+        print("\n📊 Creating embeddings...")
+        reused: List[Dict[str, Any]] = []
+        counts = {'embedded': 0, 'reused': 0, 'failed': 0}
+
+        def needs_embedding():
+            for doc in docs:
+                if 'embedding' in doc:
+                    reused.append(doc)
+                else:
+                    yield doc, doc['content']
+
+        for doc, embedding in self.pipeline.embed(needs_embedding()):
+            while reused:
+                counts['reused'] += 1
+                yield reused.pop()
+            if embedding is None:
+                counts['failed'] += 1
+                continue
+            doc['embedding'] = embedding
+            counts['embedded'] += 1
+            yield doc
 
-        # Batch process (max 5 at a time for API limits)
-        batch_size = 5
-        for i in range(0, len(docs), batch_size):
-            batch = docs[i:i+batch_size]
-            texts = [doc['content'][:10000] for doc in batch]  # Limit to 10K chars
+        counts['reused'] += len(reused)
+        yield from reused
 
-            try:
-                embeddings = self.embedding_model.get_embeddings(texts)
-                for doc, embedding in zip(batch, embeddings):
-                    doc['embedding'] = embedding.values
-                print(f"  ✓ Batch {i//batch_size + 1}/{(len(docs)-1)//batch_size + 1}")
-            except Exception as e:
-                print(f"  ⚠ Batch {i//batch_size + 1} failed: {e}")
+        stats = self.pipeline.stats
+        print(f"  ✓ Embedded {counts['embedded']}, reused {counts['reused']}, failed {counts['failed']} "
+              f"({stats['requests']} requests, {stats['retries']} retries, {stats['splits']} splits)")
 
-        return docs
+    def upload_to_bigquery(self, docs: Iterable[Dict[str, Any]],
+                           on_row: Optional[Any] = None) -> Optional[int]:
+        """Upsert documents with embeddings into BigQuery (MERGE on doc_id).
 
-    def upload_to_bigquery(self, docs: List[Dict[str, Any]]):
-        """Upload documents with embeddings to BigQuery"""
-        print(f"\n⬆️  Uploading {len(docs)} documents to BigQuery...")
+        Rows are streamed into a local NDJSON file and submitted as one batch
+        load job, so memory stays flat however large the diff is. Returns the
+        number of rows upserted, or None if the load failed.
+        """
+        print("\n⬆️  Upserting chunks to BigQuery...")
 
         # Prepare rows
-        rows = []
-        for doc in docs:
-            if 'embedding' not in doc:
-                continue
-
-            rows.append({
-                'doc_id': doc['doc_id'],
-                'doc_type': doc['doc_type'],
-                'title': doc['title'],
-                'content': doc['content'][:50000],  # BigQuery limit
-                'embedding': doc['embedding'],
-                'metadata': doc['metadata'],
-                'created_at': doc['created_at']
-            })
-
-        if not rows:
-            print("⚠ No rows to upload")
-            return
-
-        # Insert rows
+        def rows():
+            for doc in docs:
+                if 'embedding' not in doc:
+                    continue
+
+                yield {
+                    'doc_id': doc['doc_id'],
+                    'doc_type': doc['doc_type'],
+                    'title': doc['title'],
+                    'content': doc['content'][:50000],  # BigQuery limit
+                    'embedding': doc['embedding'],
+                    'metadata': doc['metadata'],
+                    'created_at': doc['created_at'],
+                    'parent_doc_id': doc.get('parent_doc_id'),
+                    'chunk_index': doc.get('chunk_index')
+                }
+                if on_row is not None:
+                    on_row(doc)
+
+        path, count = write_ndjson(rows())
         try:
-            errors = self.bq_client.insert_rows_json(FULL_TABLE_ID, rows)
-            if errors:
-                print(f"⚠ Insert errors: {errors}")
-            else:
-                print(f"✅ Uploaded {len(rows)} documents to BigQuery")
+            if not count:
+                print("⚠ No rows to upload")
+                return 0
+
+            # Load into a staging table, then MERGE so re-syncs update rows instead of appending
+            self.sink.upsert(path)
+            print(f"✅ Upserted {count} chunks to BigQuery")
+            self.bump_search_generation()
+            return count
         except Exception as e:
             print(f"❌ Upload failed: {e}")
+            return None
+        finally:
+            path.unlink(missing_ok=True)
 
-    def run(self):
-        """Run full pipeline"""
-        print("🚀 Starting Vertex AI upload pipeline...\n")
+    def bump_search_generation(self) -> None:
+        """Tell search instances the table changed (their cached results are dropped)"""
+        try:
+            generation = self.sink.bump_generation()
+            print(f"✓ Search cache generation → {generation}")
+        except Exception as e:
+            # Cached search results stay valid until SEARCH_CACHE_TTL expires
+            print(f"⚠ Search cache generation bump failed: {e}")
 
-        # Step 1: Extract data
-        print("📂 Extracting data from docs/brain/...")
-        docs = self.extract_debate_data()
-        print(f"✓ Found {len(docs)} documents")
+    def delete_from_bigquery(self, doc_ids: List[str]) -> bool:
+        """Delete rows whose source documents no longer exist"""
+        if not doc_ids:
+            return True
 
-        # Step 2: Create embeddings
-        docs = self.create_embeddings(docs)
+        try:
+            self.sink.delete(doc_ids)
+            print(f"🗑  Deleted {len(doc_ids)} removed chunks")
+            self.bump_search_generation()
+            return True
+        except Exception as e:
+            print(f"❌ Delete failed: {e}")
+            return False
+
+    def load_manifest(self, full: bool = False) -> SyncManifest:
+        """Sync manifest for this run, rebuilt from the table when the local file is missing"""
+        if full:
+            return SyncManifest(MANIFEST_PATH, EMBEDDING_MODEL)
+        if MANIFEST_PATH.exists():
+            return SyncManifest.load(MANIFEST_PATH, EMBEDDING_MODEL)
+
+        # .cache/ is not committed, so CI checkouts start without a manifest;
+        # rebuilding it avoids re-embedding every chunk and still finds deleted docs
+        try:
+            manifest = SyncManifest.rebuild(MANIFEST_PATH, EMBEDDING_MODEL, self.sink.rows())
+            print(f"✓ Rebuilt manifest from {TABLE_ID}: {len(manifest.entries)} chunks")
+            return manifest
+        except Exception as e:
+            print(f"⚠ Manifest rebuild failed, re-syncing everything: {e}")
+            return SyncManifest(MANIFEST_PATH, EMBEDDING_MODEL)
 
-        # Step 3: Upload to BigQuery
-        self.upload_to_bigquery(docs)
+    def run(self, full: bool = False):
+        """Run incremental pipeline (only new or changed chunks are embedded and upserted)"""
+        print("🚀 Starting Vertex AI upload pipeline...\n")
+
+        with _tracer.start_as_current_span('upload.run', {'full': full}) as span:
+            chunking = self.config.get('chunking', {})
+            manifest = self.load_manifest(full)
+
+            # Extract → chunk → diff → embed, streamed one document at a time
+            print("📂 Extracting data from docs/brain/...")
+            chunks = chunk_documents(
+                self.extract_debate_data(),
+                max_chars=chunking.get('max_chars', 2000),
+                overlap_chars=chunking.get('overlap_chars', 200),
+            )
+
+            # ... → NDJSON file → load job; the manifest only keeps what actually landed
+            upserted = self.upload_to_bigquery(self.create_embeddings(manifest.diff(chunks)), on_row=manifest.stage)
+            if upserted is None:
+                manifest.discard()
+                upserted = 0
+            else:
+                manifest.commit()
+
+            removed = manifest.removed()
+            print(f"✓ {len(manifest.seen)} chunks: {upserted} upserted, {len(removed)} removed")
+            if removed and self.delete_from_bigquery(removed):
+                manifest.forget(removed)
+            manifest.save()
 
         print(f"\n✅ Pipeline complete!")
         print(f"   Dataset: {DATASET_ID}")
         print(f"   Table: {TABLE_ID}")
-        print(f"   Total docs: {len(docs)}")
+        print(f"   Total chunks: {len(manifest.seen)}")
+        print(f"   Upserted: {upserted}")
+
+        timing = tracing.breakdown(span.trace)
+        stages = ', '.join(f"{name} {stage['seconds']:.1f}s" for name, stage in timing['stages'].items()
+                           if name != 'upload.run')
+        print(f"   Time: {timing['total_s']:.1f}s ({stages})")
+        print(f"   Embedding tokens: {timing['tokens']['input']} (~${timing['cost_usd']:.4f})")
 
 if __name__ == "__main__":
-    uploader = VertexAIUploader()
-    uploader.run()
+    parser = argparse.ArgumentParser(description='Sync docs/brain to Vertex AI / BigQuery')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and re-sync everything')
+    parser.add_argument('--local-sink', type=Path, help='Write to NDJSON files in this directory instead of BigQuery')
+    args = parser.parse_args()
+
+    uploader = VertexAIUploader(sink=LocalSink(args.local_sink, TABLE_ID) if args.local_sink else None)
+    uploader.run(full=args.full)
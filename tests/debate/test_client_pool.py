@@ -0,0 +1,43 @@
+"""clients: 지연 생성 풀과 풀을 인자로 받는 팩토리"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import clients
+from clients import ClientPool
+
+
+def test_get_builds_each_client_once_under_concurrency():
+    pool = ClientPool()
+    built = []
+
+    def factory():
+        time.sleep(0.01)
+        built.append(1)
+        return object()
+
+    pool.register('slow', factory)
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(pool.get('slow'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert len({id(client) for client in seen}) == 1
+    with pytest.raises(KeyError):
+        pool.get('missing')
+
+
+def test_factories_initialize_vertex_on_the_pool_they_are_given(monkeypatch):
+    monkeypatch.setattr(clients, 'generative_models', SimpleNamespace(GenerativeModel=lambda name: ('model', name)))
+    pool = ClientPool()
+    inits = []
+    pool.register('vertexai', lambda: inits.append(1) or True)
+
+    assert clients._create_gemini(pool) == ('model', clients.GEMINI_MODEL)
+    assert clients._create_gemini_fallback(pool) == ('model', clients.GEMINI_FALLBACK_MODEL)
+    assert inits == [1]
@@ -0,0 +1,53 @@
+"""consensus: 한국어 키워드 추출과 임베딩/키워드 가중 합의도 행렬"""
+import pytest
+
+from consensus import ConsensusScorer, tokenize
+
+
+def test_tokenize_strips_particles_and_stopwords():
+    assert tokenize('규제는 혁신을 막습니다. 그리고 규제에서 AI safety!') == ['규제', '혁신', 'ai', 'safety']
+
+
+def test_keyword_only_scores_are_jaccard():
+    scorer = ConsensusScorer(embed_fn=None)
+    matrix = scorer.score_matrix(['alpha beta gamma', 'alpha beta delta', 'omega'])
+
+    assert matrix[0, 1] == pytest.approx(2 / 4)
+    assert matrix[0, 2] == 0.0
+    assert all(matrix[i, i] == 1.0 for i in range(3))
+
+
+def test_consensus_averages_distinct_pairs():
+    scorer = ConsensusScorer(embed_fn=None)
+    assert scorer.consensus(['alpha beta', 'alpha beta', 'omega']) == pytest.approx((1 + 0 + 0) / 3)
+    assert scorer.consensus(['alpha', '']) == 0.0
+    assert scorer.consensus(['alpha']) == 0.0
+
+
+def test_embedding_and_keywords_are_weighted():
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        return [[1.0, 0.0], [1.0, 0.0]]
+
+    scorer = ConsensusScorer(embed_fn=embed, embedding_weight=0.6, keyword_weight=0.4, min_keywords=2)
+    texts = ['alpha beta gamma delta', 'alpha beta omega sigma']
+
+    # 코사인 1.0, Jaccard 2/6
+    assert scorer.consensus(texts) == pytest.approx(0.6 * 1.0 + 0.4 * (2 / 6))
+    scorer.consensus(texts)
+    assert len(calls) == 1
+
+
+def test_few_keywords_fall_back_to_embedding_only():
+    scorer = ConsensusScorer(embed_fn=lambda texts: [[1.0, 0.0], [0.0, 1.0]], min_keywords=3)
+    assert scorer.consensus(['alpha', 'alpha']) == pytest.approx(0.0)
+
+
+def test_embedding_error_falls_back_to_keywords():
+    def broken(texts):
+        raise RuntimeError('quota')
+
+    scorer = ConsensusScorer(embed_fn=broken)
+    assert scorer.consensus(['alpha beta', 'alpha gamma']) == pytest.approx(1 / 3)
@@ -0,0 +1,54 @@
+"""context: 롤링 윈도우 + 누적 요약으로 프롬프트 길이 제한"""
+from context import DebateContext, estimate_tokens, summarize_turn
+
+
+def test_summarize_turn_keeps_leading_sentences():
+    text = '## 입장\n**규제가 필요합니다.** 근거는 안전입니다. 세 번째 문장은 길어서 잘립니다.'
+    assert summarize_turn(text, max_chars=30) == '입장 규제가 필요합니다. 근거는 안전입니다.'
+    assert summarize_turn('가' * 50, max_chars=10) == '가' * 7 + '...'
+
+
+def test_window_keeps_latest_turns_and_summarizes_older():
+    context = DebateContext('주제', window_turns=2, token_budget=10_000)
+    for round_num, speaker in [(1, 'Claude'), (1, 'Gemini'), (2, 'Claude')]:
+        context.add(speaker, round_num, f'{speaker} 라운드 {round_num} 의견입니다. 두 번째 문장.')
+
+    assert [speaker for speaker, _, _ in context.window] == ['Gemini', 'Claude']
+    assert context.summary == ['- Claude (Round 1): Claude 라운드 1 의견입니다. 두 번째 문장.']
+
+    prompt = context.render()
+    assert prompt.startswith(context.header)
+    assert prompt.index('이전 라운드 요약') < prompt.index('최근 발언')
+
+
+def test_budget_shrinks_window_then_drops_oldest_summaries():
+    context = DebateContext('주제', window_turns=4, token_budget=200)
+    for i in range(12):
+        context.add('Claude' if i % 2 == 0 else 'Gemini', i // 2 + 1, f'발언 {i}. ' + '내용 ' * 60)
+
+    assert len(context.window) == 1
+    assert context.window[0][2].startswith('발언 11.')
+    assert context.dropped_summaries > 0
+    assert context._tokens() <= 200 or not context.summary
+    assert f'(초기 발언 {context.dropped_summaries}개 생략)' in context.render()
+
+
+def test_seed_goes_first_and_stats_report_sizes():
+    context = DebateContext('주제', window_turns=2, token_budget=10_000)
+    context.seed('이전 토론 결정: 채택')
+    context.add('Claude', 1, '의견')
+
+    assert context.summary[0] == '- 이전 토론 결정: 채택'
+    stats = context.stats()
+    assert (stats['summary_turns'], stats['window_turns'], stats['dropped_turns']) == (1, 1, 0)
+    assert stats['estimated_tokens'] == estimate_tokens(context.render())
+
+
+def test_default_window_holds_one_round_of_every_participant():
+    context = DebateContext('주제', participants=3, token_budget=10_000)
+    for speaker in ('A', 'B', 'C'):
+        context.add(speaker, 1, f'{speaker} 의견')
+
+    assert context.window_turns == 3
+    assert [speaker for speaker, _, _ in context.window] == ['A', 'B', 'C']
+    assert context.summary == []
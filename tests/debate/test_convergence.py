@@ -0,0 +1,63 @@
+"""convergence: 합의도 궤적에 따른 조기 종료/전문가 판정"""
+import pytest
+
+from convergence import ConvergenceController
+
+
+def _controller(**kwargs):
+    kwargs.setdefault('threshold', 0.8)
+    kwargs.setdefault('max_rounds', 5)
+    kwargs.setdefault('expert_threshold', 0.5)
+    kwargs.setdefault('plateau_delta', 0.02)
+    kwargs.setdefault('plateau_rounds', 2)
+    kwargs.setdefault('max_gain_per_round', 0.1)
+    return ConvergenceController(**kwargs)
+
+
+def _run(controller, scores):
+    for round_num, score in enumerate(scores, start=1):
+        decision = controller.observe(round_num, score)
+        if decision:
+            return decision
+    return None
+
+
+def test_consensus_adopts_and_records_saved_rounds():
+    decision = _run(_controller(), [0.6, 0.85])
+    assert decision['action'] == 'adopt'
+    assert decision['reason'] == 'consensus'
+    assert (decision['round'], decision['rounds_saved']) == (2, 3)
+    assert decision['trajectory'] == [0.6, 0.85]
+
+
+def test_rising_trajectory_keeps_going():
+    assert _run(_controller(), [0.55, 0.62, 0.7]) is None
+
+
+@pytest.mark.parametrize('scores, reason, action', [
+    ([0.6, 0.61, 0.615], 'plateau', 'review'),
+    ([0.6, 0.7, 0.6, 0.7], 'oscillation', 'review'),
+    ([0.1, 0.15], 'unreachable', 'escalate'),
+])
+def test_stalled_debates_stop_early(scores, reason, action):
+    decision = _run(_controller(), scores)
+    assert (decision['reason'], decision['action']) == (reason, action)
+    assert decision['round'] == len(scores)
+
+
+def test_max_rounds_and_finish():
+    controller = _controller(max_rounds=2, max_gain_per_round=1.0)
+    assert controller.observe(1, 0.6) is None
+    decision = controller.observe(2, 0.7)
+    assert (decision['reason'], decision['rounds_saved']) == ('max_rounds', 0)
+    assert controller.finish(2) is decision
+
+
+def test_abort_records_provider_error():
+    controller = _controller()
+    controller.observe(1, 0.6)
+    decision = controller.abort(1, RuntimeError('503 from provider'))
+
+    assert decision['action'] == 'aborted'
+    assert decision['reason'] == 'provider_error'
+    assert decision['error'] == '503 from provider'
@@ -0,0 +1,157 @@
+"""QuickDebateEngine: 가짜 제공자로 토론 실행 (결과 스키마, 결과 캐시)"""
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('functions_framework')
+
+import main  # noqa: E402
+from clients import ClientPool  # noqa: E402
+from hedging import LatencyTracker  # noqa: E402
+from providers import FakeProvider  # noqa: E402
+from ratelimit import ProviderScheduler  # noqa: E402
+from result_cache import DebateResultCache  # noqa: E402
+
+
+class FakeEmbeddingModel:
+    def get_embeddings(self, texts):
+        return [SimpleNamespace(values=[1.0, float(len(text) % 7)]) for text in texts]
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ClientPool()
+    pool.override('scheduler', ProviderScheduler(str(tmp_path / 'limits.sqlite3')))
+    pool.override('latency_tracker', LatencyTracker(mode='off'))
+    pool.override('result_cache', DebateResultCache(str(tmp_path / 'results.sqlite3')))
+    pool.override('embedding_model', FakeEmbeddingModel())
+    return pool
+
+
+@pytest.fixture(autouse=True)
+def no_expert(monkeypatch):
+    monkeypatch.setattr(main, 'EXPERT_ENABLED', False)
+
+
+class PermissionDenied(Exception):
+    status_code = 403
+
+
+def _broken(provider, failing_rounds):
+    """failing_rounds 라운드에서만 권한 오류 (재시도 없이 바로 ProviderError)"""
+    complete = provider._complete
+    calls = {'n': 0}
+
+    def _complete(model, prompt, timeout=None):
+        calls['n'] += 1
+        if calls['n'] in failing_rounds:
+            raise PermissionDenied('permission denied')
+        return complete(model, prompt, timeout)
+
+    provider._complete = _complete
+    return provider
+
+
+def _run(engine, mode):
+    if mode == 'events':
+        return [event for event in engine.debate_events() if event['event'] == 'result'][0]['result']
+    return asyncio.run(engine.debate_async(mode))
+
+
+@pytest.mark.parametrize('mode', ['events', 'independent', 'pipelined'])
+def test_completed_debate_is_cached(pool, mode):
+    engine = main.QuickDebateEngine('캐시 주제', pool=pool, participants=['fake-a', 'fake-b'])
+    result = _run(engine, mode)
+
+    assert set(main._positions(result)) == {'fake-a', 'fake-b'}
+    assert pool.get('result_cache')._db.execute('SELECT COUNT(*) FROM debate_results').fetchone()[0] == 1
+
+
+@pytest.mark.parametrize('mode', ['events', 'independent'])
+def test_debate_missing_a_participant_is_not_cached(pool, mode):
+    engine = main.QuickDebateEngine('부분 결과', pool=pool, participants=['fake-a', 'fake-b', 'fake-c'])
+    _broken(engine.participants[2], failing_rounds=range(1, 100))
+    result = _run(engine, mode)
+
+    # 최종 답변이 없는 참가자도 키는 남는다
+    assert list(main._positions(result)) == ['fake-a', 'fake-b', 'fake-c']
+    assert result['fake-c_position'] is None
+    assert result['fake-a_position']
+    assert '(최종 답변 없음)' in main._format_result(result)
+
+    assert pool.get('result_cache')._db.execute('SELECT COUNT(*) FROM debate_results').fetchone()[0] == 0
+
+
+@pytest.mark.parametrize('mode', ['events', 'independent'])
+def test_aborted_debate_is_not_cached(pool, monkeypatch, mode):
+    monkeypatch.setattr(main, 'MAX_ROUNDS', 3)
+    monkeypatch.setattr(main, 'CONSENSUS_THRESHOLD', 1.01)
+    engine = main.QuickDebateEngine('중단 결과', pool=pool, participants=['fake-a', 'fake-b'])
+    engine.scorer.consensus = lambda texts: 0.8
+    _broken(engine.participants[1], failing_rounds={2})
+    result = _run(engine, mode)
+
+    assert result['convergence']['action'] == 'aborted'
+    assert result['rounds'] == 1
+    assert pool.get('result_cache')._db.execute('SELECT COUNT(*) FROM debate_results').fetchone()[0] == 0
+
+
+def _recorded(engine):
+    """참가자별 프롬프트 기록"""
+    prompts = {provider.name: [] for provider in engine.participants}
+    for provider in engine.participants:
+        def _complete(model, prompt, timeout=None, provider=provider, complete=provider._complete):
+            prompts[provider.name].append(prompt)
+            return complete(model, prompt, timeout)
+        provider._complete = _complete
+    return prompts
+
+
+@pytest.fixture
+def two_rounds(monkeypatch):
+    monkeypatch.setattr(main, 'MAX_ROUNDS', 2)
+    monkeypatch.setattr(main, 'CONSENSUS_THRESHOLD', 1.01)
+
+
+def test_independent_mode_answers_from_the_same_context(pool, two_rounds):
+    engine = main.QuickDebateEngine('독립 모드', pool=pool, use_cache=False, participants=['fake-a', 'fake-b'])
+    engine.scorer.consensus = lambda texts: 0.5
+    prompts = _recorded(engine)
+    result = asyncio.run(engine.debate_async('independent'))
+
+    assert result['rounds'] == 2
+    assert [len(calls) for calls in prompts.values()] == [2, 2]
+    # 같은 라운드 참가자는 서로의 의견을 보지 않고, 다음 라운드에는 모두의 의견을 본다
+    assert prompts['Fake-A'][0] == prompts['Fake-B'][0]
+    assert 'Fake-B 입장' in prompts['Fake-A'][1]
+
+
+def test_pipelined_mode_runs_the_lead_one_round_ahead(pool, two_rounds):
+    engine = main.QuickDebateEngine('파이프라인 모드', pool=pool, use_cache=False, participants=['fake-a', 'fake-b'])
+    engine.scorer.consensus = lambda texts: 0.5
+    prompts = _recorded(engine)
+    result = asyncio.run(engine.debate_async('pipelined'))
+
+    assert result['rounds'] == 2
+    assert set(main._positions(result)) == {'fake-a', 'fake-b'}
+    # 마지막 라운드 뒤에는 첫 참가자 호출을 미리 띄우지 않는다
+    assert [len(calls) for calls in prompts.values()] == [2, 2]
+    # 첫 참가자의 2라운드는 나머지 참가자의 1라운드 의견 없이 시작된다
+    assert 'Fake-A 입장' in prompts['Fake-A'][1]
+    assert 'Fake-B 입장' not in prompts['Fake-A'][1]
+    assert 'Fake-A 입장' in prompts['Fake-B'][0]
+
+
+def test_max_rounds_below_one_is_rejected_at_import():
+    source_dir = Path(main.__file__).parent
+    completed = subprocess.run([sys.executable, '-c', 'import main'], cwd=source_dir, capture_output=True,
+                               text=True, env={**os.environ, 'MAX_ROUNDS': '0'})
+
+    assert completed.returncode != 0
+    assert 'MAX_ROUNDS는 1 이상' in completed.stderr
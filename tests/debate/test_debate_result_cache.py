@@ -0,0 +1,52 @@
+"""result_cache: 정확/유사 주제 토론 결과 재사용"""
+import pytest
+
+from result_cache import DebateResultCache, config_fingerprint, make_key, normalize_topic
+
+FINGERPRINT = config_fingerprint({'models': {'claude': 'm'}, 'prompt_version': 2})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DebateResultCache(str(tmp_path / 'results.sqlite3'), similarity=0.95, seed_similarity=0.85,
+                             reusable_statuses=('adopted',))
+
+
+def test_topic_normalization_and_fingerprint_in_key():
+    assert normalize_topic('  ＡＰＩ 게이트웨이,  도입?! ') == 'api 게이트웨이 도입'
+    assert make_key('API 게이트웨이 도입', FINGERPRINT) == make_key('api 게이트웨이, 도입!', FINGERPRINT)
+    assert make_key('주제', FINGERPRINT) != make_key('주제', config_fingerprint({'prompt_version': 3}))
+
+
+def test_exact_hit_only_for_reusable_status(cache):
+    cache.put('API 도입', FINGERPRINT, {'status': 'adopted', 'rounds': 2})
+    cache.put('캐시 전략', FINGERPRINT, {'status': 'review_required', 'rounds': 3})
+
+    hit = cache.get('api 도입!', FINGERPRINT)
+    assert (hit['hit'], hit['result']['rounds']) == ('exact', 2)
+    assert cache.get('캐시 전략', FINGERPRINT) is None
+    assert cache.get('API 도입', 'other') is None
+
+
+def test_nearest_returns_semantic_hit_or_seed(cache):
+    cache.put('API 도입', FINGERPRINT, {'status': 'adopted'}, embedding=[1.0, 0.0])
+    cache.put('캐시 전략', FINGERPRINT, {'status': 'review_required'}, embedding=[0.0, 1.0])
+
+    assert cache.nearest([0.99, 0.05], FINGERPRINT)['hit'] == 'semantic'
+    # 유사하지만 검토가 필요했던 결과는 시드로만
+    seed = cache.nearest([0.05, 0.99], FINGERPRINT)
+    assert (seed['hit'], seed['source_topic']) == ('seed', '캐시 전략')
+    assert cache.nearest([0.7, 0.7], FINGERPRINT) is None
+    assert cache.stats() == {'exact_hits': 0, 'semantic_hits': 1, 'seeds': 1, 'misses': 1}
+
+
+def test_expired_and_disabled_cache(tmp_path):
+    expired = DebateResultCache(str(tmp_path / 'r.sqlite3'), ttl_seconds=-1)
+    expired.put('주제', FINGERPRINT, {'status': 'adopted'}, embedding=[1.0])
+    assert expired.get('주제', FINGERPRINT) is None
+    assert expired.nearest([1.0], FINGERPRINT) is None
+
+    disabled = DebateResultCache('')
+    disabled.put('주제', FINGERPRINT, {'status': 'adopted'})
+    assert not disabled.enabled
+    assert disabled.get('주제', FINGERPRINT) is None
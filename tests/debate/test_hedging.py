@@ -0,0 +1,186 @@
+"""hedging: p95 기반 헤지 대기 시간, 헤지 예산, 헤지 경쟁 생성"""
+import threading
+import time
+
+import pytest
+
+import providers
+from hedging import LatencyTracker, percentile
+from providers import Provider
+from ratelimit import ProviderError, ProviderScheduler
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 21)]
+    assert percentile(values, 95) == 19.0
+    assert percentile(values, 50) == 10.0
+    assert percentile(values, 100) == 20.0
+    assert percentile([], 95) == 0.0
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match='HEDGE_MODE'):
+        LatencyTracker(mode='triple')
+
+
+def test_hedge_delay_needs_samples_and_respects_floor():
+    tracker = LatencyTracker(mode='duplicate', pct=95, min_samples=3, min_delay=0.5)
+    tracker.observe('m', 2.0)
+    tracker.observe('m', 3.0)
+    assert tracker.hedge_delay('m') is None
+
+    tracker.observe('m', 4.0)
+    assert tracker.hedge_delay('m') == 4.0
+    assert tracker.hedge_delay('other') is None
+
+    fast = LatencyTracker(mode='duplicate', min_samples=1, min_delay=0.5)
+    fast.observe('m', 0.1)
+    assert fast.hedge_delay('m') == 0.5
+
+
+def test_off_mode_never_hedges():
+    tracker = LatencyTracker(mode='off', min_samples=1)
+    tracker.observe('m', 1.0)
+    assert tracker.hedge_delay('m') is None
+
+
+def test_hedge_budget_is_a_share_of_recent_calls():
+    tracker = LatencyTracker(mode='duplicate', min_samples=10, max_rate=0.2)
+    # 표본이 적을 때는 min_samples 호출 기준: 10 × 0.2 = 2번까지
+    assert tracker.allow_hedge('s')
+    tracker.record_call('s', hedged=True)
+    assert tracker.allow_hedge('s')
+    tracker.record_call('s', hedged=True)
+    assert not tracker.allow_hedge('s')
+
+    for _ in range(13):
+        tracker.record_call('s', hedged=False)
+    assert tracker.allow_hedge('s')
+    assert tracker.stats()['s'] == {'calls': 15, 'hedge_rate': 0.133}
+
+
+class TimedProvider(Provider):
+    """모델별 응답 시간이 정해진 스트리밍 제공자 (끊기면 즉시 멈춤, None이면 제한 시간까지 멈춘 연결)"""
+
+    name = 'Timed'
+    system = 'timed'
+
+    def __init__(self, scheduler, delays, tracker):
+        super().__init__(scheduler, list(delays), tracker=tracker)
+        self.delays = delays
+        self.started = []
+        self.closed = []
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def _complete(self, model, prompt, timeout=None):
+        return ''.join(self._open_stream(model, prompt, timeout)), None, None
+
+    def _open_stream(self, model, prompt, timeout=None, usage=None):
+        with self._lock:
+            self.started.append(model)
+            self.timeouts.append(timeout)
+        try:
+            if self.delays[model] is None:
+                # 응답이 오지 않는 연결: SDK 읽기 제한 시간이 지나야 끊긴다
+                time.sleep(timeout if timeout is not None else 30)
+                raise TimeoutError('read timed out')
+            deadline = time.monotonic() + self.delays[model]
+            while time.monotonic() < deadline:
+                time.sleep(0.005)
+                yield ''
+            yield f'{model} 응답'
+            if usage is not None:
+                usage.update(input_tokens=11, output_tokens=7)
+        finally:
+            with self._lock:
+                self.closed.append(model)
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return ProviderScheduler(str(tmp_path / 'limits.sqlite3'), max_wait=1, max_retries=0)
+
+
+def _tracker(mode, p95):
+    tracker = LatencyTracker(mode=mode, min_samples=1, min_delay=0.01, max_rate=1.0)
+    tracker.observe('slow', p95)
+    return tracker
+
+
+def test_fallback_hedge_wins_and_cancels_primary(scheduler):
+    provider = TimedProvider(scheduler, {'slow': 2.0, 'fast': 0.0}, _tracker('fallback', 0.05))
+
+    started = time.monotonic()
+    assert provider.generate('질문') == 'fast 응답'
+    assert time.monotonic() - started < 1.0
+
+    assert provider.started == ['slow', 'fast']
+    assert provider.models_used == {'fast': 1}
+    [hedge] = provider.hedges
+    assert (hedge['winner'], hedge['model'], hedge['mode']) == ('fallback', 'fast', 'fallback')
+    # 진 주 요청은 스트림이 닫히고, 끊긴 시점까지의 시간이 하한값으로 기록된다
+    deadline = time.monotonic() + 1.0
+    while 'slow' not in provider.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 'slow' in provider.closed
+    assert provider.tracker.stats()['slow']['samples'] == 2
+
+
+def test_primary_within_delay_launches_no_hedge(scheduler):
+    provider = TimedProvider(scheduler, {'slow': 0.0, 'fast': 0.0}, _tracker('duplicate', 1.0))
+
+    assert provider.generate('질문') == 'slow 응답'
+    assert provider.started == ['slow']
+    assert provider.hedges == []
+    assert provider.tracker.stats()['timed'] == {'calls': 1, 'hedge_rate': 0.0}
+
+
+def test_exhausted_budget_waits_for_primary(scheduler):
+    tracker = _tracker('duplicate', 0.02)
+    tracker.max_rate = 0.0
+    provider = TimedProvider(scheduler, {'slow': 0.1, 'fast': 0.0}, tracker)
+
+    assert provider.generate('질문') == 'slow 응답'
+    assert provider.started == ['slow']
+    assert provider.hedges == []
+
+
+def test_deadline_too_close_skips_hedging(scheduler):
+    provider = TimedProvider(scheduler, {'slow': 0.0, 'fast': 0.0}, _tracker('fallback', 5.0))
+
+    assert provider.generate('질문', deadline=time.monotonic() + 1.0) == 'slow 응답'
+    assert provider.started == ['slow']
+    assert provider.tracker.stats()['timed']['calls'] == 1
+
+
+def _wait_closed(provider, count, seconds=1.0):
+    deadline = time.monotonic() + seconds
+    while len(provider.closed) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return len(provider.closed)
+
+
+def test_hung_hedged_requests_respect_the_deadline(scheduler):
+    provider = TimedProvider(scheduler, {'slow': None, 'fast': None}, _tracker('duplicate', 0.02))
+
+    started = time.monotonic()
+    with pytest.raises(ProviderError):
+        provider.generate('질문', deadline=started + 0.3)
+    assert time.monotonic() - started < 0.5
+
+    # 주 요청과 헤지 요청 모두 남은 시간을 SDK 제한 시간으로 받아, 멈춘 연결도 마감 무렵 끊긴다
+    assert provider.started == ['slow', 'slow']
+    assert all(timeout is not None and 0 < timeout <= 0.3 for timeout in provider.timeouts)
+    assert _wait_closed(provider, 2) == 2
+
+
+def test_completed_hedged_stream_records_sdk_usage(scheduler, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(providers, 'record_usage',
+                        lambda prompt, text, input_tokens=None, output_tokens=None:
+                        recorded.append((text, input_tokens, output_tokens)))
+    provider = TimedProvider(scheduler, {'slow': 0.0, 'fast': 0.0}, _tracker('duplicate', 1.0))
+
+    assert provider.generate('질문') == 'slow 응답'
+    assert recorded == [('slow 응답', 11, 7)]
@@ -0,0 +1,134 @@
+"""jobs: SQLite 작업 저장소 상태 전이와 백그라운드 워커"""
+import threading
+
+import pytest
+
+from jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, SQLiteJobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def _drain(queue):
+    queue._executor.shutdown(wait=True)
+
+
+def test_claim_is_exclusive_and_cancel_depends_on_status(store):
+    queued = store.create('주제', {'rounds': 2})
+    running = store.create('주제', {})
+
+    assert store.claim(running)
+    assert not store.claim(running)
+    assert store.get(running)['status'] == RUNNING
+
+    assert store.request_cancel(queued) == CANCELLED
+    assert not store.claim(queued)
+    assert store.request_cancel(running) == RUNNING
+    assert store.cancel_requested(running)
+    assert store.request_cancel('missing') is None
+
+
+def test_events_are_sequenced_and_running_jobs_requeued(store):
+    job_id = store.create('주제', {})
+    store.append_event(job_id, {'event': 'start'})
+    store.append_event(job_id, {'event': 'round', 'round': 1})
+
+    assert [event['seq'] for event in store.events(job_id)] == [1, 2]
+    assert store.events(job_id, after=1) == [{'event': 'round', 'round': 1, 'seq': 2}]
+
+    store.claim(job_id)
+    assert store.requeue_running() == 1
+    assert store.get(job_id)['status'] == QUEUED
+    assert store.queued_ids() == [job_id]
+
+
+def test_queue_runs_job_and_stores_result(store):
+    def run(topic, params):
+        yield {'event': 'start', 'topic': topic}
+        yield {'event': 'token', 'text': '...'}
+        yield {'event': 'result', 'result': {'topic': topic, 'rounds': params['rounds']}}
+
+    queue = JobQueue(store, run, max_concurrency=1)
+    job_id = queue.submit('주제', {'rounds': 3})
+    _drain(queue)
+
+    job = store.get(job_id)
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == {'topic': '주제', 'rounds': 3}
+    assert [event['event'] for event in store.events(job_id)] == ['start', 'result']
+    assert list(queue.follow(job_id, after=2))[-1] == {'event': 'status', 'job_id': job_id, 'status': SUCCEEDED}
+
+
+def test_setup_error_marks_job_failed(store):
+    def run(topic, params):
+        raise ValueError('알 수 없는 참가자: Grok')
+
+    queue = JobQueue(store, run, max_concurrency=1)
+    job_id = queue.submit('주제')
+    _drain(queue)
+
+    job = store.get(job_id)
+    assert job['status'] == FAILED
+    assert job['error'] == '알 수 없는 참가자: Grok'
+
+
+def test_error_during_run_marks_job_failed(store):
+    def run(topic, params):
+        yield {'event': 'start'}
+        raise RuntimeError('provider down')
+
+    queue = JobQueue(store, run, max_concurrency=1)
+    job_id = queue.submit('주제')
+    _drain(queue)
+
+    assert (store.get(job_id)['status'], store.get(job_id)['error']) == (FAILED, 'provider down')
+
+
+def test_cancel_stops_running_job_and_closes_events(store):
+    started, closed = threading.Event(), threading.Event()
+    release = threading.Event()
+
+    def run(topic, params):
+        try:
+            yield {'event': 'start'}
+            started.set()
+            release.wait(5)
+            yield {'event': 'opinion'}
+            yield {'event': 'result', 'result': {}}
+        finally:
+            closed.set()
+
+    queue = JobQueue(store, run, max_concurrency=1)
+    job_id = queue.submit('주제')
+    assert started.wait(5)
+    queue.cancel(job_id)
+    release.set()
+    _drain(queue)
+
+    assert store.get(job_id)['status'] == CANCELLED
+    assert closed.is_set()
+
+
+def test_cancel_after_result_keeps_succeeded(tmp_path):
+    class RacingStore(SQLiteJobStore):
+        # 결과 이벤트 저장 직후 취소 요청이 도착하는 경쟁 상황 재현
+        def append_event(self, job_id, event):
+            super().append_event(job_id, event)
+            if event['event'] == 'result':
+                self.request_cancel(job_id)
+
+    racing = RacingStore(str(tmp_path / 'jobs.sqlite3'))
+
+    def run(topic, params):
+        yield {'event': 'start'}
+        yield {'event': 'result', 'result': {'final_answer': '합의'}}
+
+    queue = JobQueue(racing, run, max_concurrency=1)
+    job_id = queue.submit('주제')
+    _drain(queue)
+
+    job = racing.get(job_id)
+    assert job['cancel_requested']
+    assert (job['status'], job['result']) == (SUCCEEDED, {'final_answer': '합의'})
@@ -0,0 +1,89 @@
+"""providers: 참가자 구성, 가짜 제공자, 스케줄러를 거친 생성/대체 모델"""
+import pytest
+
+from clients import ClientPool
+from hedging import LatencyTracker
+from providers import AnthropicProvider, FakeProvider, GeminiProvider, Provider, build_participants
+from ratelimit import ProviderError, ProviderScheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return ProviderScheduler(str(tmp_path / 'limits.sqlite3'), max_wait=1, max_retries=1, sleep=lambda s: None)
+
+
+@pytest.fixture
+def pool():
+    pool = ClientPool()
+    pool.override('latency_tracker', LatencyTracker(mode='off'))
+    return pool
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ScriptedProvider(Provider):
+    """모델별로 정해 둔 예외를 던지거나 응답하는 제공자"""
+
+    name = 'Scripted'
+    system = 'scripted'
+
+    def __init__(self, scheduler, failures, **kwargs):
+        super().__init__(scheduler, ['primary-model', 'fallback-model'], **kwargs)
+        self.failures = failures
+        self.calls = []
+
+    def _complete(self, model, prompt, timeout=None):
+        self.calls.append(model)
+        if model in self.failures:
+            raise self.failures[model]
+        return f'{model}: {prompt}', 3, 5
+
+
+def test_build_participants_keeps_order_and_shares_tracker(pool, scheduler):
+    participants = build_participants(pool, scheduler, ['gemini', 'fake-a', 'Claude'])
+
+    assert [type(p) for p in participants] == [GeminiProvider, FakeProvider, AnthropicProvider]
+    assert participants[1].name == 'Fake-A'
+    assert len({id(p.tracker) for p in participants}) == 1
+
+
+@pytest.mark.parametrize('names, message', [
+    (['claude', 'mystery'], '알 수 없는 토론 참가자'),
+    (['claude'], '2명 이상'),
+])
+def test_build_participants_rejects_bad_lists(pool, scheduler, names, message):
+    with pytest.raises(ValueError, match=message):
+        build_participants(pool, scheduler, names)
+
+
+def test_fake_provider_is_deterministic_per_prompt(scheduler):
+    provider = FakeProvider(scheduler, name='Fake-A', latency=0)
+
+    first = provider.generate('주제 A')
+    assert first == provider.generate('주제 A')
+    assert first.startswith('Fake-A 입장:')
+    assert ''.join(provider.stream('주제 A')).strip() == first
+    assert provider.models_used == {'fake-fake-a': 3}
+    assert provider.metadata()['models'] == ['fake-fake-a']
+
+
+def test_generate_falls_back_to_next_model_on_missing_model(scheduler):
+    provider = ScriptedProvider(scheduler, {'primary-model': StatusError('model not found', 404)})
+
+    assert provider.generate('hi') == 'fallback-model: hi'
+    assert provider.calls == ['primary-model', 'fallback-model']
+    assert provider.models_used == {'fallback-model': 1}
+
+
+def test_generate_raises_provider_error_instead_of_returning_text(scheduler):
+    provider = ScriptedProvider(scheduler, {'primary-model': StatusError('permission denied', 403)})
+
+    with pytest.raises(ProviderError) as excinfo:
+        provider.generate('hi')
+    # 권한 오류는 제공자 전체 문제라 대체 모델도 시도하지 않는다
+    assert provider.calls == ['primary-model']
+    assert excinfo.value.provider == 'scripted'
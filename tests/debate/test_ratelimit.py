@@ -0,0 +1,175 @@
+"""ratelimit: 공유 토큰 버킷, 서킷 브레이커, 재시도/대체 모델 호출"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+from ratelimit import ProviderError, ProviderScheduler, classify, parse_retry_delay
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code=None, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {}, status_code=status_code)
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    sleeps = []
+    scheduler = ProviderScheduler(str(tmp_path / 'limits.sqlite3'), max_wait=5, max_retries=2, sleep=sleeps.append)
+    scheduler.sleeps = sleeps
+    return scheduler
+
+
+class GoogleError(Exception):
+    """google.api_core 예외처럼 HTTP 상태를 code에 담는 SDK 예외"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+GoogleError.__module__ = 'google.api_core.exceptions'
+
+
+class GoogleAuthError(Exception):
+    pass
+
+
+GoogleAuthError.__module__ = 'google.auth.exceptions'
+
+
+class TransportError(Exception):
+    pass
+
+
+TransportError.__module__ = 'httpx'
+
+
+@pytest.mark.parametrize('error, kind', [
+    (StatusError('Your credit balance is too low', status_code=400), 'exhausted'),
+    (StatusError('forbidden', status_code=403), 'exhausted'),
+    (GoogleAuthError('default credentials not found'), 'exhausted'),
+    (StatusError('model not found', status_code=404), 'missing_model'),
+    (GoogleError('404 Publisher model not found', 404), 'missing_model'),
+    (StatusError('slow down', status_code=429), 'rate_limited'),
+    (GoogleError('429 Quota exceeded for aiplatform requests per minute', 429), 'rate_limited'),
+    (StatusError('insufficient_quota: check your plan and billing details', status_code=429), 'exhausted'),
+    (StatusError('overloaded', status_code=529), 'transient'),
+    (TransportError('connection reset'), 'transient'),
+    (TimeoutError('read timed out'), 'transient'),
+    # 메시지 속 숫자/단어로 추측하지 않는다
+    (StatusError('bad request (request_id req_500 quota api_key)', status_code=400), 'fatal'),
+    (StatusError('Error code: 500'), 'fatal'),
+])
+def test_classify_uses_status_and_sdk_types(error, kind):
+    assert classify(error) == kind
+
+
+def test_non_provider_errors_propagate_without_retry(scheduler):
+    calls = []
+
+    def fn(model):
+        calls.append(model)
+        raise KeyError('choices')
+
+    with pytest.raises(KeyError):
+        scheduler.call('claude', ['claude-a', 'claude-b'], 10, fn)
+    assert calls == ['claude-a']
+    assert scheduler.open_for('claude', 'claude-a') == 0.0
+
+
+def test_parse_retry_delay_from_header_and_message():
+    assert parse_retry_delay(StatusError('429', headers={'retry-after': '7'})) == 7.0
+    assert parse_retry_delay(Exception('quota exceeded, retry_delay { seconds: 12 }')) == 12.0
+    assert parse_retry_delay(Exception('Please retry in 2.5s')) == 2.5
+    assert parse_retry_delay(Exception('no hint')) is None
+
+
+def test_bucket_waits_and_gives_up_after_deadline(scheduler, monkeypatch):
+    monkeypatch.setitem(ratelimit.RATE_LIMITS, 'm', {'rpm': 2, 'tpm': 0})
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now[0])
+
+    assert scheduler._try_take('m', 10) == 0.0
+    assert scheduler._try_take('m', 10) == 0.0
+    # 분당 2회: 한 요청분이 다시 차려면 30초
+    assert scheduler._try_take('m', 10) == pytest.approx(30.0)
+    now[0] += 30
+    assert scheduler._try_take('m', 10) == 0.0
+
+    assert not scheduler.acquire('m', 10, deadline=time.monotonic() + 1)
+    assert scheduler.sleeps == []
+
+
+def test_unlimited_model_never_waits(scheduler):
+    assert all(scheduler.acquire('unknown-model', 10_000) for _ in range(100))
+
+
+def test_breaker_opens_after_repeated_failures(scheduler, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'BREAKER_FAILURES', 2)
+    monkeypatch.setattr(ratelimit, 'BREAKER_COOLDOWN', 60)
+
+    scheduler.record_failure('m', '503')
+    assert scheduler.open_for('m') == 0.0
+    scheduler.record_failure('m', '503')
+    assert 59 < scheduler.open_for('m') <= 60
+    scheduler.record_success('m')
+    assert scheduler.open_for('m') == 0.0
+
+
+def test_call_retries_transient_errors(scheduler):
+    failures = iter([StatusError('unavailable', status_code=503), StatusError('unavailable', status_code=503)])
+
+    def fn(model):
+        error = next(failures, None)
+        if error:
+            raise error
+        return f'ok from {model}'
+
+    assert scheduler.call('claude', ['claude-a'], 10, fn) == ('ok from claude-a', 'claude-a')
+    assert scheduler.stats()['retries'] == 2
+    assert len(scheduler.sleeps) == 2
+
+
+def test_call_fails_over_to_next_model(scheduler):
+    def fn(model):
+        if model == 'claude-a':
+            raise StatusError('not found', status_code=404)
+        return model
+
+    assert scheduler.call('claude', ['claude-a', 'claude-b'], 10, fn) == ('claude-b', 'claude-b')
+    assert scheduler.stats()['failovers'] == 1
+    # 없는 모델은 막아 두어 다음 호출은 바로 대체 모델로
+    assert scheduler.open_for('claude-a') > 0
+
+
+def test_exhausted_provider_fails_fast(scheduler):
+    calls = []
+
+    def fn(model):
+        calls.append(model)
+        raise StatusError('invalid api_key', status_code=401)
+
+    with pytest.raises(ProviderError) as excinfo:
+        scheduler.call('claude', ['claude-a', 'claude-b'], 10, fn)
+    assert calls == ['claude-a']
+    assert excinfo.value.attempts[0]['error'] == 'exhausted'
+
+    with pytest.raises(ProviderError):
+        scheduler.call('claude', ['claude-a'], 10, fn)
+    assert calls == ['claude-a']
+    assert scheduler.stats()['fast_failures'] == 1
+    assert scheduler.open_for('claude') > 0
+
+
+def test_call_does_not_retry_past_deadline(scheduler):
+    def fn(model):
+        raise StatusError('rate limit, retry in 5s', status_code=429)
+
+    with pytest.raises(ProviderError) as excinfo:
+        scheduler.call('claude', ['claude-a'], 10, fn, deadline=time.monotonic() + 1)
+    assert excinfo.value.attempts[-1]['error'] == 'deadline'
+    assert scheduler.sleeps == []
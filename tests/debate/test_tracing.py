@@ -0,0 +1,84 @@
+"""tracing: 스팬 계층, 스레드 전파, 모델 가격과 라운드별 비용 요약"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import tracing
+
+tracer = tracing.get_tracer(__name__)
+
+
+def test_price_uses_longest_matching_prefix():
+    assert tracing.price('gemini-2.0-flash-lite-001', 1_000_000, 0) == pytest.approx(0.075)
+    assert tracing.price('gemini-2.0-flash-001', 1_000_000, 1_000_000) == pytest.approx(0.50)
+    assert tracing.price('claude-sonnet-4-5-20250929', 1000, 1000) == pytest.approx(0.018)
+    assert tracing.price('unknown-model', 1000, 1000) == 0.0
+
+
+def test_spans_nest_and_bind_crosses_threads():
+    with tracer.start_as_current_span('root') as root:
+        with tracer.start_as_current_span('child') as child:
+            assert tracing.current_span() is child
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            worker = executor.submit(tracing.bind(tracing.current_span)).result()
+    assert child.parent is root
+    assert worker is root
+    assert tracing.current_span() is None
+    assert root.end_ns is not None and child.trace is root.trace
+
+
+def test_exception_is_recorded_and_reraised():
+    with pytest.raises(RuntimeError):
+        with tracer.start_as_current_span('failing') as span:
+            raise RuntimeError('boom')
+    assert span.status == 'ERROR'
+    assert span.events[0]['attributes']['exception.message'] == 'boom'
+
+
+def test_breakdown_groups_tokens_and_cost_by_round():
+    with tracer.start_as_current_span('debate.run') as root:
+        for round_num in (1, 2):
+            with tracer.start_as_current_span('debate.round', {'round': round_num}):
+                with tracer.start_as_current_span('provider.call', {'retries': 1}):
+                    tracing.set_attributes({tracing.MODEL: 'claude-sonnet-4-5', tracing.INPUT_TOKENS: 1000,
+                                            tracing.OUTPUT_TOKENS: 100 * round_num})
+        with tracer.start_as_current_span('embedding', {tracing.MODEL: 'text-multilingual-embedding-002',
+                                                        tracing.INPUT_TOKENS: 500}):
+            pass
+        summary = tracing.breakdown()
+
+    assert summary['stages']['provider.call']['count'] == 2
+    assert summary['tokens'] == {'input': 2500, 'output': 300}
+    assert summary['retries'] == 2
+    assert summary['models']['claude-sonnet-4-5']['calls'] == 2
+    assert [(r['round'], r['output_tokens'], r['retries']) for r in summary['rounds']] == [(1, 100, 1), (2, 200, 1)]
+    assert summary['cost_usd'] == pytest.approx((2000 * 3 + 300 * 15 + 500 * 0.05) / 1_000_000)
+    assert tracing.breakdown(root.trace)['tokens'] == summary['tokens']
+    assert tracing.breakdown() == {}
+
+
+def test_file_exporter_writes_one_line_per_span(tmp_path, monkeypatch):
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracing, 'TRACE_EXPORTER', 'file')
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(path))
+
+    with tracer.start_as_current_span('outer'):
+        with tracer.start_as_current_span('inner', {'round': 1}):
+            pass
+
+    spans = [json.loads(line)['span'] for line in path.read_text().splitlines()]
+    assert [span['name'] for span in spans] == ['inner', 'outer']
+    assert spans[0]['parent_span_id'] == spans[1]['span_id']
+    assert spans[0]['attributes'] == {'round': 1}
+
+
+def test_tracing_copies_are_identical():
+    # 배포 단위마다 같은 파일을 복사해 두므로 한쪽만 고치면 실패
+    root = Path(__file__).resolve().parents[2]
+    copies = [root / 'cloud-functions' / 'debate' / 'tracing.py',
+              root / 'cloud-functions' / 'search' / 'tracing.py',
+              root / 'scripts' / 'tracing.py']
+    contents = {path.relative_to(root).as_posix(): path.read_bytes() for path in copies}
+    assert len(set(contents.values())) == 1, f"tracing.py 사본이 다름: {sorted(contents)}"
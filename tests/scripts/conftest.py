@@ -0,0 +1,10 @@
+"""Put scripts/ first on the import path for the uploader module tests"""
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parents[2] / 'scripts'
+
+# cloud-functions/ has modules with the same names; drop any imported from there
+for _name in ('clients', 'lazy', 'main', 'result_cache', 'tracing'):
+    sys.modules.pop(_name, None)
+sys.path.insert(0, str(SCRIPTS_DIR))
@@ -0,0 +1,57 @@
+"""bq_writer: NDJSON streaming and the LocalSink upsert/delete semantics"""
+import json
+
+from bq_writer import LocalSink, write_ndjson
+
+
+def _rows(sink):
+    with open(sink.table_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def _load(sink, tmp_path, rows):
+    path, count = write_ndjson(rows, directory=tmp_path)
+    sink.upsert(path)
+    return count
+
+
+def test_write_ndjson_streams_rows_and_counts_them(tmp_path):
+    path, count = write_ndjson(({'doc_id': str(i), 'text': '토론'} for i in range(3)), directory=tmp_path)
+
+    assert count == 3
+    assert path.read_text(encoding='utf-8').splitlines()[0] == '{"doc_id": "0", "text": "토론"}'
+
+
+def test_upsert_replaces_in_place_and_appends_new_rows(tmp_path):
+    sink = LocalSink(tmp_path / 'table')
+    assert sink.table_path.name == 'embeddings.ndjson'
+    _load(sink, tmp_path, [{'doc_id': 'a', 'v': 1}, {'doc_id': 'b', 'v': 1}])
+    _load(sink, tmp_path, [{'doc_id': 'c', 'v': 2}, {'doc_id': 'a', 'v': 2}])
+
+    assert [(row['doc_id'], row['v']) for row in _rows(sink)] == [('a', 2), ('b', 1), ('c', 2)]
+    assert all(row['synced_at'] == 'local' for row in _rows(sink))
+    assert sink.loads == 2
+
+
+def test_delete_drops_rows(tmp_path):
+    sink = LocalSink(tmp_path / 'table')
+    _load(sink, tmp_path, [{'doc_id': 'a'}, {'doc_id': 'b'}, {'doc_id': 'c'}])
+    sink.delete(['b', 'missing'])
+
+    assert [row['doc_id'] for row in _rows(sink)] == ['a', 'c']
+
+
+def test_rows_reads_back_the_table(tmp_path):
+    sink = LocalSink(tmp_path / 'table')
+    assert list(sink.rows()) == []
+
+    _load(sink, tmp_path, [{'doc_id': 'a', 'embedding': [1.0]}])
+    assert list(sink.rows()) == [{'doc_id': 'a', 'embedding': [1.0], 'synced_at': 'local'}]
+
+
+def test_export_copies_table(tmp_path):
+    sink = LocalSink(tmp_path / 'table')
+    _load(sink, tmp_path, [{'doc_id': 'a'}])
+    sink.export(tmp_path / 'export.ndjson')
+
+    assert (tmp_path / 'export.ndjson').read_text() == sink.table_path.read_text()
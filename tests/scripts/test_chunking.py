@@ -0,0 +1,66 @@
+"""Chunking: section-aware, size-bounded chunks that overlap and point back to their parent"""
+from chunking import chunk_document, chunk_text, debate_sections, markdown_sections
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text('one\n\ntwo', max_chars=100) == ['one\n\ntwo']
+    assert chunk_text('   \n\n  ', max_chars=100) == []
+
+
+def test_chunks_are_bounded_and_overlap():
+    paragraphs = [f"paragraph {i} " + 'word ' * 15 for i in range(10)]
+    chunks = chunk_text('\n\n'.join(paragraphs), max_chars=200, overlap_chars=40)
+
+    assert len(chunks) > 1
+    # Overlap comes on top of a chunk, never more than max_chars + overlap
+    assert all(len(chunk) <= 240 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split('\n\n')[0] in previous
+    for paragraph in paragraphs:
+        assert any(paragraph.strip() in chunk for chunk in chunks)
+
+
+def test_oversized_paragraph_splits_at_sentences_then_hard_wraps():
+    text = 'First sentence here. Second sentence here. ' + 'x' * 120
+    chunks = chunk_text(text, max_chars=50, overlap_chars=0)
+
+    assert chunks[0] == 'First sentence here. Second sentence here.'
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert ''.join(chunks[1:]).count('x') == 120
+
+
+def test_markdown_sections_split_at_headings():
+    text = 'intro line\n# Title\nbody\n## Sub\nmore'
+    assert markdown_sections(text) == [
+        ('preamble', 'intro line'),
+        ('Title', '# Title\nbody'),
+        ('Sub', '## Sub\nmore'),
+    ]
+
+
+def test_debate_sections_group_turns_by_round():
+    debate = {'history': [
+        {'round': 1, 'ai': 'Claude', 'response': 'c1'},
+        {'round': 1, 'ai': 'Gemini', 'response': 'g1'},
+        {'round': 2, 'ai': 'Claude', 'response': ''},
+        {'round': 2, 'ai': 'Gemini', 'response': 'g2'},
+    ]}
+    sections = debate_sections(debate, 'topic', 'summary text')
+
+    assert [label for label, _ in sections] == ['summary', 'round 1', 'round 2']
+    assert 'Claude:\nc1\n\nGemini:\ng1' in sections[1][1]
+    assert 'Claude' not in sections[2][1]
+
+
+def test_chunk_document_ids_and_metadata():
+    doc = {
+        'doc_id': 'debate_1', 'doc_type': 'debate', 'title': 't', 'content': 'unused',
+        'metadata': {'topic': 't'}, 'created_at': '2024-01-01',
+        'sections': [('summary', 'short'), ('round 1', 'a' * 30 + '\n\n' + 'b' * 30)],
+    }
+    chunks = list(chunk_document(doc, max_chars=40, overlap_chars=0))
+
+    assert [chunk['doc_id'] for chunk in chunks] == ['debate_1#000', 'debate_1#001', 'debate_1#002']
+    assert [chunk['metadata']['section'] for chunk in chunks] == ['summary', 'round 1', 'round 1']
+    assert all(chunk['parent_doc_id'] == 'debate_1' for chunk in chunks)
+    assert chunks[2]['metadata'] == {'topic': 't', 'parent_doc_id': 'debate_1', 'chunk_index': 2, 'section': 'round 1'}
@@ -0,0 +1,111 @@
+"""DebateArchive: lossless round trip, index-only queries, pruning and immutable segments"""
+import json
+
+import pytest
+
+from debate_archive import DebateArchive, iter_debates
+
+
+def _debate(topic, timestamp, score, status='adopted', turns=3):
+    return {
+        'topic': topic,
+        'timestamp': timestamp,
+        'history': [{'round': i // 2 + 1, 'ai': 'Claude' if i % 2 == 0 else 'Gemini', 'response': f'응답 {i}'}
+                    for i in range(turns)],
+        'consensus_score': score,
+        'status': status,
+    }
+
+
+@pytest.fixture
+def source(tmp_path):
+    directory = tmp_path / 'brain'
+    directory.mkdir()
+    for i, (score, status) in enumerate([(0.9, 'adopted'), (0.5, 'review_required'), (0.8, 'adopted')]):
+        debate = _debate(f'주제 {i}', f'2026-01-1{i}T00:00:00', score, status)
+        (directory / f'debate_{i}.json').write_text(json.dumps(debate, ensure_ascii=False), encoding='utf-8')
+    return directory
+
+
+def test_round_trip_preserves_document_and_key_order(tmp_path, source):
+    archive = DebateArchive(tmp_path / 'archive')
+    assert archive.convert(source)['added'] == 3
+
+    original = json.loads((source / 'debate_1.json').read_text(encoding='utf-8'))
+    record = archive.get('debate_1')
+    assert record.to_dict() == original
+    assert list(record.to_dict()) == list(original)
+    assert record.entry['turns'] == 3
+
+
+def test_history_is_loaded_lazily(tmp_path, source, monkeypatch):
+    archive = DebateArchive(tmp_path / 'archive')
+    archive.convert(source)
+    reads = []
+    read_block = archive._read_block
+    monkeypatch.setattr(archive, '_read_block', lambda entry, block: reads.append(block) or read_block(entry, block))
+
+    record = archive.latest()
+    assert (record.id, record['topic']) == ('debate_2', '주제 2')
+    assert reads == ['summary']
+    assert len(record['history']) == 3
+    assert reads == ['summary', 'history']
+
+
+def test_find_filters_on_index_only(tmp_path, source):
+    archive = DebateArchive(tmp_path / 'archive')
+    archive.convert(source)
+
+    assert [e['id'] for e in archive.find(status='adopted')] == ['debate_2', 'debate_0']
+    assert [e['id'] for e in archive.find(min_consensus=0.6, newest_first=False)] == ['debate_0', 'debate_2']
+    assert [e['id'] for e in archive.find(since='2026-01-11', topic='주제', limit=1)] == ['debate_2']
+
+
+def test_convert_skips_unchanged_and_supersedes_edited(tmp_path, source):
+    archive = DebateArchive(tmp_path / 'archive')
+    archive.convert(source)
+    edited = _debate('주제 1', '2026-01-11T00:00:00', 0.95)
+    (source / 'debate_1.json').write_text(json.dumps(edited, ensure_ascii=False), encoding='utf-8')
+
+    counts = DebateArchive(tmp_path / 'archive').convert(source)
+    assert (counts['unchanged'], counts['updated'], counts['added']) == (2, 1, 0)
+    assert DebateArchive(tmp_path / 'archive').get('debate_1')['consensus_score'] == 0.95
+
+
+def test_prune_deletes_verified_sources_and_iter_debates_still_sees_them(tmp_path, source):
+    archive = DebateArchive(tmp_path / 'archive')
+    assert archive.convert(source, prune=True)['pruned'] == 3
+    assert not list(source.glob('debate_*.json'))
+
+    loose = _debate('새 주제', '2026-01-20T00:00:00', 0.7)
+    (source / 'debate_9.json').write_text(json.dumps(loose, ensure_ascii=False), encoding='utf-8')
+    assert [doc_id for doc_id, _ in iter_debates(source, archive)] == ['debate_0', 'debate_1', 'debate_2', 'debate_9']
+
+
+def test_new_segment_leaves_existing_segments_untouched(tmp_path, source):
+    directory = tmp_path / 'archive'
+    DebateArchive(directory).convert(source)
+    first = (directory / 'segment-00001.seg').read_bytes()
+
+    (source / 'debate_5.json').write_text(json.dumps(_debate('다음', '2026-01-15', 0.6)), encoding='utf-8')
+    (source / 'debate_6.json').write_text(json.dumps(_debate('그다음', '2026-01-16', 0.6)), encoding='utf-8')
+    archive = DebateArchive(directory, reuse_segments=False)
+    archive.convert(source)
+
+    assert (directory / 'segment-00001.seg').read_bytes() == first
+    assert sorted(path.name for path in directory.glob('*.seg')) == ['segment-00001.seg', 'segment-00002.seg']
+    assert archive.get('debate_6').entry['segment'] == 'segment-00002.seg'
+    assert archive.get('debate_6')['topic'] == '그다음'
+
+
+def test_corrupt_block_is_detected(tmp_path, source):
+    archive = DebateArchive(tmp_path / 'archive')
+    archive.convert(source)
+    segment = tmp_path / 'archive' / 'segment-00001.seg'
+    data = bytearray(segment.read_bytes())
+    offset = archive.get('debate_0').entry['summary'][0]
+    data[offset + 5] ^= 0xFF
+    segment.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError, match='Corrupt summary block'):
+        DebateArchive(tmp_path / 'archive').get('debate_0')['topic']
@@ -0,0 +1,109 @@
+"""EmbeddingPipeline: token bucket, retries, batch splitting and ordered output"""
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import embedding_pipeline
+from embedding_pipeline import EmbeddingPipeline, TokenBucket
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class InvalidArgument(Exception):
+    pass
+
+
+class FakeModel:
+    """Embeds text as [len(text)]; fails according to the given rule"""
+
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda texts, call: None)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_embeddings(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            call = len(self.calls)
+        error = self.fail(texts, call)
+        if error:
+            raise error
+        return [SimpleNamespace(values=[float(len(text))]) for text in texts]
+
+
+def _pipeline(model, **kwargs):
+    kwargs.setdefault('requests_per_minute', 0)
+    return EmbeddingPipeline(model, sleep=lambda seconds: None, **kwargs)
+
+
+def test_token_bucket_waits_for_refill():
+    clock = SimpleNamespace(now=0.0)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    with mock.patch.object(embedding_pipeline.time, 'monotonic', lambda: clock.now), \
+            mock.patch.object(embedding_pipeline.time, 'sleep', sleep):
+        bucket = TokenBucket(rate_per_minute=60, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        assert sleeps == []
+        bucket.acquire()
+        assert sleeps == [1.0]
+        # Requests larger than the bucket are clamped instead of waiting forever
+        bucket.acquire(10)
+        assert sum(sleeps) == 3.0
+
+
+def test_zero_rate_bucket_never_blocks():
+    with mock.patch.object(embedding_pipeline.time, 'sleep', side_effect=AssertionError):
+        TokenBucket(rate_per_minute=0).acquire(1000)
+
+
+def test_embed_keeps_input_order_across_workers():
+    model = FakeModel()
+    pipeline = _pipeline(model, batch_size=3, max_workers=4)
+    items = [(i, 'x' * (i + 1)) for i in range(20)]
+
+    assert list(pipeline.embed(items)) == [(i, [float(i + 1)]) for i in range(20)]
+    assert max(len(call) for call in model.calls) == 3
+    assert pipeline.stats['requests'] == 7
+
+
+def test_batches_respect_token_budget():
+    pipeline = _pipeline(FakeModel(), batch_size=10, max_tokens_per_request=100)
+    items = [(i, 'x' * 98) for i in range(4)]
+
+    assert [len(batch) for batch in pipeline._batches(items)] == [2, 2]
+
+
+def test_transient_errors_are_retried():
+    model = FakeModel(lambda texts, call: ResourceExhausted('429 quota') if call <= 2 else None)
+    pipeline = _pipeline(model, batch_size=2, max_workers=1)
+
+    assert list(pipeline.embed([('a', 'aa'), ('b', 'b')])) == [('a', [2.0]), ('b', [1.0])]
+    assert pipeline.stats['retries'] == 2
+
+
+def test_size_limit_splits_batch_and_shrinks_later_batches():
+    model = FakeModel(lambda texts, call: InvalidArgument('too many instances') if len(texts) > 2 else None)
+    pipeline = _pipeline(model, batch_size=4, max_workers=1)
+
+    result = list(pipeline.embed([(i, 'x') for i in range(4)]))
+
+    assert result == [(i, [1.0]) for i in range(4)]
+    assert pipeline.stats['splits'] == 1
+    assert pipeline.batch_size == 2
+
+
+def test_permanent_failure_yields_none():
+    model = FakeModel(lambda texts, call: PermissionError('denied'))
+    pipeline = _pipeline(model, batch_size=2, max_workers=1)
+
+    assert list(pipeline.embed([('a', 'a'), ('b', 'b')])) == [('a', None), ('b', None)]
+    assert pipeline.stats['failed_texts'] == 2
+    assert len(model.calls) == 1
@@ -0,0 +1,80 @@
+"""SyncManifest: only new or changed docs are re-uploaded, and only text edits are re-embedded"""
+from sync_manifest import SyncManifest, pack_embedding, unpack_embedding
+
+MODEL = 'text-embedding-004'
+
+
+def _doc(doc_id, content, title='t'):
+    return {'doc_id': doc_id, 'doc_type': 'debate', 'title': title, 'content': content}
+
+
+def _synced(tmp_path, docs):
+    manifest = SyncManifest(tmp_path / 'manifest.json', MODEL)
+    for doc in manifest.diff(docs):
+        doc['embedding'] = [float(len(doc['content']))]
+        manifest.stage(doc, synced_at='2024-01-01T00:00:00')
+    manifest.commit()
+    manifest.save()
+    return manifest
+
+
+def test_embedding_pack_round_trip():
+    assert unpack_embedding(pack_embedding([0.5, -2.0])) == [0.5, -2.0]
+
+
+def test_diff_skips_unchanged_and_reuses_embedding_for_metadata_edits(tmp_path):
+    _synced(tmp_path, [_doc('a', 'alpha'), _doc('b', 'beta'), _doc('c', 'gamma')])
+    manifest = SyncManifest.load(tmp_path / 'manifest.json', MODEL)
+
+    changed = {doc['doc_id']: doc for doc in manifest.diff([
+        _doc('a', 'alpha'),
+        _doc('b', 'beta', title='renamed'),
+        _doc('c', 'gamma, edited'),
+        _doc('d', 'delta'),
+    ])}
+
+    assert sorted(changed) == ['b', 'c', 'd']
+    assert changed['b']['embedding'] == [4.0]
+    assert 'embedding' not in changed['c']
+    assert 'embedding' not in changed['d']
+
+
+def test_removed_lists_docs_missing_from_last_diff(tmp_path):
+    manifest = _synced(tmp_path, [_doc('a', 'alpha'), _doc('b', 'beta')])
+    list(manifest.diff([_doc('a', 'alpha')]))
+
+    assert manifest.removed() == ['b']
+    manifest.forget(manifest.removed())
+    assert list(manifest.entries) == ['a']
+
+
+def test_discard_keeps_failed_docs_pending_for_next_run(tmp_path):
+    manifest = SyncManifest(tmp_path / 'manifest.json', MODEL)
+    for doc in manifest.diff([_doc('a', 'alpha')]):
+        doc['embedding'] = [1.0]
+        manifest.stage(doc)
+    manifest.discard()
+    manifest.commit()
+
+    assert manifest.entries == {}
+    assert [doc['doc_id'] for doc in manifest.diff([_doc('a', 'alpha')])] == ['a']
+
+
+def test_manifest_from_other_model_is_ignored(tmp_path):
+    _synced(tmp_path, [_doc('a', 'alpha')])
+    manifest = SyncManifest.load(tmp_path / 'manifest.json', 'other-model')
+
+    assert manifest.entries == {}
+
+
+def test_rebuild_from_table_rows_skips_synced_docs_and_finds_removed(tmp_path):
+    rows = [
+        {**_doc('a', 'alpha'), 'embedding': [5.0], 'synced_at': 'local'},
+        {**_doc('b', 'beta'), 'embedding': [4.0], 'synced_at': 'local'},
+        {**_doc(None, 'legacy row'), 'embedding': [1.0]},
+    ]
+    manifest = SyncManifest.rebuild(tmp_path / 'manifest.json', MODEL, rows)
+
+    changed = list(manifest.diff([_doc('a', 'alpha'), _doc('c', 'gamma')]))
+    assert [doc['doc_id'] for doc in changed] == ['c']
+    assert manifest.removed() == ['b']
@@ -0,0 +1,83 @@
+"""upload_to_vertex: migrating an existing knowledge table to the uploader schema"""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('vertexai')
+pytest.importorskip('google.cloud.bigquery')
+pytest.importorskip('dotenv')
+
+import upload_to_vertex  # noqa: E402
+from bq_writer import LocalSink  # noqa: E402
+
+
+class Field(SimpleNamespace):
+    def __init__(self, name, field_type, mode='NULLABLE'):
+        super().__init__(name=name, field_type=field_type, mode=mode)
+
+
+class FakeBigQueryModule:
+    SchemaField = Field
+
+    @staticmethod
+    def Dataset(dataset_id):
+        return SimpleNamespace(dataset_id=dataset_id, location=None)
+
+    @staticmethod
+    def Table(table_id, schema):
+        return SimpleNamespace(table_id=table_id, schema=schema)
+
+
+class FakeClient:
+    """create_table(exists_ok=True) returns the table that already exists"""
+
+    def __init__(self, existing):
+        self.table = SimpleNamespace(schema=existing)
+        self.updated = None
+
+    def create_dataset(self, dataset, exists_ok=False):
+        return dataset
+
+    def create_table(self, table, exists_ok=False):
+        return self.table
+
+    def update_table(self, table, fields):
+        self.updated = list(table.schema)
+
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_to_vertex, 'bigquery', FakeBigQueryModule)
+    monkeypatch.setattr(upload_to_vertex, 'SCHEMA', [
+        Field('doc_id', 'STRING', 'REQUIRED'),
+        Field('content', 'STRING', 'REQUIRED'),
+        Field('embedding', 'FLOAT64', 'REPEATED'),
+        Field('created_at', 'TIMESTAMP', 'REQUIRED'),
+        Field('synced_at', 'TIMESTAMP'),
+    ])
+    uploader = upload_to_vertex.VertexAIUploader(sink=LocalSink(tmp_path), embedding_model=object())
+    return uploader
+
+
+def test_missing_columns_are_appended_as_nullable(uploader):
+    uploader.bq_client = FakeClient([Field('content', 'STRING'), Field('embedding', 'FLOAT', 'REPEATED'),
+                                     Field('created_at', 'TIMESTAMP')])
+    uploader.ensure_dataset_exists()
+
+    added = {field.name: field.mode for field in uploader.bq_client.updated[3:]}
+    assert added == {'doc_id': 'NULLABLE', 'synced_at': 'NULLABLE'}
+
+
+def test_incompatible_column_fails_loudly(uploader):
+    # Older setup docs created embedding as a scalar FLOAT64 column
+    uploader.bq_client = FakeClient([Field('content', 'STRING'), Field('embedding', 'FLOAT'),
+                                     Field('created_at', 'TIMESTAMP')])
+    with pytest.raises(RuntimeError, match='embedding is FLOAT NULLABLE'):
+        uploader.ensure_dataset_exists()
+    assert uploader.bq_client.updated is None
+
+
+def test_up_to_date_table_is_left_alone(uploader):
+    uploader.bq_client = FakeClient(list(upload_to_vertex.SCHEMA))
+    uploader.ensure_dataset_exists()
+    assert uploader.bq_client.updated is None
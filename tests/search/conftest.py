@@ -0,0 +1,10 @@
+"""search Cloud Function 모듈 테스트: 함수 디렉터리를 import 경로 맨 앞에 둔다"""
+import sys
+from pathlib import Path
+
+SEARCH_DIR = Path(__file__).resolve().parents[2] / 'cloud-functions' / 'search'
+
+# debate/scripts에도 같은 이름의 모듈이 있으므로 다른 디렉터리에서 먼저 import된 것은 버린다
+for _name in ('clients', 'lazy', 'main', 'result_cache', 'tracing'):
+    sys.modules.pop(_name, None)
+sys.path.insert(0, str(SEARCH_DIR))
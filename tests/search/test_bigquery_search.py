@@ -0,0 +1,92 @@
+"""bigquery_search: 파라미터화된 검색 SQL, 청구 바이트 상한, 쿼리별 결과 복원"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import bigquery_search
+
+
+class FakeBigQueryModule:
+    """google.cloud.bigquery의 파라미터/잡 설정 클래스 대역 (인자만 기록)"""
+
+    @staticmethod
+    def ArrayQueryParameter(name, kind, values):
+        return (name, kind, values)
+
+    @staticmethod
+    def ScalarQueryParameter(name, kind, value):
+        return (name, kind, value)
+
+    @staticmethod
+    def QueryJobConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+
+class FakeJob(list):
+    job_id = 'job-1'
+    total_bytes_processed = 1000
+    total_bytes_billed = 10 * 2 ** 20
+    slot_millis = 12
+    cache_hit = False
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def query(self, sql, job_config=None):
+        self.calls.append((sql, job_config))
+        return FakeJob(self.rows)
+
+
+@pytest.fixture(autouse=True)
+def fake_bigquery(monkeypatch):
+    monkeypatch.setattr(bigquery_search, 'bigquery', FakeBigQueryModule)
+
+
+def test_sql_depends_only_on_table_and_collapse():
+    sql = bigquery_search.build_query('p.kb.embeddings', collapse=True)
+
+    assert sql == bigquery_search.build_query('p.kb.embeddings', collapse=True)
+    assert '`p.kb.embeddings`' in sql
+    assert 'PARTITION BY qid, parent_id' in sql
+    for param in ('@embeddings', '@dim', '@query_count', '@max_distance', '@limit', '@snippet_chars'):
+        assert param in sql
+    assert 'PARTITION BY qid, parent_id' not in bigquery_search.build_query('p.kb.embeddings', collapse=False)
+
+
+def test_search_passes_parameters_and_groups_rows_by_query(monkeypatch):
+    monkeypatch.setattr(bigquery_search, 'SEARCH_MAX_BYTES_BILLED', 5 * 10 ** 8)
+    client = FakeClient([
+        SimpleNamespace(qid=0, snippet='첫 결과', metadata=json.dumps({'topic': 'a'}), distance=0.1),
+        SimpleNamespace(qid=1, snippet='둘째 쿼리 결과', metadata={'topic': 'b'}, distance=0.25),
+        SimpleNamespace(qid=0, snippet='첫 쿼리 두 번째', metadata=None, distance=0.2),
+    ])
+
+    results = bigquery_search.search(client, 'p.kb.embeddings', [[0.1, 0.2], [0.3, 0.4]],
+                                     threshold=0.7, limit=5, collapse=False)
+
+    assert results == [
+        [{'content': '첫 결과', 'relevance': 0.9, 'metadata': {'topic': 'a'}},
+         {'content': '첫 쿼리 두 번째', 'relevance': 0.8, 'metadata': None}],
+        [{'content': '둘째 쿼리 결과', 'relevance': 0.75, 'metadata': {'topic': 'b'}}],
+    ]
+    _, job_config = client.calls[0]
+    params = {name: value for name, _, value in job_config.query_parameters}
+    assert params['embeddings'] == [0.1, 0.2, 0.3, 0.4]
+    assert (params['dim'], params['query_count'], params['limit']) == (2, 2, 5)
+    assert params['max_distance'] == pytest.approx(0.3)
+    assert job_config.maximum_bytes_billed == 5 * 10 ** 8
+
+
+def test_no_queries_skips_the_job():
+    client = FakeClient([])
+    assert bigquery_search.search(client, 't', [], threshold=0.7, limit=5, collapse=True) == []
+    assert client.calls == []
+
+
+def test_job_stats_tolerates_missing_fields():
+    assert bigquery_search.job_stats(FakeJob())['bigquery.bytes_billed'] == 10 * 2 ** 20
+    assert set(bigquery_search.job_stats(object()).values()) == {None}
@@ -0,0 +1,65 @@
+"""embedding_cache: 쿼리 정규화, LRU/TTL 메모리 계층, SQLite 디스크 계층"""
+from unittest import mock
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, normalize_query
+
+MODEL = 'text-embedding-004'
+
+
+def test_normalize_query_ignores_width_case_and_spaces():
+    assert normalize_query('  ＡＩ   Safety\tRules ') == 'ai safety rules'
+    assert EmbeddingCache.make_key(MODEL, 'AI  safety') == EmbeddingCache.make_key(MODEL, 'ai safety')
+    assert EmbeddingCache.make_key(MODEL, 'ai') != EmbeddingCache.make_key('other-model', 'ai')
+
+
+def test_put_get_round_trips_as_float32():
+    cache = EmbeddingCache(max_entries=4, disk_path='')
+    cache.put(MODEL, 'query', [0.5, -1.25, 2.0])
+
+    assert cache.get(MODEL, 'QUERY') == [0.5, -1.25, 2.0]
+    assert cache.get(MODEL, 'missing') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2, disk_path='')
+    cache.put(MODEL, 'a', [1.0])
+    cache.put(MODEL, 'b', [2.0])
+    cache.get(MODEL, 'a')
+    cache.put(MODEL, 'c', [3.0])
+
+    assert cache.get(MODEL, 'b') is None
+    assert cache.get(MODEL, 'a') == [1.0]
+    assert cache.get(MODEL, 'c') == [3.0]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = EmbeddingCache(max_entries=4, ttl_seconds=10, disk_path='')
+    with mock.patch.object(embedding_cache.time, 'time', return_value=1000.0):
+        cache.put(MODEL, 'q', [1.0])
+    with mock.patch.object(embedding_cache.time, 'time', return_value=1011.0):
+        assert cache.get(MODEL, 'q') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / 'embeddings.db')
+    EmbeddingCache(max_entries=4, disk_path=path).put(MODEL, 'persisted', [0.25, 0.75])
+
+    cache = EmbeddingCache(max_entries=4, disk_path=path)
+    assert cache.get(MODEL, 'persisted') == [0.25, 0.75]
+    assert cache.get(MODEL, 'persisted') == [0.25, 0.75]
+    stats = cache.stats()
+    assert (stats['disk_hits'], stats['hits']) == (1, 1)
+
+
+def test_disk_tier_is_pruned_to_limit(tmp_path):
+    cache = EmbeddingCache(max_entries=4, disk_path=str(tmp_path / 'e.db'), disk_max_entries=10)
+    for i in range(100):
+        cache.put(MODEL, f'q{i}', [float(i)])
+
+    count = cache._db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+    assert count == 10
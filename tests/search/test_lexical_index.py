@@ -0,0 +1,88 @@
+"""lexical_index: 한/영 토큰화와 BM25 검색, 키 교체, 디스크 재로드"""
+from lexical_index import LexicalIndex, tokenize
+
+
+def _row(key, content, parent=None, topic=None):
+    metadata = {}
+    if parent:
+        metadata['parent_doc_id'] = parent
+    if topic:
+        metadata['topic'] = topic
+    return {'key': key, 'content': content, 'metadata': metadata or None}
+
+
+def test_tokenize_splits_camel_case_and_hangul_bigrams():
+    assert tokenize('NoiseComputer 256x256') == ['noisecomputer', 'noise', 'computer', '256x256', '256', '256']
+    assert tokenize('RTL 컴퓨터를') == ['rtl', '컴퓨', '퓨터', '터를']
+    assert tokenize('값 a') == ['a', '값']
+
+
+def test_exact_term_ranks_first_and_limit_applies(tmp_path):
+    index = LexicalIndex(tmp_path)
+    index.add([
+        _row('a', 'NoiseComputer 설계 검토 결과'),
+        _row('b', '벡터 검색 성능 개선'),
+        _row('c', '검색 품질과 noise 처리'),
+    ])
+
+    # 전체 용어 일치가 하위 단어(noise)만 겹치는 문서보다 앞선다
+    hits = index.search('NoiseComputer', limit=5)
+    assert [hit['key'] for hit in hits] == ['a', 'c']
+    assert [hit['key'] for hit in index.search('검색 noise', limit=1)] == ['c']
+    assert index.search('없는단어zzz', limit=5) == []
+    assert index.search('', limit=5) == []
+
+
+def test_topic_metadata_is_indexed(tmp_path):
+    index = LexicalIndex(tmp_path)
+    index.add([_row('a', '본문에는 없는 내용', topic='쿠버네티스 도입')])
+    assert [hit['key'] for hit in index.search('쿠버네티스', limit=5)] == ['a']
+
+
+def test_same_key_replaces_document(tmp_path):
+    index = LexicalIndex(tmp_path)
+    index.add([_row('a', 'postgres 마이그레이션'), _row('b', 'redis 캐시')])
+    index.add([_row('a', 'mysql 마이그레이션')])
+
+    assert index.count == 2
+    assert index.search('postgres', limit=5) == []
+    assert [hit['key'] for hit in index.search('mysql', limit=5)] == ['a']
+
+
+def test_collapse_keeps_best_chunk_per_parent(tmp_path):
+    index = LexicalIndex(tmp_path)
+    index.add([
+        _row('d1#000', 'kafka 소개', parent='d1'),
+        _row('d1#001', 'kafka kafka 파티션 kafka', parent='d1'),
+        _row('d2#000', 'kafka 대안 비교', parent='d2'),
+    ])
+
+    hits = index.search('kafka', limit=5, collapse=True)
+    assert [hit['key'] for hit in hits] == ['d1#001', 'd2#000']
+    assert len(index.search('kafka', limit=5)) == 3
+
+
+def test_reload_from_disk_keeps_deletions(tmp_path):
+    index = LexicalIndex(tmp_path)
+    index.add([_row('a', 'alpha 문서'), _row('b', 'beta 문서')])
+    index.add([_row('a', 'gamma 문서')])
+
+    reloaded = LexicalIndex(tmp_path)
+    assert reloaded.load()
+    assert reloaded.count == 2
+    assert reloaded.search('alpha', limit=5) == []
+    assert [hit['key'] for hit in reloaded.search('gamma', limit=5)] == ['a']
+
+
+def test_retain_drops_documents_deleted_from_source(tmp_path):
+    index = LexicalIndex(tmp_path)
+    index.add([_row('a', 'alpha 문서'), _row('b', 'beta 문서'), _row('c', 'gamma 문서')])
+
+    assert index.retain({'a', 'c'}) == 1
+    assert index.count == 2
+    assert index.search('beta', limit=5) == []
+
+    reloaded = LexicalIndex(tmp_path)
+    assert reloaded.load()
+    assert reloaded.search('beta', limit=5) == []
+    assert [hit['key'] for hit in reloaded.search('gamma', limit=5)] == ['c']
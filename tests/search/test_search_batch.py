@@ -0,0 +1,59 @@
+"""VectorIndex.search_batch: 여러 쿼리를 한 번에 검색해도 단건 검색과 같은 결과"""
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import VectorIndex
+
+DIM = 16
+
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(7)
+    return [
+        {'key': f'doc-{i}', 'content': f'doc {i}', 'metadata': None, 'embedding': rng.normal(size=DIM).tolist()}
+        for i in range(200)
+    ]
+
+
+def _keys(results):
+    return [row['key'] for row in results]
+
+
+def test_batch_matches_single_queries_in_request_order(tmp_path, rows):
+    index = VectorIndex(tmp_path, dim=DIM)
+    index.add(rows)
+    queries = [rows[3]['embedding'], [0.0] * DIM, rows[150]['embedding']]
+
+    batch = index.search_batch(queries, threshold=0.0, limit=5)
+
+    assert len(batch) == 3
+    assert batch[1] == []
+    assert batch[0][0]['key'] == 'doc-3'
+    assert batch[2][0]['key'] == 'doc-150'
+    for query, results in zip(queries, batch):
+        assert _keys(results) == _keys(index.search(query, threshold=0.0, limit=5))
+
+
+def test_empty_batch_and_empty_index(tmp_path, rows):
+    index = VectorIndex(tmp_path, dim=DIM)
+    assert index.search_batch([rows[0]['embedding']], threshold=0.0, limit=5) == [[]]
+    index.add(rows)
+    assert index.search_batch([], threshold=0.0, limit=5) == []
+
+
+def test_ivf_with_all_clusters_probed_matches_exact_search(tmp_path, rows, monkeypatch):
+    queries = [rows[i]['embedding'] for i in (0, 42, 199)]
+    exact = VectorIndex(tmp_path / 'exact', dim=DIM)
+    exact.add(rows)
+    expected = exact.search_batch(queries, threshold=0.0, limit=10)
+
+    monkeypatch.setattr(vector_index, 'IVF_MIN_ROWS', 50)
+    monkeypatch.setattr(vector_index, 'IVF_NPROBE', 1000)
+    approximate = VectorIndex(tmp_path / 'ivf', dim=DIM)
+    approximate.add(rows)
+
+    assert approximate._snapshot.ivf is not None
+    assert [_keys(r) for r in approximate.search_batch(queries, threshold=0.0, limit=10)] == \
+        [_keys(r) for r in expected]
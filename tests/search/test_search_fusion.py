@@ -0,0 +1,47 @@
+"""search main: 벡터/키워드 결과 RRF 결합"""
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('functions_framework')
+
+import main  # noqa: E402
+
+
+def _vector(content, relevance, parent=None):
+    return {'content': content, 'relevance': relevance, 'metadata': {'parent_doc_id': parent} if parent else {}}
+
+
+def _lexical(content, score, parent=None):
+    return {'content': content, 'score': score, 'metadata': {'parent_doc_id': parent} if parent else {}}
+
+
+def test_rrf_orders_by_fused_score_and_keeps_vector_relevance():
+    fused = main.fuse_rankings({
+        'vector': [_vector('a', 0.91, 'A'), _vector('b', 0.85, 'B')],
+        'lexical': [_lexical('b chunk', 12.0, 'B'), _lexical('c', 9.0, 'C')],
+    }, limit=5, k=60)
+
+    assert [hit['metadata']['parent_doc_id'] for hit in fused] == ['B', 'A', 'C']
+    assert [hit['relevance'] for hit in fused] == [0.85, 0.91, None]
+    assert fused[0]['rrf_score'] == pytest.approx(round((1 / 62 + 1 / 61) / (2 / 61), 2))
+    assert [hit['match'] for hit in fused] == [['vector', 'lexical'], ['vector'], ['lexical']]
+
+
+def test_ties_follow_source_order_and_limit():
+    fused = main.fuse_rankings({
+        'vector': [_vector('v', 0.8)],
+        'lexical': [_lexical('l', 3.0)],
+    }, limit=1, k=60)
+
+    assert [(hit['content'], hit['rrf_score']) for hit in fused] == [('v', 0.5)]
+
+
+def test_single_source_top_hit_scores_one():
+    fused = main.fuse_rankings({'vector': [], 'lexical': [_lexical('only', 1.0)]}, limit=5)
+    assert (fused[0]['rrf_score'], fused[0]['relevance']) == (1.0, None)
+
+
+def test_format_results_handles_keyword_only_hits():
+    text = main._format_results('질의', [{'content': '벡터', 'relevance': 0.9}, {'content': '키워드', 'relevance': None}])
+    assert '관련도 90%' in text
+    assert '키워드 일치' in text
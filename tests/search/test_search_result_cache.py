@@ -0,0 +1,185 @@
+"""result_cache: 세대 단위 무효화, 세대 조회 주기, 세대 전환 시 인덱스 정리"""
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import result_cache
+from embedding_cache import EmbeddingCache
+from result_cache import GenerationWatcher, SearchResultCache
+
+
+class FakeTableClient:
+    """get_table 라벨로 세대를 돌려주는 BigQuery 클라이언트"""
+
+    def __init__(self, generation, keys=(), columns=('doc_id', 'content', 'embedding', 'synced_at')):
+        self.generation = generation
+        self.keys = list(keys)
+        self.columns = columns
+        self.reads = 0
+        self.queries = []
+
+    def get_table(self, table):
+        self.reads += 1
+        return SimpleNamespace(labels={result_cache.GENERATION_LABEL: str(self.generation)},
+                               schema=[SimpleNamespace(name=name) for name in self.columns])
+
+    def query(self, sql, job_config=None):
+        self.queries.append(sql)
+        return [SimpleNamespace(doc_key=key) for key in self.keys]
+
+
+def test_entries_are_only_served_for_current_generation():
+    cache = SearchResultCache(max_entries=4, disk_path='')
+    key = SearchResultCache.make_key('Query', 0.7, 5)
+    assert key == SearchResultCache.make_key('  query ', 0.7, 5)
+
+    cache.put(key, [{'content': 'x'}], generation=1)
+    assert cache.get(key) is None
+
+    cache.advance(1)
+    cache.put(key, [{'content': 'x'}], generation=1)
+    cache.put(SearchResultCache.make_key('stale', 0.7, 5), [], generation=0)
+    assert cache.get(key) == [{'content': 'x'}]
+    assert cache.get(SearchResultCache.make_key('stale', 0.7, 5)) is None
+
+    cache.advance(2)
+    assert cache.get(key) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_returned_results_cannot_corrupt_cache():
+    cache = SearchResultCache(max_entries=4, disk_path='')
+    cache.advance(1)
+    cache.put('k', [{'content': 'x'}], generation=1)
+
+    cache.get('k')[0]['content'] = 'changed'
+
+    assert cache.get('k') == [{'content': 'x'}]
+
+
+def test_disk_tier_keeps_only_current_generation(tmp_path):
+    path = str(tmp_path / 'results.db')
+    writer = SearchResultCache(max_entries=4, disk_path=path)
+    writer.advance(3)
+    writer.put('k', [{'content': 'x'}], generation=3)
+
+    reader = SearchResultCache(max_entries=4, disk_path=path)
+    reader.advance(3)
+    assert reader.get('k') == [{'content': 'x'}]
+
+    reader.advance(4)
+    count = reader._db.execute('SELECT COUNT(*) FROM search_results').fetchone()[0]
+    assert count == 0
+
+
+def test_watcher_rereads_label_only_after_interval():
+    client = FakeTableClient(generation=5)
+    watcher = GenerationWatcher(interval=10)
+
+    with mock.patch.object(result_cache.time, 'time', return_value=1000.0):
+        assert watcher.current(client, 'p.d.t') == 5
+        client.generation = 6
+        assert watcher.current(client, 'p.d.t') == 5
+    with mock.patch.object(result_cache.time, 'time', return_value=1011.0):
+        assert watcher.current(client, 'p.d.t') == 6
+    assert client.reads == 2
+
+
+class FakeEmbeddingModel:
+    def get_embeddings(self, texts):
+        return [SimpleNamespace(values=[1.0, float(len(text))]) for text in texts]
+
+
+class FakeIndex:
+    def __init__(self):
+        self.ready = True
+        self.calls = []
+
+    def refresh(self, bq_client, table, columns=None):
+        self.calls.append(('refresh', columns))
+        return 0
+
+    def retain(self, keys):
+        self.calls.append(('retain', set(keys)))
+        return 0
+
+    def reset(self):
+        self.calls.append('reset')
+
+
+@pytest.fixture
+def search(monkeypatch):
+    pytest.importorskip('flask')
+    pytest.importorskip('functions_framework')
+    import main
+    from clients import ClientPool
+
+    monkeypatch.setattr(main, 'SEARCH_BACKEND', 'local')
+    monkeypatch.setattr(main, 'SEARCH_MODE', 'hybrid')
+    pool = ClientPool()
+    client = FakeTableClient(generation=2, keys=['a', 'c'])
+    pool.override('bigquery', client)
+    pool.override('embedding_model', FakeEmbeddingModel())
+    pool.override('embedding_cache', EmbeddingCache(max_entries=8, disk_path=''))
+    pool.override('result_cache', SearchResultCache(max_entries=4, disk_path=''))
+    pool.override('generation_watcher', GenerationWatcher(interval=0))
+    pool.override('vector_index', FakeIndex())
+    pool.override('lexical_index', FakeIndex())
+    return main, main.VertexSearch(pool), client
+
+
+def test_generation_change_refreshes_then_prunes_deleted_rows(search):
+    main, engine, client = search
+
+    assert engine._sync_generation() == 2
+    assert engine.result_cache.generation == 2
+    for name in ('vector_index', 'lexical_index'):
+        assert engine.pool.get(name).calls == [('refresh', ('doc_id', 'synced_at')), ('retain', {'a', 'c'})]
+    # key 집합은 인덱스마다가 아니라 한 번만 조회
+    assert len(client.queries) == 1 and 'DISTINCT doc_id' in client.queries[0]
+
+    assert engine._sync_generation() == 2
+    assert len(engine.pool.get('vector_index').calls) == 2
+
+
+def test_generation_change_on_table_without_key_column_rebuilds(search):
+    main, engine, client = search
+    # 업로더가 컬럼을 추가하기 전의 오래된 테이블
+    client.columns = ('content', 'embedding', 'metadata', 'created_at')
+
+    assert engine._sync_generation() == 2
+    assert engine.pool.get('vector_index').calls == ['reset', ('refresh', (None, 'created_at'))]
+    assert client.queries == []
+
+
+def test_failed_bigquery_search_is_not_cached(search, monkeypatch):
+    main, engine, client = search
+    monkeypatch.setattr(main, 'SEARCH_BACKEND', 'bigquery')
+    monkeypatch.setattr(main, 'SEARCH_MODE', 'vector')
+    calls = []
+
+    def failing(*args, **kwargs):
+        calls.append(args)
+        raise RuntimeError('bigquery unavailable')
+
+    monkeypatch.setattr(main.bigquery_search, 'search', failing)
+    assert engine.search('질문') == []
+
+    hits = [{'content': 'ok', 'relevance': 0.9, 'metadata': {}}]
+    monkeypatch.setattr(main.bigquery_search, 'search', lambda *args, **kwargs: calls.append(args) or [hits])
+    assert engine.search('질문') == hits
+    assert engine.search('질문') == hits
+    # 실패한 첫 검색은 캐시되지 않아 두 번째 요청은 다시 검색하고, 성공한 결과는 캐시됨
+    assert len(calls) == 2
+
+
+def test_vector_only_fallback_of_hybrid_search_is_not_cached(search, monkeypatch):
+    main, engine, client = search
+    monkeypatch.setattr(main, 'SEARCH_BACKEND', 'bigquery')
+    hits = [{'content': 'ok', 'relevance': 0.9, 'metadata': {}}]
+    monkeypatch.setattr(main.bigquery_search, 'search', lambda *args, **kwargs: [hits])
+    # FakeIndex에는 검색 메서드가 없어 키워드 검색이 오류로 빠진다
+
+    assert engine.search('질문') == hits
+    assert engine.result_cache.stats()['size'] == 0
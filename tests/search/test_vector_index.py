@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+import vector_index
+from vector_index import VectorIndex
+
+DIM = 8
+
+
+def _vector(*hot):
+    vector = [0.0] * DIM
+    for i in hot:
+        vector[i] = 1.0
+    return vector
+
+
+def _row(key, vector, content='', **metadata):
+    return {'key': key, 'content': content or key, 'metadata': metadata or None, 'embedding': vector}
+
+
+def _index(tmp_path, rows):
+    index = VectorIndex(tmp_path, dim=DIM)
+    index.add(rows)
+    return index
+
+
+def test_search_orders_by_distance_and_applies_threshold(tmp_path):
+    index = _index(tmp_path, [
+        _row('exact', _vector(0)),
+        _row('close', _vector(0, 1)),
+        _row('far', _vector(2)),
+    ])
+
+    hits = index.search(_vector(0), threshold=0.5, limit=10)
+
+    assert [hit['key'] for hit in hits] == ['exact', 'close']
+    assert hits[0]['distance'] < 1e-6
+    assert abs(hits[1]['distance'] - (1 - 1 / np.sqrt(2))) < 1e-6
+
+
+def test_search_respects_limit_and_skips_zero_query(tmp_path):
+    index = _index(tmp_path, [_row(f'doc{i}', _vector(0, i)) for i in range(1, DIM)])
+
+    assert len(index.search(_vector(0), threshold=0.0, limit=3)) == 3
+    assert index.search([0.0] * DIM, threshold=0.0, limit=3) == []
+
+
+def test_rows_with_wrong_dimension_or_zero_norm_are_skipped(tmp_path):
+    index = VectorIndex(tmp_path, dim=DIM)
+
+    added = index.add([_row('ok', _vector(0)), _row('short', [1.0]), _row('zero', [0.0] * DIM)])
+
+    assert added == 1
+    assert index.count == 1
+
+
+def test_same_key_replaces_previous_row(tmp_path):
+    index = _index(tmp_path, [_row('doc', _vector(0), 'old')])
+    index.add([_row('doc', _vector(1), 'new')])
+
+    assert index.count == 1
+    assert index.search(_vector(0), threshold=0.5, limit=5) == []
+    assert [hit['content'] for hit in index.search(_vector(1), threshold=0.5, limit=5)] == ['new']
+
+
+def test_index_reloads_from_disk(tmp_path):
+    _index(tmp_path, [_row('a', _vector(0)), _row('b', _vector(1))])
+    writer = VectorIndex(tmp_path, dim=DIM)
+    assert writer.load()
+    writer.add([_row('a', _vector(2))])
+
+    reloaded = VectorIndex(tmp_path, dim=DIM)
+
+    assert reloaded.load()
+    assert reloaded.count == 2
+    assert [hit['key'] for hit in reloaded.search(_vector(2), threshold=0.5, limit=5)] == ['a']
+
+
+def test_load_rejects_dimension_mismatch(tmp_path):
+    _index(tmp_path, [_row('a', _vector(0))])
+
+    assert not VectorIndex(tmp_path, dim=DIM * 2).load()
+
+
+def test_retain_drops_rows_deleted_from_source(tmp_path):
+    index = _index(tmp_path, [_row(key, _vector(i)) for i, key in enumerate('abcd')])
+
+    assert index.retain({'a', 'c', 'd'}) == 1
+    assert index.retain({'a', 'c', 'd'}) == 0
+    assert index.count == 3
+    assert index.search(_vector(1), threshold=0.5, limit=5) == []
+
+    reloaded = VectorIndex(tmp_path, dim=DIM)
+    assert reloaded.load()
+    assert reloaded.count == 3
+    assert [hit['key'] for hit in reloaded.search(_vector(3), threshold=0.5, limit=5)] == ['d']
+
+
+class FakeBigQueryModule:
+    @staticmethod
+    def ScalarQueryParameter(name, kind, value):
+        return (name, kind, value)
+
+    @staticmethod
+    def QueryJobConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+
+class FakeTableClient:
+    """스키마 메타데이터와 고정 행을 돌려주는 BigQuery 클라이언트"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.sql = []
+
+    def get_table(self, table):
+        return SimpleNamespace(schema=[SimpleNamespace(name=name) for name in self.columns])
+
+    def query(self, sql, job_config=None):
+        self.sql.append(sql)
+        return [SimpleNamespace(**row) for row in self.rows]
+
+
+def _source_rows(count):
+    base = datetime(2026, 1, 1)
+    return [{'doc_key': f'd{i}', 'content': f'd{i}', 'metadata': None, 'embedding': _vector(i),
+             'watermark': base + timedelta(seconds=i)} for i in range(count)]
+
+
+def test_refresh_is_incremental_on_current_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, 'bigquery', FakeBigQueryModule)
+    client = FakeTableClient(['doc_id', 'content', 'metadata', 'embedding', 'created_at', 'synced_at'],
+                             _source_rows(3))
+    index = VectorIndex(tmp_path, dim=DIM)
+
+    assert index.refresh(client, 'p.d.t') == 3
+    assert 'doc_id AS doc_key' in client.sql[0]
+    assert 'COALESCE(synced_at, created_at) AS watermark' in client.sql[0]
+    assert 'WHERE' not in client.sql[0]
+
+    index.refresh(client, 'p.d.t')
+    assert 'WHERE COALESCE(synced_at, created_at) > @watermark' in client.sql[1]
+    assert index.count == 3
+
+
+def test_refresh_rebuilds_when_table_lacks_key_and_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, 'bigquery', FakeBigQueryModule)
+    client = FakeTableClient(['content', 'metadata', 'embedding'], _source_rows(3))
+    index = VectorIndex(tmp_path, dim=DIM)
+
+    assert vector_index.source_columns(client, 'p.d.t') == (None, None)
+    index.refresh(client, 'p.d.t')
+    index.refresh(client, 'p.d.t')
+
+    # 행을 가릴 key가 없어도 매번 전체 재구축이라 중복되지 않는다
+    assert index.count == 3
+    assert all('WHERE' not in sql and 'CAST(NULL AS STRING) AS doc_key' in sql for sql in client.sql)